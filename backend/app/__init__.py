@@ -1,27 +1,68 @@
 from os import getenv
 from flask import Flask, jsonify
 from .routes import register_routes
-from .extentions import db, migrate, jwt, cors, bcrypt, socketio
+from .commands import register_commands
+from .extentions import db, migrate, jwt, cors, socketio, market_data, price_stream, price_alerts, analysis_jobs, portfolio_history, symbol_index, metrics, password_hasher, user_cache
+from .services import FakeOpenAIClient, PasswordHasherBusy, preload_modules
 from .config import config
+from .json_provider import init_json_provider
+from .db_routing import init_db_routing
+from .compression import init_compression
+from .services.metadata_refresher import MetadataRefresher
+from .models import PriceAlert, AnalysisJob, Stock
 import logging
 
-def create_app():
+def create_app(test_config=None):
     app = Flask(__name__)
 
     # load config based on the environment
     config_mode = getenv("FLASK_ENV")
     app.config.from_object(config[config_mode])
 
+    # overrides used by benchmarks, applied before any extension reads the config
+    if test_config:
+        app.config.update(test_config)
+
+    init_json_provider(app)
+
+    # a preforking server builds the app once in its parent, what is imported here is shared by the workers
+    if app.config["PRELOAD_MODULES"]:
+        preload_modules()
+
+    # before the extensions that report upstream calls to it
+    if app.config["METRICS_ENABLED"]:
+        metrics.init_app(app)
+
+    # after_request hooks run last registered first, so compression is timed as part of the request
+    init_compression(app)
+
     # initialize flask extentions
     cors.init_app(app, origins=app.config["ALLOWED_ORIGINS"], supports_credentials=True)
+    init_db_routing(app)
     db.init_app(app)
     migrate.init_app(app, db)
     jwt.init_app(app)
+    user_cache.init_app(app)
     socketio.init_app(app)
-    bcrypt.init_app(app)
+    password_hasher.init_app(app)
+    market_data.init_app(app)
+    price_stream.init_app(app, socketio, market_data)
+    price_alerts.init_app(app, socketio, market_data, PriceAlert)
+    portfolio_history.init_app(app)
+    symbol_index.init_app(app, Stock)
+    # without a client the openai one is created on the first analysis
+    analysis_client = FakeOpenAIClient(app.config["FAKE_ANALYSIS_LATENCY"]) if app.config["ANALYSIS_CLIENT"] == "fake" else None
+    analysis_jobs.init_app(app, socketio, AnalysisJob, analysis_client)
 
     # register blueprints
     register_routes(app)
+    register_commands(app)
+
+    if app.config["METADATA_REFRESH_INTERVAL"]:
+        app.extensions["metadata_refresher"] = MetadataRefresher(app).start()
+
+    if app.config["PRICE_ALERT_POLL_INTERVAL"]:
+        price_alerts.start()
 
     @app.errorhandler(404)
     def not_found_error(error):
@@ -32,6 +73,10 @@ def create_app():
         logging.error(f"Error: {str(error)}")
         return jsonify({"message": "Something went wrong"}), 500
     
+    @app.errorhandler(PasswordHasherBusy)
+    def password_hasher_busy(error):
+        return jsonify({"message": "Too many requests, please try again shortly"}), 429, {"Retry-After": "1"}
+
     @app.errorhandler(Exception)
     def handle_exception(e):
         logging.error(f"Error: {str(e)}")
@@ -0,0 +1,49 @@
+from datetime import timedelta
+from flask import current_app
+from flask.cli import AppGroup
+import click
+from .services.metadata_refresher import refresh_stock_metadata
+from .services.portfolio import rebuild_summaries
+from .services.allocation import rebuild_allocations, rebuild_holdings
+from .extentions import db
+
+stocks_cli = AppGroup("stocks")
+portfolio_cli = AppGroup("portfolio")
+
+
+@stocks_cli.command("refresh-metadata")
+@click.option("--all", "refresh_all", is_flag=True, help="Refresh every stock, not only stale ones.")
+@click.option("--missing", "missing_only", is_flag=True, help="Only refresh stocks that were never refreshed.")
+@click.option("--max-age", type=int, default=None, help="Seconds after which metadata is stale.")
+@click.option("--batch-size", type=int, default=None)
+def refresh_metadata(refresh_all, missing_only, max_age, batch_size):
+    max_age = max_age if max_age is not None else current_app.config["METADATA_MAX_AGE"]
+    refreshed, stale = refresh_stock_metadata(
+        max_age=None if refresh_all else timedelta(seconds=max_age),
+        batch_size=batch_size or current_app.config["METADATA_REFRESH_BATCH_SIZE"],
+        timeout=current_app.config["MARKET_DATA_FETCH_TIMEOUT"],
+        missing_only=missing_only
+    )
+    click.echo(f"Refreshed metadata for {refreshed} of {stale} stocks")
+
+
+@portfolio_cli.command("rebuild-summaries")
+@click.option("--user-id", default=None, help="Only rebuild this user's positions.")
+def rebuild_position_summaries(user_id):
+    users = rebuild_summaries(user_id)
+    click.echo(f"Rebuilt position summaries for {users} users")
+
+
+# recomputes the sector/industry allocation of every user and the cross-user holdings from the
+# position summaries, run `rebuild-summaries` first for histories recorded before those existed
+@portfolio_cli.command("rebuild-allocations")
+def rebuild_allocation_summaries():
+    rebuild_allocations()
+    rebuild_holdings()
+    db.session.commit()
+    click.echo("Rebuilt allocation and holding summaries")
+
+
+def register_commands(app):
+    app.cli.add_command(stocks_cli)
+    app.cli.add_command(portfolio_cli)
@@ -0,0 +1,58 @@
+import gzip
+from flask import current_app, request
+from .etags import encoded_etag, matched_etag
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {"application/json", "text/plain"}
+
+
+def _encoding():
+    if brotli is not None and request.accept_encodings["br"]:
+        return "br"
+    if request.accept_encodings["gzip"]:
+        return "gzip"
+    return None
+
+
+# JSON and text bodies of at least COMPRESSION_MIN_SIZE bytes go out brotli compressed when it is
+# installed and accepted, gzip otherwise, streamed responses (the exports) are left alone
+def compress_response(response):
+    if response.status_code == 304:
+        # repeats the validator of the representation the client revalidated
+        etag, weak = response.get_etag()
+        if etag:
+            response.set_etag(matched_etag(etag) or etag, weak)
+            response.vary.add("Accept-Encoding")
+        return response
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+    response.vary.add("Accept-Encoding")
+
+    if response.status_code != 200 or response.direct_passthrough or response.is_streamed or "Content-Encoding" in response.headers:
+        return response
+    if response.content_length is not None and response.content_length < current_app.config["COMPRESSION_MIN_SIZE"]:
+        return response
+    encoding = _encoding()
+    if encoding is None:
+        return response
+
+    if encoding == "br":
+        body = brotli.compress(response.get_data(), quality=current_app.config["COMPRESSION_BROTLI_QUALITY"])
+    else:
+        # a fixed mtime keeps the output of the same body the same
+        body = gzip.compress(response.get_data(), compresslevel=current_app.config["COMPRESSION_GZIP_LEVEL"], mtime=0)
+    response.set_data(body)
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(encoded_etag(etag, encoding), weak)
+    return response
+
+
+def init_compression(app):
+    if app.config["COMPRESSION_MIN_SIZE"]:
+        app.after_request(compress_response)
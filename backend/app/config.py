@@ -1,13 +1,32 @@
-from os import getenv
+from os import getenv, path
 from dotenv import load_dotenv
 from datetime import timedelta
 
 load_dotenv()
 
+
+# pool sizing is left to sqlalchemy's defaults (5 connections, 10 overflow, 30s timeout) unless
+# set, in memory sqlite databases don't take it
+def engine_options():
+    options = {
+        "pool_pre_ping": (getenv("DATABASE_POOL_PRE_PING") or "true").lower() == "true",
+        "pool_recycle": int(getenv("DATABASE_POOL_RECYCLE") or 1800),
+    }
+    for option, name in (("pool_size", "DATABASE_POOL_SIZE"), ("max_overflow", "DATABASE_MAX_OVERFLOW"), ("pool_timeout", "DATABASE_POOL_TIMEOUT")):
+        if getenv(name):
+            options[option] = int(getenv(name))
+    return options
+
+
 class Config:
     SECRET_KEY = getenv("SECRET_KEY")
     SQLALCHEMY_DATABASE_URI = getenv("DATABASE_URL")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options()
+    # read only routes query this database when set, everything else uses DATABASE_URL
+    SQLALCHEMY_REPLICA_URI = getenv("DATABASE_REPLICA_URL")
+    # seconds a client's reads go to the primary after one of its requests wrote, to cover replication lag
+    DATABASE_REPLICA_STICKY_SECONDS = int(getenv("DATABASE_REPLICA_STICKY_SECONDS") or 5)
     OPENAI_API_KEY= getenv("OPENAI_API_KEY")
     JWT_TOKEN_LOCATION = ["cookies"]
     JWT_ACCESS_COOKIE_PATH = "/"
@@ -15,6 +34,74 @@ class Config:
     JWT_SECRET_KEY = getenv("JWT_SECRET_KEY")
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(days=7)
     ALLOWED_ORIGINS = getenv("ALLOWED_ORIGINS") or ""
+    # "orjson" falls back to flask's default encoder when orjson isn't installed
+    JSON_PROVIDER = getenv("JSON_PROVIDER") or "orjson"
+    MARKET_DATA_PROVIDER = getenv("MARKET_DATA_PROVIDER") or "yfinance"
+    FAKE_MARKET_DATA_LATENCY = float(getenv("FAKE_MARKET_DATA_LATENCY") or 0)
+    QUOTE_CACHE_SIZE = int(getenv("QUOTE_CACHE_SIZE") or 1024)
+    QUOTE_VOLATILE_TTL = int(getenv("QUOTE_VOLATILE_TTL") or 15)
+    QUOTE_STATIC_TTL = int(getenv("QUOTE_STATIC_TTL") or 60 * 60 * 24)
+    PRICE_STREAM_INTERVAL = float(getenv("PRICE_STREAM_INTERVAL") or 5)
+    PRICE_STREAM_MAX_INTERVAL = float(getenv("PRICE_STREAM_MAX_INTERVAL") or 60)
+    PRICE_STREAM_IDLE_TIMEOUT = float(getenv("PRICE_STREAM_IDLE_TIMEOUT") or 120)
+    PRICE_STREAM_MAX_SYMBOLS = int(getenv("PRICE_STREAM_MAX_SYMBOLS") or 50)
+    # seconds between quote refreshes of every symbol with alerts, 0 leaves it to page views and the price stream
+    PRICE_ALERT_POLL_INTERVAL = float(getenv("PRICE_ALERT_POLL_INTERVAL") or 0)
+    # seconds between reads of the alerts created since the last one, which other workers may have added
+    PRICE_ALERT_RELOAD_INTERVAL = float(getenv("PRICE_ALERT_RELOAD_INTERVAL") or 5)
+    MAX_PRICE_ALERTS_PER_USER = int(getenv("MAX_PRICE_ALERTS_PER_USER") or 100)
+    ANALYSIS_CLIENT = getenv("ANALYSIS_CLIENT") or "openai"
+    FAKE_ANALYSIS_LATENCY = float(getenv("FAKE_ANALYSIS_LATENCY") or 0)
+    ANALYSIS_WORKERS = int(getenv("ANALYSIS_WORKERS") or 4)
+    ANALYSIS_CACHE_TTL = int(getenv("ANALYSIS_CACHE_TTL") or 60 * 60)
+    ANALYSIS_CACHE_SIZE = int(getenv("ANALYSIS_CACHE_SIZE") or 1024)
+    ANALYSIS_JOB_TTL = int(getenv("ANALYSIS_JOB_TTL") or 60 * 10)
+    MAX_ORDERS_PER_REQUEST = int(getenv("MAX_ORDERS_PER_REQUEST") or 100)
+    QUOTE_TOKEN_TTL = int(getenv("QUOTE_TOKEN_TTL") or 60)
+    HISTORY_STORE_DIR = getenv("HISTORY_STORE_DIR")
+    HISTORY_SYNC_TTL = int(getenv("HISTORY_SYNC_TTL") or 300)
+    MARKET_DATA_WORKERS = int(getenv("MARKET_DATA_WORKERS") or 8)
+    MARKET_DATA_FETCH_TIMEOUT = float(getenv("MARKET_DATA_FETCH_TIMEOUT") or 2)
+    METADATA_MAX_AGE = int(getenv("METADATA_MAX_AGE") or 60 * 60 * 24 * 7)
+    METADATA_REFRESH_BATCH_SIZE = int(getenv("METADATA_REFRESH_BATCH_SIZE") or 50)
+    # seconds between background refreshes, 0 leaves it to `flask stocks refresh-metadata`
+    METADATA_REFRESH_INTERVAL = int(getenv("METADATA_REFRESH_INTERVAL") or 0)
+    PORTFOLIO_HISTORY_TTL = int(getenv("PORTFOLIO_HISTORY_TTL") or 300)
+    PORTFOLIO_HISTORY_CACHE_SIZE = int(getenv("PORTFOLIO_HISTORY_CACHE_SIZE") or 1024)
+    # points in a stock chart unless the client asks for fewer, and the most it may ask for
+    CHART_MAX_POINTS = int(getenv("CHART_MAX_POINTS") or 1000)
+    CHART_MAX_POINTS_LIMIT = int(getenv("CHART_MAX_POINTS_LIMIT") or 5000)
+    # JSON list of {"symbol", "company_name"} objects, the listing the frontend ships by default
+    SYMBOL_LISTINGS_FILE = getenv("SYMBOL_LISTINGS_FILE") or path.join(path.dirname(__file__), "..", "..", "frontend", "public", "data", "stocks.json")
+    SEARCH_MAX_RESULTS = int(getenv("SEARCH_MAX_RESULTS") or 25)
+    MOST_HELD_MAX_RESULTS = int(getenv("MOST_HELD_MAX_RESULTS") or 50)
+    METRICS_ENABLED = (getenv("METRICS_ENABLED") or "true").lower() == "true"
+    # GET /api/metrics requires "Authorization: Bearer <token>" and isn't served without one
+    METRICS_TOKEN = getenv("METRICS_TOKEN")
+    SERVER_TIMING_HEADER = (getenv("SERVER_TIMING_HEADER") or "false").lower() == "true"
+    # JSON and text responses of at least this many bytes are compressed for clients that accept it, 0 turns it off
+    COMPRESSION_MIN_SIZE = int(getenv("COMPRESSION_MIN_SIZE") or 1024)
+    COMPRESSION_GZIP_LEVEL = int(getenv("COMPRESSION_GZIP_LEVEL") or 6)
+    # "br" is only offered when the brotli package is installed
+    COMPRESSION_BROTLI_QUALITY = int(getenv("COMPRESSION_BROTLI_QUALITY") or 5)
+    # seconds, 0 turns the slow request log off
+    SLOW_REQUEST_THRESHOLD = float(getenv("SLOW_REQUEST_THRESHOLD") or 1)
+    # imports numpy, pandas, yfinance and openai in create_app instead of on first use, for
+    # preforking servers (e.g. gunicorn --preload) whose workers then share them
+    PRELOAD_MODULES = (getenv("PRELOAD_MODULES") or "false").lower() == "true"
+    # stored hashes with a different cost are rehashed on the next successful login
+    BCRYPT_LOG_ROUNDS = int(getenv("BCRYPT_LOG_ROUNDS") or 12)
+    # processes bcrypt runs on, 0 runs it in the request thread
+    PASSWORD_HASH_WORKERS = int(getenv("PASSWORD_HASH_WORKERS") or 2)
+    # hashes running or queued before signups and logins are answered with 429
+    PASSWORD_HASH_MAX_PENDING = int(getenv("PASSWORD_HASH_MAX_PENDING") or 16)
+    # signed in users kept per process for jwt_required routes, 0 looks the user up every request
+    USER_CACHE_SIZE = int(getenv("USER_CACHE_SIZE") or 4096)
+    USER_CACHE_TTL = int(getenv("USER_CACHE_TTL") or 60)
+    # rows per database round trip when exporting, rows per bulk insert when importing
+    TRANSACTION_EXPORT_CHUNK_SIZE = int(getenv("TRANSACTION_EXPORT_CHUNK_SIZE") or 1000)
+    TRANSACTION_IMPORT_CHUNK_SIZE = int(getenv("TRANSACTION_IMPORT_CHUNK_SIZE") or 10000)
+    TRANSACTION_IMPORT_MAX_ROWS = int(getenv("TRANSACTION_IMPORT_MAX_ROWS") or 1000000)
 
 
 class DevelopmentConfig(Config):
@@ -0,0 +1,77 @@
+from time import time
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+REPLICA = "replica"
+
+# set after a request writes, the client's reads stay on the primary until it expires
+STICKY_COOKIE = "read_primary_until"
+
+
+# marks a view whose queries may be answered by the replica
+def read_only(view):
+    view.read_only = True
+    return view
+
+
+class RoutingSession(Session):
+    # queries of read only requests go to the replica, flushes, DML and locking selects go to the
+    # primary and once a request wrote anything the rest of it stays there too
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+            bind is None and has_request_context() and g.get("read_replica") and not g.get("db_wrote")
+            and not self._flushing and getattr(clause, "_for_update_arg", None) is None
+        ):
+            return self._db.engines[REPLICA]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _mark_write():
+    if has_request_context():
+        g.db_wrote = True
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def flushed(session, flush_context):
+    _mark_write()
+
+
+# bulk and Core statements executed through the session never flush
+@event.listens_for(RoutingSession, "do_orm_execute")
+def executed(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _mark_write()
+
+
+def route_request():
+    view = current_app.view_functions.get(request.endpoint)
+    if not getattr(view, "read_only", False):
+        return
+    try:
+        sticky = float(request.cookies.get(STICKY_COOKIE, 0)) > time()
+    except ValueError:
+        sticky = False
+    g.read_replica = not sticky
+
+
+def stick_to_primary(response):
+    if g.get("db_wrote"):
+        window = current_app.config["DATABASE_REPLICA_STICKY_SECONDS"]
+        response.set_cookie(
+            STICKY_COOKIE, str(round(time() + window, 3)), max_age=window, httponly=True,
+            secure=current_app.config["JWT_COOKIE_SECURE"], samesite=current_app.config["JWT_COOKIE_SAMESITE"]
+        )
+    return response
+
+
+# the replica is another bind next to the primary that no model is bound to, requests only
+# reach it through `read_only` views
+def init_db_routing(app):
+    replica_uri = app.config["SQLALCHEMY_REPLICA_URI"]
+    if not replica_uri:
+        return
+
+    app.config["SQLALCHEMY_BINDS"] = {**app.config.get("SQLALCHEMY_BINDS", {}), REPLICA: replica_uri}
+    app.before_request(route_request)
+    app.after_request(stick_to_primary)
@@ -0,0 +1,32 @@
+from hashlib import blake2b
+from flask import request
+
+
+# strong validator of a response, `parts` have to cover everything its body is built from
+def make_etag(*parts):
+    return blake2b(repr(parts).encode(), digest_size=12).hexdigest()
+
+
+# the client keeps the body and revalidates it on every use, shared caches don't keep it
+def cache_headers(etag):
+    return {"ETag": f'"{etag}"', "Cache-Control": "private, no-cache"}
+
+
+# compressed bodies are other representations and carry the validator suffixed with their coding
+CONTENT_CODINGS = ("br", "gzip")
+
+
+def encoded_etag(etag, encoding):
+    return f"{etag}-{encoding}"
+
+
+# the etag the client holds a representation of, or None
+def matched_etag(etag):
+    for tag in (etag, *(encoded_etag(etag, encoding) for encoding in CONTENT_CODINGS)):
+        if request.if_none_match.contains_weak(tag):
+            return tag
+    return None
+
+
+def not_modified(etag):
+    return matched_etag(etag) is not None
@@ -1,16 +1,22 @@
 from flask_sqlalchemy import SQLAlchemy
-from flask_bcrypt import Bcrypt
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 from flask_migrate import Migrate
 from flask_socketio  import SocketIO
-from openai import OpenAI
-from os import getenv
+from .db_routing import RoutingSession
+from .services import MarketData, PriceStream, PriceAlerts, AnalysisJobs, PortfolioHistoryCache, SymbolIndex, Metrics, PasswordHasher, UserCache
 
 cors = CORS()
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 migrate = Migrate()
-bcrypt = Bcrypt()
 jwt = JWTManager()
 socketio = SocketIO()
-openaiClient = OpenAI(api_key=getenv("OPENAI_API_KEY"))
+market_data = MarketData()
+price_stream = PriceStream()
+price_alerts = PriceAlerts()
+analysis_jobs = AnalysisJobs()
+portfolio_history = PortfolioHistoryCache()
+symbol_index = SymbolIndex()
+metrics = Metrics()
+password_hasher = PasswordHasher()
+user_cache = UserCache()
@@ -0,0 +1,62 @@
+from decimal import Decimal
+from datetime import date
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# same output as flask's default provider (Decimal as a string, dates as HTTP dates)
+def _default(o):
+    if isinstance(o, Decimal):
+        return str(o)
+    if isinstance(o, date):
+        return http_date(o)
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+class OrJSONProvider(DefaultJSONProvider):
+    options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY if orjson else 0
+
+    def _options(self, indent=False):
+        options = self.options
+        if indent:
+            options |= orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS
+        elif self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        return options
+
+    def dumps(self, obj, **kwargs):
+        # anything beyond indentation falls back to the standard library encoder
+        if set(kwargs) - {"indent"}:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=_default, option=self._options("indent" in kwargs)).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(
+            orjson.dumps(obj, default=_default, option=self._options(indent) | orjson.OPT_APPEND_NEWLINE),
+            mimetype=self.mimetype
+        )
+
+
+json_providers = {
+    "default": DefaultJSONProvider,
+    "orjson": OrJSONProvider,
+}
+
+
+def init_json_provider(app):
+    name = app.config["JSON_PROVIDER"]
+    if name == "orjson" and orjson is None:
+        name = "default"
+    app.json = json_providers[name](app)
@@ -2,3 +2,7 @@ from .user import User
 from .stock import Stock
 from .user_stock import UserStock
 from .transaction import Transaction
+from .position_summary import PositionSummary
+from .price_alert import PriceAlert
+from .allocation_summary import AllocationSummary, HoldingSummary
+from .analysis_job import AnalysisJob
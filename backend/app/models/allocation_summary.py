@@ -0,0 +1,93 @@
+from datetime import datetime
+from decimal import Decimal
+from sqlalchemy.dialects import postgresql, sqlite
+from ..extentions import db
+
+
+# adds {key: (positions, quantity, cost_basis)} to the rows of `table` in one multi-row upsert, keys
+# are sorted so concurrent trades take the row locks in the same order
+def _add(table, key_columns, deltas, **values):
+    if not deltas:
+        return
+    dialect = postgresql if db.session.get_bind().dialect.name == "postgresql" else sqlite
+    statement = dialect.insert(table).values([
+        {**dict(zip(key_columns, key)), **values, "positions": positions, "quantity": quantity, "cost_basis": cost_basis}
+        for key, (positions, quantity, cost_basis) in sorted(deltas.items())
+    ])
+    statement = statement.on_conflict_do_update(
+        index_elements=list(table.primary_key.columns),
+        set_={
+            **{column: table.c[column] + statement.excluded[column] for column in ("positions", "quantity", "cost_basis")},
+            "updated_at": datetime.now(),
+        }
+    )
+    db.session.execute(statement)
+
+
+class AllocationSummary(db.Model):
+    __tablename__ = "allocation_summaries"
+
+    # open positions of a user per (sector, industry), kept up to date by every fill together with
+    # the position summaries they add up, keyed by the columns so the rebuild is one INSERT ... SELECT
+    user_id = db.Column(db.String, db.ForeignKey("users.id"), primary_key=True)
+    sector = db.Column(db.String(150), primary_key=True)
+    industry = db.Column(db.String(150), primary_key=True)
+    positions = db.Column(db.Integer, nullable=False, default=0)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    # FIFO cost basis of the open shares
+    cost_basis = db.Column(db.Numeric(18, 4), nullable=False, default=Decimal(0))
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+
+    def to_dict(self):
+        return {
+            "sector": self.sector,
+            "industry": self.industry,
+            "positions": self.positions,
+            "quantity": self.quantity,
+            "cost_basis": self.cost_basis,
+        }
+
+    @classmethod
+    def for_user(cls, user_id):
+        return cls.query.filter(cls.user_id == user_id, cls.positions > 0).order_by(cls.sector, cls.industry).all()
+
+    # {(sector, industry): (positions, quantity, cost_basis)}
+    @classmethod
+    def add(cls, user_id, deltas):
+        _add(cls.__table__, ("sector", "industry"), deltas, user_id=user_id)
+
+
+class HoldingSummary(db.Model):
+    __tablename__ = "holding_summaries"
+    __table_args__ = (db.Index("ix_holding_summaries_scope_positions", "scope", "positions"),)
+
+    # open positions across all users per symbol ("symbol" scope, where positions is the number of
+    # holders) and per sector ("sector" scope)
+    scope = db.Column(db.String(10), primary_key=True)
+    name = db.Column(db.String(150), primary_key=True)
+    positions = db.Column(db.Integer, nullable=False, default=0)
+    quantity = db.Column(db.BigInteger, nullable=False, default=0)
+    cost_basis = db.Column(db.Numeric(20, 4), nullable=False, default=Decimal(0))
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+
+    def to_dict(self):
+        return {
+            self.scope: self.name,
+            "positions": self.positions,
+            "quantity": self.quantity,
+            "cost_basis": self.cost_basis,
+        }
+
+    @classmethod
+    def top(cls, scope, limit):
+        return (
+            cls.query.filter(cls.scope == scope, cls.positions > 0)
+            .order_by(cls.positions.desc(), cls.name)
+            .limit(limit)
+            .all()
+        )
+
+    # {(scope, name): (positions, quantity, cost_basis)}
+    @classmethod
+    def add(cls, deltas):
+        _add(cls.__table__, ("scope", "name"), deltas)
@@ -0,0 +1,43 @@
+from datetime import datetime
+from ..extentions import db
+import uuid
+
+class AnalysisJob(db.Model):
+    __tablename__ = "analysis_jobs"
+
+    # in the database so any worker can answer the polls of a job another worker runs
+    id = db.Column(db.String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = db.Column(db.String, db.ForeignKey("users.id"), nullable=False)
+    status = db.Column(db.Enum("pending", "done", "failed", name="analysis_job_status"), nullable=False, default="pending")
+    analysis = db.Column(db.JSON)
+    created_at = db.Column(db.DateTime, default=datetime.now, index=True)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "status": self.status,
+            "analysis": self.analysis,
+        }
+
+    # a new job, already done when the analysis was cached, after removing the finished jobs
+    # created before `expired_before`
+    @classmethod
+    def create(cls, user_id, analysis, expired_before):
+        table = cls.__table__
+        db.session.execute(table.delete().where(table.c.status != "pending", table.c.created_at < expired_before))
+        job = cls(user_id=user_id, status="pending" if analysis is None else "done", analysis=analysis)
+        db.session.add(job)
+        db.session.commit()
+        return job.to_dict()
+
+    @classmethod
+    def find(cls, job_id, user_id):
+        job = cls.query.filter_by(id=job_id, user_id=user_id).first()
+        return job.to_dict() if job else None
+
+    @classmethod
+    def finish(cls, job_ids, status, analysis):
+        table = cls.__table__
+        db.session.execute(table.update().where(table.c.id.in_(job_ids)).values(status=status, analysis=analysis))
+        db.session.commit()
@@ -0,0 +1,32 @@
+from datetime import datetime
+from decimal import Decimal
+from ..extentions import db
+import uuid
+
+class PositionSummary(db.Model):
+    __tablename__ = "position_summaries"
+    __table_args__ = (db.UniqueConstraint("user_id", "stock_id", name="uq_position_summaries_user_id_stock_id"),)
+
+    # running totals per (user, stock) kept up to date by every fill, under both
+    # average-cost and FIFO lot accounting, closed positions are kept for their realized P&L
+    id = db.Column(db.String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = db.Column(db.String, db.ForeignKey("users.id"), nullable=False)
+    stock_id = db.Column(db.String, db.ForeignKey("stocks.id"), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    cost_basis = db.Column(db.Numeric(18, 4), nullable=False, default=Decimal(0))
+    realized_pnl = db.Column(db.Numeric(18, 4), nullable=False, default=Decimal(0))
+    fifo_cost_basis = db.Column(db.Numeric(18, 4), nullable=False, default=Decimal(0))
+    fifo_realized_pnl = db.Column(db.Numeric(18, 4), nullable=False, default=Decimal(0))
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+
+    stock = db.relationship("Stock")
+
+    def to_dict(self, method="fifo"):
+        cost_basis = self.fifo_cost_basis if method == "fifo" else self.cost_basis
+        return {
+            "stock_id": self.stock_id,
+            "quantity": self.quantity,
+            "cost_basis": cost_basis,
+            "average_cost": (cost_basis / self.quantity).quantize(Decimal("0.0001")) if self.quantity else None,
+            "realized_pnl": self.fifo_realized_pnl if method == "fifo" else self.realized_pnl,
+        }
@@ -0,0 +1,66 @@
+from datetime import datetime
+from decimal import Decimal
+from ..extentions import db
+
+DIRECTIONS = ("above", "below")
+
+class PriceAlert(db.Model):
+    __tablename__ = "price_alerts"
+
+    # integer ids so the alert engine can keep them in int64 arrays next to the thresholds
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.String, db.ForeignKey("users.id"), nullable=False, index=True)
+    symbol = db.Column(db.String(10), nullable=False)
+    # "above" fires once the price is at or over the threshold, "below" once it is at or under it
+    direction = db.Column(db.String(5), nullable=False)
+    threshold = db.Column(db.Numeric(12, 2), nullable=False)
+    # alerts are one-shot, set when the alert fires
+    triggered_at = db.Column(db.DateTime)
+    triggered_price = db.Column(db.Numeric(12, 2))
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "symbol": self.symbol,
+            "direction": self.direction,
+            "threshold": self.threshold,
+            "active": self.triggered_at is None,
+            "triggered_at": self.triggered_at,
+            "triggered_price": self.triggered_price,
+            "created_at": self.created_at,
+        }
+
+    # (id, user id, symbol, is above, threshold) of every alert that hasn't fired, or of those with
+    # an id over `after_id`, fetched `chunk_size` rows per round trip
+    @classmethod
+    def iter_active(cls, after_id=None, chunk_size=10000):
+        table = cls.__table__
+        query = (
+            db.select(table.c.id, table.c.user_id, table.c.symbol, table.c.direction == "above", db.cast(table.c.threshold, db.Float))
+            .where(table.c.triggered_at.is_(None))
+            .execution_options(yield_per=chunk_size)
+        )
+        if after_id is not None:
+            query = query.where(table.c.id > after_id)
+        for rows in db.session.execute(query).partitions():
+            yield from rows
+
+    # marks the alerts fired at `price` and returns the ids this call fired, alerts fired by another
+    # process or deleted in the meantime are left out so nobody is notified twice
+    @classmethod
+    def trigger(cls, alert_ids, price, chunk_size=500):
+        table = cls.__table__
+        now = datetime.now()
+        price = Decimal(str(price)).quantize(Decimal("0.01"))
+        fired = []
+        for i in range(0, len(alert_ids), chunk_size):
+            result = db.session.execute(
+                table.update()
+                .where(table.c.id.in_(alert_ids[i:i + chunk_size]), table.c.triggered_at.is_(None))
+                .values(triggered_at=now, triggered_price=price)
+                .returning(table.c.id)
+            )
+            fired.extend(alert_id for (alert_id,) in result)
+        db.session.commit()
+        return fired
@@ -1,7 +1,19 @@
 from datetime import datetime
+from urllib.parse import urlparse
 import uuid
 from ..extentions import db
 
+# favicon service that needs no key, looked up by the bare domain of the company's website
+LOGO_URL = "https://www.google.com/s2/favicons?domain={domain}&sz=128"
+
+
+def logo_url_for(website):
+    domain = urlparse(website if "//" in website else f"//{website}").hostname if website else None
+    if not domain:
+        return None
+    return LOGO_URL.format(domain=domain.removeprefix("www."))
+
+
 class Stock(db.Model):
     __tablename__ = "stocks"
 
@@ -10,6 +22,11 @@ class Stock(db.Model):
     company_name = db.Column(db.String(150), nullable=False)
     industry = db.Column(db.String(150), nullable=False)
     sector = db.Column(db.String(150), nullable=False)
+    website = db.Column(db.String(255))
+    logo_url = db.Column(db.String(255))
+    exchange = db.Column(db.String(20))
+    currency = db.Column(db.String(10))
+    metadata_refreshed_at = db.Column(db.DateTime, index=True)
     created_at = db.Column(db.DateTime, default=datetime.now)
 
     transactions = db.relationship("Transaction", back_populates="stock")
@@ -21,5 +38,24 @@ class Stock(db.Model):
             "company_name": self.company_name,
             "industry": self.industry,
             "sector": self.sector,
+            "website": self.website,
+            "logo_url": self.logo_url,
+            "exchange": self.exchange,
+            "currency": self.currency,
         }
 
+    # (symbol, company_name) of every stock, for the search index
+    @classmethod
+    def iter_listings(cls):
+        yield from db.session.execute(db.select(cls.symbol, cls.company_name))
+
+    def update_metadata(self, info):
+        self.company_name = info.get("longName") or self.company_name
+        self.industry = info.get("industry") or self.industry
+        self.sector = info.get("sector") or self.sector
+        self.website = info.get("website")
+        self.logo_url = info.get("logo_url") or logo_url_for(self.website)
+        self.exchange = info.get("exchange")
+        self.currency = info.get("currency")
+        self.metadata_refreshed_at = datetime.now()
+
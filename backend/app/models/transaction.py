@@ -12,8 +12,13 @@ class Transaction(db.Model):
     quantity = db.Column(db.Integer, nullable=False)
     cost_per_share = db.Column(db.Numeric(15, 2), nullable=False)
     total_cost = db.Column(db.Numeric(15, 2), nullable=False)
+    # shares of a buy not yet consumed by later sells under FIFO, null for sells
+    open_quantity = db.Column(db.Integer)
     created_at = db.Column(db.DateTime, default=datetime.now)
 
+    # backs keyset pagination of a user's history, newest first
+    __table_args__ = (db.Index("ix_transactions_user_id_created_at_id", user_id, created_at.desc(), id),)
+
     user = db.relationship("User", back_populates="transactions")
     stock = db.relationship("Stock", back_populates="transactions")
 
@@ -1,5 +1,9 @@
 from datetime import datetime
-from ..extentions import bcrypt, db
+from sqlalchemy import event
+from sqlalchemy.orm import Session, joinedload
+from ..extentions import db, password_hasher, user_cache
+from .user_stock import UserStock
+from .transaction import Transaction
 import uuid
 
 class User(db.Model):
@@ -12,16 +16,50 @@ class User(db.Model):
     password_hash = db.Column(db.String(128), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.now)
     updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+    # bumped whenever what the user's portfolio and transaction pages show changes, their ETags are derived from it
+    data_version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
 
     user_stocks = db.relationship("UserStock", back_populates="user")
     transactions = db.relationship("Transaction", back_populates="user")
 
+    # both run on the password hasher's process pool and raise `PasswordHasherBusy` when it is full
     def set_password(self, password):
-        self.password_hash = bcrypt.generate_password_hash(password).decode("utf-8")
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
-        return bcrypt.check_password_hash(self.password_hash, password)
+        return password_hasher.check(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        return password_hasher.needs_rehash(self.password_hash)
     
+    # the signed in user behind `flask_jwt_extended.current_user`, from the per process cache. loaded
+    # from the primary even in read only requests, a lagging replica would put a user missing a
+    # write they just made (or missing altogether right after signing up) into the cache
+    @classmethod
+    def cached(cls, user_id):
+        def load(user_id):
+            user = db.session.get(cls, user_id, bind_arguments={"bind": db.engine})
+            return user.to_dict() if user else None
+
+        return user_cache.get(user_id, load)
+
+    # read fresh every time, the cached users are per process and can't carry it
+    @classmethod
+    def data_version_of(cls, user_id):
+        return db.session.query(cls.data_version).filter(cls.id == user_id).scalar()
+
+    # `user_ids` is a list or a select of user ids, a Core update keeps the cached users (they don't
+    # carry the version) and leaves updated_at to profile changes
+    @classmethod
+    def bump_data_versions(cls, user_ids):
+        table = cls.__table__
+        db.session.execute(
+            table.update().where(table.c.id.in_(user_ids))
+            .values(data_version=table.c.data_version + 1, updated_at=table.c.updated_at)
+        )
+
+    # positions and transactions are queried with their stocks, walking the relationships would
+    # load each stock on its own
     def to_dict(self, include_user_stocks=False, include_transactions=False):
         user_data = {
             "id": self.id,
@@ -32,10 +70,43 @@ class User(db.Model):
         }
 
         if include_user_stocks:
-            user_data["user_stocks"] = [user_stock.to_dict() for user_stock in self.user_stocks]
+            user_data["user_stocks"] = [user_stock.to_dict() for user_stock in UserStock.query_for_user(self.id)]
         
         if include_transactions:
-            user_data["transactions"] = [transaction.to_dict() for transaction in self.transactions]
+            transactions = Transaction.query.options(joinedload(Transaction.stock)).filter(Transaction.user_id == self.id)
+            user_data["transactions"] = [transaction.to_dict() for transaction in transactions]
         
         return user_data
 
+
+# cached users are dropped when their row is flushed as changed or deleted and once more after
+# the commit, so a request that read the row in between can't keep the old one cached
+@event.listens_for(Session, "after_flush")
+def invalidate_flushed_users(session, flush_context):
+    user_ids = {user.id for user in [*session.dirty, *session.deleted] if isinstance(user, User)}
+    if user_ids:
+        user_cache.invalidate(user_ids)
+        session.info.setdefault("invalidated_users", set()).update(user_ids)
+
+
+# bulk UPDATE or DELETE statements on users can't say which rows they hit
+@event.listens_for(Session, "do_orm_execute")
+def invalidate_bulk_users(orm_execute_state):
+    if (orm_execute_state.is_update or orm_execute_state.is_delete) and orm_execute_state.bind_mapper is User.__mapper__:
+        user_cache.clear()
+        orm_execute_state.session.info["invalidate_all_users"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def invalidate_committed_users(session):
+    if session.info.pop("invalidate_all_users", False):
+        user_cache.clear()
+    user_ids = session.info.pop("invalidated_users", None)
+    if user_ids:
+        user_cache.invalidate(user_ids)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def forget_invalidated_users(session, previous_transaction):
+    session.info.pop("invalidate_all_users", None)
+    session.info.pop("invalidated_users", None)
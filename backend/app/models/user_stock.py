@@ -1,9 +1,13 @@
 from datetime import datetime
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import contains_eager
 from ..extentions import db
+from .stock import Stock
 import uuid
 
 class UserStock(db.Model):
     __tablename__ = "user_stocks"
+    __table_args__ = (db.UniqueConstraint("user_id", "stock_id", name="uq_user_stocks_user_id_stock_id"),)
 
     id = db.Column(db.String, primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = db.Column(db.String, db.ForeignKey("users.id"), nullable=False)
@@ -30,3 +34,61 @@ class UserStock(db.Model):
         
         return user_stock_data
 
+
+    # a user's positions with their stock loaded by the same query, filterable on Stock columns
+    @classmethod
+    def query_for_user(cls, user_id):
+        return cls.query.join(cls.stock).options(contains_eager(cls.stock)).filter(cls.user_id == user_id)
+
+    # (symbol, quantity) rows only, for callers that don't need full objects
+    @classmethod
+    def holdings(cls, user_id):
+        return (
+            db.session.query(Stock.symbol, cls.quantity)
+            .join(cls, cls.stock_id == Stock.id)
+            .filter(cls.user_id == user_id)
+            .order_by(Stock.symbol)
+            .all()
+        )
+
+    # atomically adds shares to a position, creating it if needed, and returns the new quantity
+    @classmethod
+    def add_shares(cls, user_id, stock_id, quantity):
+        return cls.add_shares_bulk(user_id, {stock_id: quantity})[stock_id]
+
+    # same as `add_shares` for many positions of one user in a single multi-row upsert,
+    # returns {stock_id: new quantity}
+    @classmethod
+    def add_shares_bulk(cls, user_id, quantities):
+        table = cls.__table__
+        dialect = postgresql if db.session.get_bind().dialect.name == "postgresql" else sqlite
+        statement = dialect.insert(table).values([
+            {"id": str(uuid.uuid4()), "user_id": user_id, "stock_id": stock_id, "quantity": quantity}
+            for stock_id, quantity in quantities.items()
+        ])
+        statement = statement.on_conflict_do_update(
+            index_elements=["user_id", "stock_id"],
+            set_={"quantity": table.c.quantity + statement.excluded.quantity, "updated_at": datetime.now()}
+        ).returning(table.c.stock_id, table.c.quantity)
+
+        return dict(db.session.execute(statement).all())
+
+    # atomically removes shares from a position and returns the new quantity, or None when the
+    # position doesn't hold enough shares, positions that reach zero are deleted
+    @classmethod
+    def remove_shares(cls, user_id, stock_id, quantity):
+        table = cls.__table__
+        statement = (
+            table.update()
+            .where(table.c.user_id == user_id, table.c.stock_id == stock_id, table.c.quantity >= quantity)
+            .values(quantity=table.c.quantity - quantity, updated_at=datetime.now())
+            .returning(table.c.quantity)
+        )
+        remaining = db.session.execute(statement).scalar_one_or_none()
+
+        if remaining == 0:
+            db.session.execute(
+                table.delete().where(table.c.user_id == user_id, table.c.stock_id == stock_id, table.c.quantity == 0)
+            )
+
+        return remaining
@@ -1,9 +1,15 @@
 from .auth import auth_blueprint
 from .stocks import stocks_blueprint
 from .users import users_blueprint
+from .metrics import metrics_blueprint
+from .prices import PricesNamespace
+from ..extentions import socketio
+from ..services.price_stream import NAMESPACE
 
 def register_routes(app):
     app.register_blueprint(auth_blueprint, url_prefix="/api/auth")
     app.register_blueprint(stocks_blueprint, url_prefix="/api/stocks")
     app.register_blueprint(users_blueprint, url_prefix="/api/users")
+    app.register_blueprint(metrics_blueprint, url_prefix="/api")
+    socketio.on_namespace(PricesNamespace(NAMESPACE))
 
@@ -1,7 +1,9 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, set_access_cookies, jwt_required, unset_access_cookies, get_jwt_identity
+from flask_jwt_extended import create_access_token, set_access_cookies, jwt_required, unset_access_cookies, get_jwt_identity, current_user
 from ..models import User
-from ..extentions import db
+from ..extentions import db, jwt
+from ..db_routing import read_only
+from ..services import PasswordHasherBusy
 import logging
 import re
 
@@ -12,6 +14,23 @@ def is_valid_email(email):
     return re.match(pattern, email) is not None
 
 
+# `current_user` in every jwt_required route, answered from the user cache on warm paths
+@jwt.user_lookup_loader
+def load_current_user(jwt_header, jwt_data):
+    return User.cached(jwt_data["sub"])
+
+
+# a valid token for a user that no longer exists
+@jwt.user_lookup_error_loader
+def current_user_not_found(jwt_header, jwt_data):
+    if request.endpoint == "auth.check_session":
+        response = jsonify({"is_authenticated": False, "user": None })
+        unset_access_cookies(response)
+        return response
+
+    return jsonify({"message": "User not found"}), 404
+
+
 @auth_blueprint.route("/signup", methods=["POST"])
 def signup():
     body = request.get_json()
@@ -50,6 +69,14 @@ def login():
     user = User.query.filter_by(email=email).first()
 
     if user and user.check_password(password):
+        # a hash made with an older cost is upgraded while the password is at hand
+        if user.password_needs_rehash():
+            try:
+                user.set_password(password)
+                db.session.commit()
+            except PasswordHasherBusy:
+                db.session.rollback()
+
         access_token = create_access_token(identity=user.id)
         response = jsonify(user.to_dict())
         set_access_cookies(response, access_token, max_age=60 * 60 * 24 * 7)
@@ -68,20 +95,15 @@ def logout():
 
 
 @auth_blueprint.route("/validate", methods=["GET"])
+@read_only
 @jwt_required(optional=True)
 def check_session():
+    current_user_id = get_jwt_identity()
     try:
-        current_user_id = get_jwt_identity()
         if not current_user_id:
             return jsonify({"is_authenticated": False, "user": None })
-        
-        user = User.query.get(current_user_id)
-        if not user:
-            response = jsonify({"is_authenticated": False, "user": None })
-            unset_access_cookies(response)
-            return response
-
-        return jsonify({"is_authenticated": True, "user": user.to_dict()})
+
+        return jsonify({"is_authenticated": True, "user": current_user.to_dict()})
     except Exception as e:
         logging.error(f"Error fetching user with ID {current_user_id}: {str(e)}")
         return jsonify({ "message": "Something went wrong"}), 500
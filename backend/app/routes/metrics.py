@@ -0,0 +1,31 @@
+from functools import wraps
+from flask import Blueprint, request, jsonify, current_app
+from ..extentions import metrics
+
+metrics_blueprint = Blueprint("metrics", __name__)
+
+
+# operational endpoints are read by prometheus and operators rather than the app, so a static
+# token instead of a user session, without a token configured they don't exist
+def metrics_token_required(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = current_app.config["METRICS_TOKEN"]
+        if not token:
+            return jsonify({"message": "Resource not found"}), 404
+
+        if request.headers.get("Authorization") != f"Bearer {token}":
+            return jsonify({"message": "Unauthorized"}), 401
+
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@metrics_blueprint.route("/metrics", methods=["GET"])
+@metrics_token_required
+def get_metrics():
+    # metrics are still collected for the slow request log without a token
+    if "metrics" not in current_app.extensions:
+        return jsonify({"message": "Resource not found"}), 404
+
+    return metrics.render(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
@@ -0,0 +1,44 @@
+from flask import request, current_app
+from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+from flask_socketio import Namespace, ConnectionRefusedError, join_room, leave_room
+from ..extentions import price_stream
+from ..services.history_store import SYMBOL_PATTERN
+from ..services.price_stream import room_for, user_room
+
+
+def parse_symbols(data):
+    symbols = data.get("symbols") if isinstance(data, dict) else None
+    if not isinstance(symbols, list):
+        return []
+    symbols = [symbol.strip().upper() for symbol in symbols if isinstance(symbol, str)]
+    return list(dict.fromkeys(symbol for symbol in symbols if SYMBOL_PATTERN.fullmatch(symbol)))
+
+
+class PricesNamespace(Namespace):
+    # same cookie based jwt as the http routes, checked on the handshake request
+    def on_connect(self, auth=None):
+        try:
+            verify_jwt_in_request()
+        except Exception:
+            raise ConnectionRefusedError("Unauthorized")
+
+        join_room(user_room(get_jwt_identity()))
+
+    def on_disconnect(self):
+        price_stream.unsubscribe(request.sid)
+
+    def on_subscribe(self, data):
+        # the limit is on everything the connection is subscribed to, not on one message
+        symbols = price_stream.subscribe(request.sid, parse_symbols(data), limit=current_app.config["PRICE_STREAM_MAX_SYMBOLS"])
+        for symbol in symbols:
+            join_room(room_for(symbol))
+
+        # the ack carries the latest known prices so the client doesn't wait for the next change
+        return {"subscribed": symbols, "prices": {symbol: price_stream.last_price(symbol) for symbol in symbols}}
+
+    def on_unsubscribe(self, data):
+        symbols = parse_symbols(data)
+        for symbol in symbols:
+            leave_room(room_for(symbol))
+        price_stream.unsubscribe(request.sid, symbols)
+        return {"unsubscribed": symbols}
@@ -1,22 +1,29 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from ..models import User, UserStock, Stock, Transaction
-from ..extentions import db
-from decimal import Decimal
-import yfinance as yf
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required, current_user
+from ..models import UserStock, Stock, User
+from ..extentions import db, market_data, price_stream, symbol_index
+from ..db_routing import read_only
+from .metrics import metrics_token_required
+from ..etags import make_etag, cache_headers, not_modified
+from ..services.quote_tokens import issue_quote_token, verify_quote_token
+from ..services.portfolio import record_fills, OversoldError
+from ..services.allocation import most_held
+from ..services.downsample import lttb
+from ..services.lazy_imports import numpy
+from decimal import Decimal, InvalidOperation
 import logging
-import pandas as pd
-import math
 
 stocks_blueprint = Blueprint("stocks", __name__)
 
+# the price a client trades at has to be within 1% of the expected price
+def is_price_close(expected_price, price):
+    return expected_price * Decimal(0.99) <= price <= expected_price * Decimal(1.01)
+
+
 @stocks_blueprint.route("/buy", methods=["POST"])
 @jwt_required()
 def buy_stock():
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
-    if not user:
-        return jsonify({"message": "User not found"}), 404
+    user = current_user
 
     body = request.get_json()
     symbol = body.get("symbol")
@@ -28,62 +35,58 @@ def buy_stock():
 
     symbol = symbol.upper()
 
-    # validate ticker using yfinance
-    stock_info = (yf.Ticker(symbol)).get_info()
+    # check if the stock already exists in the database
+    stock = Stock.query.filter_by(symbol=symbol).first()
 
-    try:
-        # if we can't access these fields, the stock symbol is invalid
-        company_name = stock_info["longName"]
-        expected_current_price = Decimal(stock_info["currentPrice"])
-        industry = stock_info["industry"]
-        sector = stock_info["sector"]
-    except KeyError as e:
-        logging.error(f"Error accessing stock: {str(e)}")
-        return jsonify({"message": "Invalid stock symbol"}), 400
+    # a valid quote token from GET /<symbol> stands in for the live price
+    expected_current_price = verify_quote_token(body.get("quote_token"), symbol, user.id)
+
+    if expected_current_price is None or not stock:
+        # validate ticker through the cached market data provider
+        stock_info = market_data.get_info(symbol)
+
+        try:
+            # if we can't access these fields, the stock symbol is invalid
+            company_name = stock_info["longName"]
+            industry = stock_info["industry"]
+            sector = stock_info["sector"]
+            if expected_current_price is None:
+                expected_current_price = Decimal(stock_info["currentPrice"])
+        except KeyError as e:
+            logging.error(f"Error accessing stock: {str(e)}")
+            return jsonify({"message": "Invalid stock symbol"}), 400
     
     # validate the current price approximately matches the expected value
-    if not (expected_current_price * Decimal(0.99) <= current_price <= expected_current_price * Decimal(1.01)):
+    if not is_price_close(expected_current_price, current_price):
         return jsonify({"message": "The current price is incorrect"}), 400
     
-    # check if the stock already exists in the database
-    stock = Stock.query.filter_by(symbol=symbol).first()
     if not stock:
         # add stock to the database if not found
         stock = Stock(symbol=symbol, company_name=company_name, industry=industry, sector=sector)
+        stock.update_metadata(stock_info)
         db.session.add(stock)
 
-    # check if user already owns the stock
-    user_stock = UserStock.query.filter_by(user_id=user.id, stock_id=stock.id).first()
-    refresh_user = False
-    if user_stock:
-        user_stock.quantity += quantity
-    else:
-        user_stock = UserStock(user_id=user.id, stock_id=stock.id, quantity=quantity)
-        refresh_user = True
-    
-    db.session.add(user_stock)
-
-    total_cost = current_price * quantity
-    # now create the buy transaction
-    transaction = Transaction(
-        user_id=user.id,
-        stock_id=stock.id,
-        transaction_type="buy",
-        quantity=quantity,
-        total_cost=total_cost,
-        cost_per_share=current_price
-    )
-    db.session.add(transaction)
+        db.session.flush()
+
+    # add to the user's position in one atomic upsert, a new position starts at exactly `quantity`
+    new_quantity = UserStock.add_shares(user.id, stock.id, quantity)
+    refresh_user = new_quantity == quantity
+
+    # now create the buy transaction and fold it into the position's P&L summary
+    [transaction] = record_fills(user.id, [{"stock_id": stock.id, "transaction_type": "buy", "quantity": quantity, "cost_per_share": current_price}])
     db.session.commit()
 
+    # newly listed stocks become searchable right away
+    symbol_index.add(stock.symbol, stock.company_name)
+
     response_object = {
         "message": f"Successfully bought {quantity} shares of {symbol}",
-        "quantity": user_stock.quantity, "total_cost": transaction.total_cost,
+        "quantity": new_quantity, "total_cost": transaction["total_cost"],
         "new_user_stock": None
     }
 
     if refresh_user:
-        new_user_stock = db.session.query(UserStock).join(Stock).filter(UserStock.user_id == user.id, Stock.id == stock.id).first()
+        new_user_stock = UserStock.query_for_user(user.id).filter(Stock.id == stock.id).first()
         if new_user_stock:
             new_user_stock = new_user_stock.to_dict()
             response_object["new_user_stock"] = new_user_stock
@@ -94,10 +97,7 @@ def buy_stock():
 @stocks_blueprint.route("/sell", methods=["POST"])
 @jwt_required()
 def sell_stock():
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
-    if not user:
-        return jsonify({"message": "User not found"}), 404
+    user = current_user
 
     body = request.get_json()
     symbol = body.get("symbol")
@@ -109,18 +109,22 @@ def sell_stock():
     
     symbol = symbol.upper()
 
-    # validate ticker using yfinance
-    stock_info = (yf.Ticker(symbol)).get_info()
+    # a valid quote token from GET /<symbol> stands in for the live price
+    expected_current_price = verify_quote_token(body.get("quote_token"), symbol, user.id)
 
-    try:
-        # if we can't access these fields, the stock symbol is invalid
-        expected_current_price = Decimal(stock_info["currentPrice"])
-    except KeyError as e:
-        logging.error(f"Error accessing stock: {str(e)}")
-        return jsonify({"message": "Invalid stock symbol"}), 400
+    if expected_current_price is None:
+        # validate ticker through the cached market data provider
+        stock_info = market_data.get_info(symbol)
+
+        try:
+            # if we can't access these fields, the stock symbol is invalid
+            expected_current_price = Decimal(stock_info["currentPrice"])
+        except KeyError as e:
+            logging.error(f"Error accessing stock: {str(e)}")
+            return jsonify({"message": "Invalid stock symbol"}), 400
     
     # validate the total cost approximately matches the expected value
-    if not (expected_current_price * Decimal(0.99) <= current_price <= expected_current_price * Decimal(1.01)):
+    if not is_price_close(expected_current_price, current_price):
         return jsonify({"message": "The current price is incorrect"}), 400
     
     # find the stock and user's ownership
@@ -128,42 +132,196 @@ def sell_stock():
     if not stock:
         return jsonify({"message": "Stock not found"}), 404
     
-    user_stock = UserStock.query.filter_by(user_id=user.id, stock_id=stock.id).first()
-    if not user_stock:
-        return jsonify({"message": "You do not own this stock"}), 400
-
-    if user_stock.quantity < quantity:
+    # deduct shares only if enough are held, in a single conditional update
+    remaining = UserStock.remove_shares(user.id, stock.id, quantity)
+    if remaining is None:
+        db.session.rollback()
+        if not UserStock.query.filter_by(user_id=user.id, stock_id=stock.id).first():
+            return jsonify({"message": "You do not own this stock"}), 400
         return jsonify({"message": "Not enough shares to sell"}), 400
     
-    # deduct shares and update or delete the UserStock
-    user_stock.quantity -= quantity
-    if user_stock.quantity == 0:
-        db.session.delete(user_stock)
-    else:
-        db.session.add(user_stock)
-    
-    total_cost = current_price * quantity
-    # create the sell transaction
-    transaction = Transaction(
-        user_id=user.id, stock_id=stock.id, transaction_type="sell",
-        quantity=quantity, total_cost=total_cost, cost_per_share=current_price
+    # create the sell transaction and fold it into the position's P&L summary
+    try:
+        [transaction] = record_fills(user.id, [{"stock_id": stock.id, "transaction_type": "sell", "quantity": quantity, "cost_per_share": current_price}])
+    except OversoldError:
+        db.session.rollback()
+        return jsonify({"message": "The position's transaction history doesn't cover the shares being sold"}), 400
+    db.session.commit()
+
+    return jsonify({"message": f"Successfully sold {quantity} shares of {symbol}", "quantity": remaining, "total_cost": transaction["total_cost"]})
+
+
+@stocks_blueprint.route("/orders", methods=["POST"])
+@jwt_required()
+def place_orders():
+    user = current_user
+
+    body = request.get_json()
+    raw_orders = body.get("orders")
+
+    if not isinstance(raw_orders, list) or not raw_orders or len(raw_orders) > current_app.config["MAX_ORDERS_PER_REQUEST"]:
+        return jsonify({"message": "Invalid data"}), 400
+
+    orders = []
+    for raw_order in raw_orders:
+        if not isinstance(raw_order, dict):
+            return jsonify({"message": "Invalid data"}), 400
+
+        symbol = raw_order.get("symbol")
+        transaction_type = raw_order.get("transaction_type")
+        quantity = raw_order.get("quantity")
+        try:
+            current_price = Decimal(str(raw_order.get("current_price")))
+        except InvalidOperation:
+            return jsonify({"message": "Invalid data"}), 400
+
+        if (not isinstance(symbol, str)) or transaction_type not in ("buy", "sell") or (not isinstance(quantity, int)) or quantity <= 0 or (not current_price.is_finite()) or current_price <= 0:
+            return jsonify({"message": "Invalid data"}), 400
+
+        symbol = symbol.strip().upper()
+        orders.append({
+            "symbol": symbol,
+            "transaction_type": transaction_type,
+            "quantity": quantity,
+            "current_price": current_price,
+            "expected_price": verify_quote_token(raw_order.get("quote_token"), symbol, user.id)
+        })
+
+    symbols = list(dict.fromkeys(order["symbol"] for order in orders))
+    stocks = {stock.symbol: stock for stock in Stock.query.filter(Stock.symbol.in_(symbols)).all()}
+    positions = dict(
+        db.session.query(Stock.symbol, UserStock.quantity)
+        .join(Stock, Stock.id == UserStock.stock_id)
+        .filter(UserStock.user_id == user.id, Stock.symbol.in_(symbols))
+        .all()
     )
-    db.session.add(transaction)
+
+    # one batched provider call for every symbol without a quote token or a Stock row
+    missing_quotes = {order["symbol"] for order in orders if order["expected_price"] is None}
+    infos = market_data.get_infos(
+        [symbol for symbol in symbols if symbol in missing_quotes or symbol not in stocks],
+        timeout=current_app.config["MARKET_DATA_FETCH_TIMEOUT"]
+    )
+
+    # validate every order against the running position before anything is written
+    results = []
+    deltas = dict.fromkeys(symbols, 0)
+    running = dict(positions)
+    for order in orders:
+        symbol = order["symbol"]
+        info = infos.get(symbol) or {}
+        result = {"symbol": symbol, "transaction_type": order["transaction_type"], "quantity": order["quantity"]}
+        results.append(result)
+
+        if order["expected_price"] is None and info.get("currentPrice") is None:
+            result["error"] = "Invalid stock symbol"
+            continue
+
+        if symbol not in stocks and not all(info.get(field) for field in ("longName", "industry", "sector")):
+            result["error"] = "Invalid stock symbol"
+            continue
+
+        expected_price = order["expected_price"] if order["expected_price"] is not None else Decimal(info["currentPrice"])
+        if not is_price_close(expected_price, order["current_price"]):
+            result["error"] = "The current price is incorrect"
+            continue
+
+        signed_quantity = order["quantity"] if order["transaction_type"] == "buy" else -order["quantity"]
+        if signed_quantity < 0 and running.get(symbol, 0) < order["quantity"]:
+            result["error"] = "Not enough shares to sell" if running.get(symbol) else "You do not own this stock"
+            continue
+
+        running[symbol] = running.get(symbol, 0) + signed_quantity
+        deltas[symbol] += signed_quantity
+        result["cost_per_share"] = order["current_price"]
+        result["total_cost"] = order["current_price"] * order["quantity"]
+
+    # all or nothing
+    if any("error" in result for result in results):
+        return jsonify({"message": "One or more orders are invalid", "results": results}), 400
+
+    new_stocks = [Stock(symbol=symbol, company_name=infos[symbol]["longName"], industry=infos[symbol]["industry"], sector=infos[symbol]["sector"]) for symbol in symbols if symbol not in stocks]
+    for stock in new_stocks:
+        stock.update_metadata(infos[stock.symbol])
+        stocks[stock.symbol] = stock
+    if new_stocks:
+        db.session.add_all(new_stocks)
+        db.session.flush()
+
+    # only the net change per symbol touches the position, all buys go in one upsert
+    additions = {stocks[symbol].id: delta for symbol, delta in deltas.items() if delta > 0}
+    if additions:
+        UserStock.add_shares_bulk(user.id, additions)
+
+    for symbol, delta in deltas.items():
+        if delta < 0 and UserStock.remove_shares(user.id, stocks[symbol].id, -delta) is None:
+            # another request sold these shares since they were validated
+            db.session.rollback()
+            return jsonify({"message": "Your positions changed while placing the orders, please try again"}), 409
+
+    try:
+        transactions = record_fills(user.id, [
+            {
+                "stock_id": stocks[result["symbol"]].id,
+                "transaction_type": result["transaction_type"],
+                "quantity": result["quantity"],
+                "cost_per_share": result["cost_per_share"]
+            }
+            for result in results
+        ])
+    except OversoldError:
+        db.session.rollback()
+        return jsonify({"message": "The position's transaction history doesn't cover the shares being sold"}), 400
     db.session.commit()
+    symbol_index.add_many((stock.symbol, stock.company_name) for stock in new_stocks)
+
+    # the amounts as recorded, in cents
+    for result, transaction in zip(results, transactions):
+        result["cost_per_share"] = transaction["cost_per_share"]
+        result["total_cost"] = transaction["total_cost"]
+
+    return jsonify({
+        "message": f"Successfully placed {len(results)} orders",
+        "results": results,
+        "positions": {symbol: running[symbol] for symbol in symbols}
+    }), 200
+
+
+@stocks_blueprint.route("/search", methods=["GET"])
+@jwt_required()
+def search_stocks():
+    query = request.args.get("q", "")
+    limit = request.args.get("limit", 10, type=int)
+
+    if not 1 <= limit <= current_app.config["SEARCH_MAX_RESULTS"]:
+        return jsonify({"message": "Invalid limit"}), 400
+
+    return jsonify({"results": symbol_index.search(query, limit=limit)}), 200
+
+
+# top symbols and sectors across every user's open positions, from the holding summaries
+@stocks_blueprint.route("/most-held", methods=["GET"])
+@read_only
+@jwt_required()
+def get_most_held():
+    limit = request.args.get("limit", 10, type=int)
+
+    if not 1 <= limit <= current_app.config["MOST_HELD_MAX_RESULTS"]:
+        return jsonify({"message": "Invalid limit"}), 400
 
-    return jsonify({"message": f"Successfully sold {quantity} shares of {symbol}", "quantity": user_stock.quantity, "total_cost": transaction.total_cost})
+    return jsonify(most_held(limit)), 200
 
 
-# periods = ["1d", "5d", "1mo", "3mo", "6mo", "1y", "2y", "5y", "10y", "ytd", "max"]
-# intervals = ["1m", "2m", "5m", "15m", "30m", "60m", "90m", "1h", "1d", "5d", "1wk", "1mo", "3mo"]
+periods = ["1d", "5d", "1mo", "3mo", "6mo", "1y", "2y", "5y", "10y", "ytd", "max"]
+intervals = ["1m", "2m", "5m", "15m", "30m", "60m", "90m", "1h", "1d", "5d", "1wk", "1mo", "3mo"]
 
-def get_stock_data(symbol):
-    stock = yf.Ticker(symbol)
-    info = stock.get_info()
+# (info, time the quote was fetched, (timestamps, closes) or None)
+def get_stock_data(symbol, period="1y", interval="1d"):
+    info, quoted_at = market_data.get_quoted_info(symbol)
 
     # if stock does not exist
     if not info.get("symbol"):
-        return None, []
+        return None, None, None
 
     current_price = info.get("currentPrice")
     previous_close = info.get("previousClose")
@@ -173,27 +331,49 @@ def get_stock_data(symbol):
     info["regularMarketChangePercent"] = regular_market_change_percent
 
     try:
-        history = stock.history(period="1y", interval="1d")
-        if history.empty:
-            raise Exception()
+        series = market_data.get_history_series(symbol, period=period, interval=interval)
+        if not len(series[0]):
+            raise Exception("No price history")
+
+        return info, quoted_at, series
+    except Exception as e:
+        logging.error(f"Error fetching price history: {str(e)}")
+        return info, quoted_at, None
 
-        history.reset_index(inplace=True)
-        history["Date"] = pd.to_datetime(history["Date"])
 
-        data = history.apply(lambda row: [int(row["Date"].timestamp() * 1000), (0 if math.isnan(row["Close"]) else row["Close"])], axis=1).tolist()
+def get_chart_data(series, max_points=None):
+    if series is None:
+        return []
+
+    try:
+        # long ranges are reduced to at most `max_points` points that keep the chart's shape
+        timestamps, closes = series
+        closes = numpy().nan_to_num(closes, nan=0.0)
+        if max_points:
+            timestamps, closes = lttb(timestamps, closes, max_points)
 
-        return info, data
+        return list(zip(timestamps.tolist(), closes.tolist()))
     except Exception as e:
         logging.error(f"Error manipulating data: {str(e)}")
-        return info, []
+        return []
 
 @stocks_blueprint.route("/<symbol>", methods=["GET"])
+@read_only
 @jwt_required()
 def get_stock(symbol: str):
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
-    if not user:
-        return jsonify({"message": "User not found"}), 404
+    user = current_user
+
+    period = request.args.get("period", "1y")
+    interval = request.args.get("interval", "1d")
+    max_points = request.args.get("max_points", str(current_app.config["CHART_MAX_POINTS"]))
+
+    if period not in periods or interval not in intervals:
+        return jsonify({"message": "Invalid period or interval"}), 400
+
+    # parsed here, `type=int` would fall back to the default for a value that isn't a number
+    if not max_points.isdecimal() or not 3 <= int(max_points) <= current_app.config["CHART_MAX_POINTS_LIMIT"]:
+        return jsonify({"message": f"max_points must be an integer between 3 and {current_app.config['CHART_MAX_POINTS_LIMIT']}"}), 400
+    max_points = int(max_points)
 
     try:        
         symbol_uppercase = symbol.strip().upper()
@@ -201,18 +381,43 @@ def get_stock(symbol: str):
         if not symbol_uppercase:
             return jsonify({"message": "Invalid stock symbol"}), 400
         
-        info, data = get_stock_data(symbol=symbol_uppercase)
+        info, quoted_at, series = get_stock_data(symbol=symbol_uppercase, period=period, interval=interval)
 
         if not info:
             return jsonify({"info": None, "data": [], "user_stock": None}), 200
 
-        user_stock = db.session.query(UserStock).join(Stock).filter(UserStock.user_id == user.id, Stock.symbol == symbol_uppercase).first()
+        # the body only changes with the cached quote, the stored bars and the user's position, the
+        # history store only appends bars or rewrites the latest one
+        history = (len(series[0]), int(series[0][0]), int(series[0][-1]), float(series[1][-1])) if series else None
+        etag = make_etag("stock", user.id, User.data_version_of(user.id), symbol_uppercase, period, interval, max_points, quoted_at, history)
+        if not_modified(etag):
+            return "", 304, cache_headers(etag)
+
+        data = get_chart_data(series, max_points)
+
+        user_stock = UserStock.query_for_user(user.id).filter(Stock.symbol == symbol_uppercase).first()
 
         if user_stock:
             user_stock = user_stock.to_dict()
 
-        return jsonify({"info": info, "data": data, "user_stock": user_stock}), 200
+        # lets /buy and /sell verify the price locally instead of fetching it again, issued as of the
+        # quote so the same quote always gives the same token
+        quote_token = issue_quote_token(symbol_uppercase, info["currentPrice"], user.id, issued_at=quoted_at)
+
+        return jsonify({"info": info, "data": data, "user_stock": user_stock, "quote_token": quote_token}), 200, cache_headers(etag)
     except Exception as e:
         logging.error(f"Error fetching stock: {str(e)}")
         return jsonify({ "message": "Something went wrong fetching stock data"}), 500
 
+
+
+@stocks_blueprint.route("/cache/stats", methods=["GET"])
+@metrics_token_required
+def get_quote_cache_stats():
+    return jsonify(market_data.stats()), 200
+
+
+@stocks_blueprint.route("/stream/stats", methods=["GET"])
+@metrics_token_required
+def get_price_stream_stats():
+    return jsonify(price_stream.stats()), 200
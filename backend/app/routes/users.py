@@ -1,90 +1,135 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from ..models import User, UserStock, Transaction
-from sqlalchemy import desc
-import yfinance as yf
-from ..extentions import openaiClient
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
+from flask_jwt_extended import jwt_required, get_jwt_identity, current_user
+from ..models import UserStock, Transaction, User, PriceAlert
+from ..models.price_alert import DIRECTIONS
+from sqlalchemy import desc, func, or_
+from sqlalchemy.orm import joinedload
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from ..extentions import db, analysis_jobs, symbol_index, market_data, price_alerts
+from ..db_routing import read_only
+from ..etags import make_etag, cache_headers, not_modified
+from ..services.portfolio import portfolio_summary, portfolio_history
+from ..services.allocation import portfolio_allocation
+from ..services.transaction_io import export_csv, export_ndjson, parse_csv, parse_ndjson, import_transactions, TransactionImportError
+from ..services.history_store import PERIOD_DAYS, SYMBOL_PATTERN
 users_blueprint = Blueprint("users", __name__)
 
 @users_blueprint.route("/me/portfolio/analyze", methods=["GET"])
 @jwt_required()
 def get_portfolio_analysis():
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
-    if not user:
-        return jsonify({"message": "User not found"}), 404
+    user = current_user
     
-    user_stocks = UserStock.query.filter_by(user_id=user.id).all()
-
-    prompt_stock_data = ""
-
-    for user_stock in user_stocks:
-        stock = user_stock.stock
-        prompt_stock_data += f'{user_stock.quantity} {stock.symbol} '
-
-    prompt = f"""
-    I will give you my stock portfolio, I need a response to 3 questions 
-    and the response should be 1 sentence for each question and keep in mind 
-    that the max tokens should be 150. I have {prompt_stock_data}. 
-    The questions are 'What is good about portfolio?', 'What can be improved?', 
-    Can I get a couple of example tickers to improve my portfolio?' The response 
-    should be in the following format and separate each response with a newline character: 
-    1. <Answer for question 1>.
-    2. <Answer for question 2>.
-    3. <Answer for question 3>.
-    """
-    
-    response = openaiClient.completions.create(
-        model="gpt-3.5-turbo-instruct",
-        prompt=prompt,
-        max_tokens=150
-        )
-    
-    analysis = response.choices[0].text.strip().split("\n")
-    return jsonify({"analysis": analysis}), 200
+    # runs in the background, identical holdings are answered from the cache right away
+    job = analysis_jobs.submit(user.id, UserStock.holdings(user.id))
+
+    if job["status"] == "done":
+        return jsonify({"job_id": job["id"], "status": job["status"], "analysis": job["analysis"]}), 200
+
+    return jsonify({"job_id": job["id"], "status": job["status"]}), 202
+
+
+@users_blueprint.route("/me/portfolio/analyze/<job_id>", methods=["GET"])
+@jwt_required()
+def get_portfolio_analysis_job(job_id):
+    job = analysis_jobs.get(job_id, get_jwt_identity())
+    if not job:
+        return jsonify({"message": "Analysis not found"}), 404
+
+    return jsonify({"job_id": job["id"], "status": job["status"], "analysis": job["analysis"]}), 200
 
 
 @users_blueprint.route("/me/portfolio", methods=["GET"])
+@read_only
 @jwt_required()
 def get_portfolio():
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
-    if not user:
-        return jsonify({"message": "User not found"}), 404
-    
-    user_stocks = UserStock.query.filter_by(user_id=user.id).all()
+    user = current_user
 
-    ticker_string = ""
-    for user_stock in user_stocks:
-        stock = user_stock.stock
-        ticker_string += stock.symbol + " "
-
-    tickers = yf.Tickers(ticker_string)
+    # positions and their stocks only change with the user's data version
+    etag = make_etag("portfolio", user.id, User.data_version_of(user.id))
+    if not_modified(etag):
+        return "", 304, cache_headers(etag)
+    
+    user_stocks = UserStock.query_for_user(user.id).all()
 
     portfolio = [user_stock.to_dict() for user_stock in user_stocks]
 
+    # company metadata is persisted on the stock and kept fresh by the metadata refresher
     for item in portfolio:
-        stock = item["stock"]
-        info = tickers.tickers.get(stock["symbol"]).get_info()
-        website = info.get("website")
-        item["website"] = website
+        item["website"] = item["stock"]["website"]
+
+    return jsonify(portfolio), 200, cache_headers(etag)
+
+
+# not read only, the first read of a history recorded before summaries existed rebuilds them
+@users_blueprint.route("/me/portfolio/summary", methods=["GET"])
+@jwt_required()
+def get_portfolio_summary():
+    user = current_user
+
+    method = request.args.get("method", "fifo")
+    if method not in ("fifo", "average"):
+        return jsonify({"message": "Invalid accounting method"}), 400
+
+    # reads the maintained per-position summaries, so the cost only depends on the number of holdings
+    summary = portfolio_summary(user.id, method=method, timeout=current_app.config["MARKET_DATA_FETCH_TIMEOUT"])
+
+    return jsonify(summary), 200
+
 
-    return jsonify(portfolio), 200
+@users_blueprint.route("/me/portfolio/allocation", methods=["GET"])
+@read_only
+@jwt_required()
+def get_portfolio_allocation():
+    user = current_user
+
+    # the allocation summaries change with the user's trades and stock metadata, like their data version
+    etag = make_etag("allocation", user.id, User.data_version_of(user.id))
+    if not_modified(etag):
+        return "", 304, cache_headers(etag)
+
+    return jsonify(portfolio_allocation(user.id)), 200, cache_headers(etag)
+
+
+@users_blueprint.route("/me/portfolio/history", methods=["GET"])
+@read_only
+@jwt_required()
+def get_portfolio_history():
+    user = current_user
+
+    period = request.args.get("period", "1y")
+    if period not in PERIOD_DAYS:
+        return jsonify({"message": "Invalid period"}), 400
+
+    # one series for the whole portfolio, valued with the same daily closes as the stock charts
+    history = portfolio_history(user.id, period=period, timeout=current_app.config["MARKET_DATA_FETCH_TIMEOUT"])
+
+    return jsonify(history), 200
 
 
 @users_blueprint.route("/me/transactions", methods=["GET"])
+@read_only
 @jwt_required()
 def get_transactions():
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
-    if not user:
-        return jsonify({"message": "User not found"}), 404
+    user = current_user
+
+    etag = make_etag("transactions", user.id, User.data_version_of(user.id), request.query_string)
+    if not_modified(etag):
+        return "", 304, cache_headers(etag)
     
-    page = request.args.get("page", 1, type=int)
     per_page = request.args.get("per_page", 10, type=int)
 
-    # get user's transactions and sort in descending order
-    transactions = Transaction.query.filter_by(user_id=user.id).order_by(desc(Transaction.created_at))
+    # newest first, id breaks ties so the order is total, stock is joined in the same query
+    transactions = (
+        Transaction.query.options(joinedload(Transaction.stock))
+        .filter(Transaction.user_id == user.id)
+        .order_by(desc(Transaction.created_at), Transaction.id)
+    )
+
+    if "cursor" in request.args:
+        return get_transactions_after_cursor(transactions, user.id, request.args.get("cursor"), per_page, etag)
+
+    page = request.args.get("page", 1, type=int)
 
     paginated_transactions = transactions.paginate(page=page, per_page=per_page, error_out=False)
 
@@ -98,5 +143,164 @@ def get_transactions():
         "total_transactions": paginated_transactions.total,
         "has_next": paginated_transactions.has_next,
         "has_prev": paginated_transactions.has_prev
-    }), 200
+    }), 200, cache_headers(etag)
+
+
+# keyset pagination, the cursor is "<created_at iso>,<id>" of the last transaction on the previous page
+# and an empty cursor starts from the newest transaction, the total is only counted when asked for
+def get_transactions_after_cursor(transactions, user_id, cursor, per_page, etag):
+    per_page = min(max(per_page, 1), 100)
+
+    if cursor:
+        try:
+            created_at, transaction_id = cursor.split(",", 1)
+            created_at = datetime.fromisoformat(created_at)
+        except ValueError:
+            return jsonify({"message": "Invalid cursor"}), 400
+
+        # the leading `<=` keeps this a range scan on the index
+        transactions = transactions.filter(
+            Transaction.created_at <= created_at,
+            or_(Transaction.created_at < created_at, Transaction.id > transaction_id)
+        )
+
+    # one extra row tells us whether there is a next page without counting
+    rows = transactions.limit(per_page + 1).all()
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+
+    response = {
+        "transactions": [transaction.to_dict() for transaction in rows],
+        "per_page": per_page,
+        "has_next": has_next,
+        "has_prev": bool(cursor),
+        "next_cursor": f"{rows[-1].created_at.isoformat()},{rows[-1].id}" if has_next else None
+    }
+
+    if request.args.get("include_total", "false").lower() == "true":
+        response["total_transactions"] = db.session.query(func.count(Transaction.id)).filter(Transaction.user_id == user_id).scalar()
+
+    return jsonify(response), 200, cache_headers(etag)
+
+
+# format: (rows generator, parser, mimetype)
+transaction_formats = {
+    "csv": (export_csv, parse_csv, "text/csv"),
+    "ndjson": (export_ndjson, parse_ndjson, "application/x-ndjson"),
+}
+
+
+@users_blueprint.route("/me/transactions/export", methods=["GET"])
+@read_only
+@jwt_required()
+def export_transactions():
+    user = current_user
+
+    export_format = request.args.get("format", "csv")
+    if export_format not in transaction_formats:
+        return jsonify({"message": "Invalid format"}), 400
+
+    # streamed as it is read from the database, the request context stays open until the last row
+    rows, _, mimetype = transaction_formats[export_format]
+    rows = rows(user.id, chunk_size=current_app.config["TRANSACTION_EXPORT_CHUNK_SIZE"])
+    return Response(
+        stream_with_context(rows),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename=transactions.{export_format}"}
+    )
+
+
+# the body is the file itself or a multipart upload with a "file" field, in the export's format
+@users_blueprint.route("/me/transactions/import", methods=["POST"])
+@jwt_required()
+def import_transaction_history():
+    user = current_user
+
+    import_format = request.args.get("format", "csv")
+    if import_format not in transaction_formats:
+        return jsonify({"message": "Invalid format"}), 400
+
+    upload = request.files.get("file")
+    _, parse, _ = transaction_formats[import_format]
+
+    try:
+        result = import_transactions(
+            user.id,
+            parse(upload.stream if upload else request.stream),
+            chunk_size=current_app.config["TRANSACTION_IMPORT_CHUNK_SIZE"],
+            max_rows=current_app.config["TRANSACTION_IMPORT_MAX_ROWS"],
+            timeout=current_app.config["MARKET_DATA_FETCH_TIMEOUT"]
+        )
+    except TransactionImportError as e:
+        db.session.rollback()
+        return jsonify({"message": str(e)}), 400
+
+    db.session.commit()
+    if result["new_stocks"]:
+        symbol_index.add_many(result["new_stocks"])
+
+    return jsonify({"imported": result["imported"], "skipped": result["skipped"], "positions_updated": result["positions_updated"]}), 200
+
+
+@users_blueprint.route("/me/alerts", methods=["GET"])
+@read_only
+@jwt_required()
+def get_price_alerts():
+    user = current_user
+
+    alerts = PriceAlert.query.filter_by(user_id=user.id).order_by(desc(PriceAlert.created_at)).all()
+
+    return jsonify([alert.to_dict() for alert in alerts]), 200
+
+
+# {"symbol": "AAPL", "direction": "above" | "below", "threshold": 200}, the alert fires once and is
+# pushed as an "alert" event to the user's room on the prices namespace
+@users_blueprint.route("/me/alerts", methods=["POST"])
+@jwt_required()
+def create_price_alert():
+    user = current_user
+
+    body = request.get_json(silent=True) or {}
+    symbol = body.get("symbol")
+    direction = body.get("direction")
+
+    try:
+        threshold = Decimal(str(body.get("threshold"))).quantize(Decimal("0.01"))
+        valid_threshold = 0 < threshold < 10 ** 10
+    except InvalidOperation:
+        valid_threshold = False
+
+    if not isinstance(symbol, str) or direction not in DIRECTIONS or not valid_threshold:
+        return jsonify({"message": "Invalid data"}), 400
+
+    symbol = symbol.strip().upper()
+    # unknown symbols come back from the provider without a "symbol"
+    if not SYMBOL_PATTERN.fullmatch(symbol) or not market_data.get_info(symbol).get("symbol"):
+        return jsonify({"message": "Invalid stock symbol"}), 400
+
+    active = PriceAlert.query.filter_by(user_id=user.id, triggered_at=None).count()
+    if active >= current_app.config["MAX_PRICE_ALERTS_PER_USER"]:
+        return jsonify({"message": "Too many active alerts"}), 400
+
+    alert = PriceAlert(user_id=user.id, symbol=symbol, direction=direction, threshold=threshold)
+    db.session.add(alert)
+    db.session.commit()
+    price_alerts.add(alert)
+
+    return jsonify(alert.to_dict()), 201
+
+
+@users_blueprint.route("/me/alerts/<int:alert_id>", methods=["DELETE"])
+@jwt_required()
+def delete_price_alert(alert_id):
+    user = current_user
+
+    alert = PriceAlert.query.filter_by(id=alert_id, user_id=user.id).first()
+    if not alert:
+        return jsonify({"message": "Alert not found"}), 404
+
+    db.session.delete(alert)
+    db.session.commit()
+    price_alerts.remove(alert.id, alert.symbol)
 
+    return jsonify({"message": "Alert deleted"}), 200
@@ -0,0 +1,10 @@
+from .market_data import MarketData, MarketDataProvider, YFinanceProvider, FakeMarketDataProvider, QuoteCache
+from .price_stream import PriceStream
+from .price_alerts import PriceAlerts
+from .analysis_jobs import AnalysisJobs, FakeOpenAIClient
+from .portfolio_history import PortfolioHistoryCache
+from .symbol_search import SymbolIndex
+from .metrics import Metrics
+from .password_hasher import PasswordHasher, PasswordHasherBusy
+from .user_cache import UserCache, CachedUser
+from .lazy_imports import preload_modules
@@ -0,0 +1,113 @@
+from decimal import Decimal
+from ..extentions import db
+from ..models import AllocationSummary, HoldingSummary, PositionSummary, Stock
+
+SCOPES = ("symbol", "sector")
+WEIGHT = Decimal("0.0001")
+
+
+# folds the change of a user's positions into the allocation and holding summaries, `before` and
+# `after` are {stock_id: (quantity, FIFO cost basis)} with missing positions counting as closed
+def record_allocations(user_id, before, after):
+    deltas = {}
+    for stock_id in before.keys() | after.keys():
+        quantity, cost_basis = after.get(stock_id, (0, Decimal(0)))
+        old_quantity, old_cost_basis = before.get(stock_id, (0, Decimal(0)))
+        delta = (bool(quantity) - bool(old_quantity), quantity - old_quantity, cost_basis - old_cost_basis)
+        if any(delta):
+            deltas[stock_id] = delta
+    if not deltas:
+        return
+
+    allocations, holdings = {}, {}
+    for stock_id, symbol, sector, industry in (
+        db.session.query(Stock.id, Stock.symbol, Stock.sector, Stock.industry).filter(Stock.id.in_(list(deltas))).all()
+    ):
+        for totals, key in ((allocations, (sector, industry)), (holdings, ("symbol", symbol)), (holdings, ("sector", sector))):
+            totals[key] = tuple(map(sum, zip(totals.get(key, (0, 0, 0)), deltas[stock_id])))
+
+    AllocationSummary.add(user_id, allocations)
+    HoldingSummary.add(holdings)
+
+
+def _open_positions():
+    return (
+        db.select(PositionSummary.user_id, PositionSummary.quantity, PositionSummary.fifo_cost_basis, Stock.symbol, Stock.sector, Stock.industry)
+        .join(Stock, Stock.id == PositionSummary.stock_id)
+        .where(PositionSummary.quantity > 0)
+        .subquery()
+    )
+
+
+def _totals(positions, *columns):
+    return db.select(
+        *columns, db.func.count(), db.func.sum(positions.c.quantity), db.func.sum(positions.c.fifo_cost_basis)
+    ).group_by(*columns)
+
+
+# recomputes the allocation summaries of `user_ids` (a list or a select, every user by default)
+# from their position summaries, for backfills and after a stock changes sector or industry
+def rebuild_allocations(user_ids=None):
+    table = AllocationSummary.__table__
+    positions = _open_positions()
+    rebuilt = _totals(positions, positions.c.user_id, positions.c.sector, positions.c.industry)
+    deleted = table.delete()
+    if user_ids is not None:
+        rebuilt = rebuilt.where(positions.c.user_id.in_(user_ids))
+        deleted = deleted.where(table.c.user_id.in_(user_ids))
+
+    db.session.execute(deleted)
+    db.session.execute(table.insert().from_select(("user_id", "sector", "industry", "positions", "quantity", "cost_basis"), rebuilt))
+
+
+def rebuild_holdings():
+    table = HoldingSummary.__table__
+    positions = _open_positions()
+    db.session.execute(table.delete())
+    for scope in SCOPES:
+        db.session.execute(table.insert().from_select(
+            ("scope", "name", "positions", "quantity", "cost_basis"),
+            _totals(positions, db.literal(scope), positions.c[scope])
+        ))
+
+
+# moves a stock's positions from its old sector and industry to its current ones
+def move_stock_allocations(stock, old_sector):
+    symbol_totals = HoldingSummary.query.filter_by(scope="symbol", name=stock.symbol).first()
+    if not symbol_totals or not symbol_totals.positions:
+        return
+
+    if stock.sector != old_sector:
+        totals = (symbol_totals.positions, symbol_totals.quantity, symbol_totals.cost_basis)
+        HoldingSummary.add({("sector", old_sector): tuple(-total for total in totals), ("sector", stock.sector): totals})
+
+    # the rebuild reads the stock's new classification from the database
+    db.session.flush()
+    rebuild_allocations(db.select(PositionSummary.user_id).where(PositionSummary.stock_id == stock.id, PositionSummary.quantity > 0))
+
+
+# the user's open positions by sector and industry, weighted by cost basis since market values would
+# need a quote for every holding
+def portfolio_allocation(user_id):
+    rows = AllocationSummary.for_user(user_id)
+    total = sum((row.cost_basis for row in rows), Decimal(0))
+
+    def weight(cost_basis):
+        return (cost_basis / total).quantize(WEIGHT) if total else None
+
+    sectors = {}
+    for row in rows:
+        sector = sectors.setdefault(row.sector, {"sector": row.sector, "positions": 0, "quantity": 0, "cost_basis": Decimal(0), "industries": []})
+        sector["positions"] += row.positions
+        sector["quantity"] += row.quantity
+        sector["cost_basis"] += row.cost_basis
+        sector["industries"].append({**row.to_dict(), "weight": weight(row.cost_basis)})
+    for sector in sectors.values():
+        sector["weight"] = weight(sector["cost_basis"])
+
+    return {"sectors": sorted(sectors.values(), key=lambda sector: sector["cost_basis"], reverse=True), "total_cost_basis": total}
+
+
+# the most held symbols (by number of holders) and sectors (by number of open positions) across all users
+def most_held(limit):
+    return {f"{scope}s": [summary.to_dict() for summary in HoldingSummary.top(scope, limit)] for scope in SCOPES}
@@ -0,0 +1,146 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from hashlib import sha256
+from threading import Lock
+from types import SimpleNamespace
+import logging
+import time
+from .price_stream import NAMESPACE, user_room
+from .lazy_imports import openai_client
+
+
+def build_prompt(holdings):
+    prompt_stock_data = ""
+
+    for symbol, quantity in holdings:
+        prompt_stock_data += f'{quantity} {symbol} '
+
+    return f"""
+    I will give you my stock portfolio, I need a response to 3 questions 
+    and the response should be 1 sentence for each question and keep in mind 
+    that the max tokens should be 150. I have {prompt_stock_data}. 
+    The questions are 'What is good about portfolio?', 'What can be improved?', 
+    Can I get a couple of example tickers to improve my portfolio?' The response 
+    should be in the following format and separate each response with a newline character: 
+    1. <Answer for question 1>.
+    2. <Answer for question 2>.
+    3. <Answer for question 3>.
+    """
+
+
+# identical (symbol, quantity) holdings produce identical prompts, so they share one result
+def fingerprint(holdings):
+    return sha256("|".join(f"{symbol}:{quantity}" for symbol, quantity in sorted(holdings)).encode()).hexdigest()
+
+
+class FakeOpenAIClient:
+    # stand-in for `OpenAI()` exposing just `completions.create`, sleeps `latency` seconds per call
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+        self.completions = SimpleNamespace(create=self.create)
+
+    def create(self, model, prompt, max_tokens):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        text = "1. It is diversified.\n2. It could hold fewer positions.\n3. Consider VTI or VXUS."
+        return SimpleNamespace(choices=[SimpleNamespace(text=text)])
+
+
+class AnalysisJobs:
+    # runs portfolio analyses on a small pool, single-flight per holdings fingerprint within the
+    # process, with a bounded TTL cache of finished analyses. jobs are kept in the store so polls
+    # can land on any worker, finished ones are removed `ANALYSIS_JOB_TTL` seconds after creation
+    def __init__(self):
+        self.app = None
+        self.store = None
+        self.client = None
+        self.api_key = None
+        self.socketio = None
+        self.metrics = None
+        self.executor = None
+        self.results = OrderedDict()
+        self.waiting = {}
+        self._lock = Lock()
+
+    # `store` is the job model, with `create(user_id, analysis, expired_before)`, `find(job_id, user_id)`
+    # and `finish(job_ids, status, analysis)`
+    def init_app(self, app, socketio, store, client=None):
+        self.app = app
+        self.store = store
+        self.client = client
+        self.api_key = app.config["OPENAI_API_KEY"]
+        self.socketio = socketio
+        self.metrics = app.extensions.get("metrics")
+        self.cache_ttl = app.config["ANALYSIS_CACHE_TTL"]
+        self.cache_size = app.config["ANALYSIS_CACHE_SIZE"]
+        self.job_ttl = app.config["ANALYSIS_JOB_TTL"]
+        if self.executor:
+            self.executor.shutdown(wait=False)
+        self.executor = ThreadPoolExecutor(max_workers=app.config["ANALYSIS_WORKERS"], thread_name_prefix="analysis")
+        app.extensions["analysis_jobs"] = self
+
+    def _cached(self, key):
+        result = self.results.get(key)
+        return result[0] if result and result[1] > time.monotonic() else None
+
+    def submit(self, user_id, holdings):
+        key = fingerprint(holdings)
+        with self._lock:
+            analysis = self._cached(key)
+        job = self.store.create(user_id, analysis, datetime.now() - timedelta(seconds=self.job_ttl))
+        if job["status"] == "done":
+            return job
+
+        # the job is committed before it waits, so the run finishing it can't miss it
+        with self._lock:
+            analysis = self._cached(key)
+            if analysis is None:
+                # only the first job for a fingerprint calls the model, the rest wait on it
+                leader = key not in self.waiting
+                self.waiting.setdefault(key, []).append((job["id"], user_id))
+
+        if analysis is not None:
+            self.store.finish([job["id"]], "done", analysis)
+            return {**job, "status": "done", "analysis": analysis}
+        if leader:
+            self.executor.submit(self._run, key, list(holdings))
+        return job
+
+    def get(self, job_id, user_id):
+        return self.store.find(job_id, user_id)
+
+    def _run(self, key, holdings):
+        try:
+            with self.metrics.upstream("openai", "completion") if self.metrics else nullcontext():
+                client = self.client or openai_client(self.api_key)
+                response = client.completions.create(
+                    model="gpt-3.5-turbo-instruct",
+                    prompt=build_prompt(holdings),
+                    max_tokens=150
+                    )
+            analysis, status = response.choices[0].text.strip().split("\n"), "done"
+        except Exception as e:
+            logging.error(f"Error analyzing portfolio: {str(e)}")
+            analysis, status = None, "failed"
+
+        with self._lock:
+            if status == "done":
+                self.results[key] = (analysis, time.monotonic() + self.cache_ttl)
+                self.results.move_to_end(key)
+                while len(self.results) > self.cache_size:
+                    self.results.popitem(last=False)
+            finished = self.waiting.pop(key, [])
+
+        try:
+            with self.app.app_context():
+                self.store.finish([job_id for job_id, _ in finished], status, analysis)
+        except Exception as e:
+            logging.error(f"Error saving portfolio analyses: {str(e)}")
+            return
+
+        for job_id, user_id in finished:
+            self.socketio.emit("analysis", {"job_id": job_id, "status": status, "analysis": analysis}, to=user_room(user_id), namespace=NAMESPACE)
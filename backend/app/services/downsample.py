@@ -0,0 +1,38 @@
+from .lazy_imports import numpy
+
+
+# largest-triangle-three-buckets: keeps the first and last point and, from every bucket in
+# between, the point forming the largest triangle with its neighbouring buckets, done for all
+# buckets at once by anchoring on the previous bucket's average instead of its chosen point
+def lttb(x, y, threshold):
+    np = numpy()
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=np.float64)
+    size = len(x)
+    if threshold >= size or threshold < 3:
+        return x, y
+
+    edges = np.linspace(1, size - 1, threshold - 1).astype(np.int64)
+    starts, ends = edges[:-1], edges[1:]
+    lengths = ends - starts
+
+    xf = x.astype(np.float64)
+    centroid_x = np.add.reduceat(xf[1:size - 1], starts - 1) / lengths
+    centroid_y = np.add.reduceat(y[1:size - 1], starts - 1) / lengths
+    anchor_x, anchor_y = np.r_[xf[0], centroid_x[:-1]], np.r_[y[0], centroid_y[:-1]]
+    next_x, next_y = np.r_[centroid_x[1:], xf[-1]], np.r_[centroid_y[1:], y[-1]]
+
+    # buckets differ in length by at most one, pad them into a (bucket, offset) grid
+    offsets = np.arange(lengths.max())
+    index = starts[:, None] + offsets[None, :]
+    valid = offsets[None, :] < lengths[:, None]
+    index = np.where(valid, index, starts[:, None])
+
+    areas = np.abs(
+        (anchor_x[:, None] - next_x[:, None]) * (y[index] - anchor_y[:, None])
+        - (anchor_x[:, None] - xf[index]) * (next_y[:, None] - anchor_y[:, None])
+    )
+    chosen = index[np.arange(len(starts)), np.where(valid, areas, -1.0).argmax(axis=1)]
+
+    keep = np.r_[0, chosen, size - 1]
+    return x[keep], y[keep]
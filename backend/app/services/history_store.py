@@ -0,0 +1,176 @@
+from contextlib import contextmanager
+from threading import Lock
+from datetime import datetime, timezone
+import fcntl
+import json
+import logging
+import os
+import re
+import time
+from .lazy_imports import numpy, pandas
+
+PERIOD_DAYS = {
+    "1d": 1, "5d": 5, "1mo": 31, "3mo": 92, "6mo": 183, "1y": 366,
+    "2y": 731, "5y": 1827, "10y": 3653, "ytd": 366, "max": 7305
+}
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+# symbols end up in file names, so anything else is served straight from the provider
+SYMBOL_PATTERN = re.compile(r"[A-Z0-9^=\-][A-Z0-9.^=\-]{0,19}")
+
+def empty_series():
+    np = numpy()
+    return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+
+def window_start(period, now_ms):
+    if period == "max":
+        return 0
+    if period == "ytd":
+        year = datetime.fromtimestamp(now_ms / 1000, tz=timezone.utc).year
+        return int(datetime(year, 1, 1, tzinfo=timezone.utc).timestamp() * 1000)
+    return now_ms - PERIOD_DAYS[period] * DAY_MS
+
+
+def history_to_arrays(history):
+    if history is None or history.empty:
+        return empty_series()
+
+    timestamps = pandas().DatetimeIndex(history.index).as_unit("ms").asi8
+    closes = history["Close"].to_numpy(dtype=numpy().float64)
+    return timestamps, closes
+
+
+# advisory lock on `path` shared by every process using the store, released when the file is closed
+@contextmanager
+def file_lock(path, operation):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a") as f:
+        fcntl.flock(f, operation)
+        yield
+
+
+class HistoryStore:
+    # append-only columnar store of (timestamp ms, close) bars per (symbol, interval),
+    # kept as raw int64/float64 files that are memory-mapped on read. the files can be shared by
+    # several workers, syncs hold an exclusive flock on the pair's lock file and reads a shared one
+    def __init__(self, root, sync_ttl=300):
+        self.root = root
+        self.sync_ttl = sync_ttl
+        self.upstream_calls = 0
+        self._meta = {}
+        self._locks = {}
+        self._lock = Lock()
+
+    def _paths(self, symbol, interval):
+        base = os.path.join(self.root, interval, symbol)
+        return base + ".ts", base + ".close", base + ".json", base + ".lock"
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._locks.setdefault(key, Lock())
+
+    def _read(self, ts_path, close_path):
+        if not os.path.exists(ts_path) or os.path.getsize(ts_path) == 0:
+            return empty_series()
+
+        np = numpy()
+        timestamps = np.memmap(ts_path, dtype=np.int64, mode="r")
+        closes = np.memmap(close_path, dtype=np.float64, mode="r")
+        size = min(len(timestamps), len(closes))
+        return timestamps[:size], closes[:size]
+
+    def _load_meta(self, key, meta_path, reload=False):
+        meta = None if reload else self._meta.get(key)
+        if meta is None and os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            self._meta[key] = meta
+        return meta
+
+    def _save_meta(self, key, meta_path, meta):
+        # replaced in one step, workers read it without the lock
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(meta_path + ".tmp", meta_path)
+        self._meta[key] = meta
+
+    def _replace(self, ts_path, close_path, timestamps, closes):
+        os.makedirs(os.path.dirname(ts_path), exist_ok=True)
+        for file_path, values in ((close_path, closes), (ts_path, timestamps)):
+            with open(file_path + ".tmp", "wb") as f:
+                f.write(values.tobytes())
+            os.replace(file_path + ".tmp", file_path)
+
+    def _append(self, ts_path, close_path, stored_timestamps, timestamps, closes):
+        last = int(stored_timestamps[-1])
+        keep = timestamps >= last
+        timestamps, closes = timestamps[keep], closes[keep]
+
+        # the latest stored bar may still have been forming, overwrite it in place
+        if len(timestamps) and timestamps[0] == last:
+            with open(close_path, "r+b") as f:
+                f.seek((len(stored_timestamps) - 1) * 8)
+                f.write(closes[:1].tobytes())
+            timestamps, closes = timestamps[1:], closes[1:]
+
+        if len(timestamps):
+            with open(close_path, "ab") as f:
+                f.write(closes.tobytes())
+            with open(ts_path, "ab") as f:
+                f.write(timestamps.tobytes())
+
+    def _fetch(self, provider, symbol, period, interval, start=None):
+        self.upstream_calls += 1
+        return history_to_arrays(provider.get_history(symbol, period=period, interval=interval, start=start))
+
+    def get(self, provider, symbol, period="1y", interval="1d"):
+        now = time.time()
+        start = window_start(period, int(now * 1000))
+
+        if not SYMBOL_PATTERN.fullmatch(symbol):
+            timestamps, closes = self._fetch(provider, symbol, period, interval)
+            first = numpy().searchsorted(timestamps, start)
+            return timestamps[first:], closes[first:]
+
+        key = (symbol, interval)
+        ts_path, close_path, meta_path, lock_path = self._paths(symbol, interval)
+
+        with self._key_lock(key):
+            # other workers only ever extend or refresh what is stored, so a cached meta that needs
+            # no sync is still right and the files aren't locked for it
+            if self._needs_sync(self._load_meta(key, meta_path), ts_path, start, now):
+                with file_lock(lock_path, fcntl.LOCK_EX):
+                    self._sync(provider, symbol, period, interval, key, start, now)
+
+        with file_lock(lock_path, fcntl.LOCK_SH):
+            timestamps, closes = self._read(ts_path, close_path)
+        first = numpy().searchsorted(timestamps, start)
+        return timestamps[first:], closes[first:]
+
+    def _needs_sync(self, meta, ts_path, start, now):
+        return (
+            meta is None or start < meta["covered_from"] or now - meta["synced_at"] >= self.sync_ttl
+            or not os.path.exists(ts_path) or os.path.getsize(ts_path) == 0
+        )
+
+    # runs under the pair's exclusive lock, another worker may have synced it since the meta was cached
+    def _sync(self, provider, symbol, period, interval, key, start, now):
+        ts_path, close_path, meta_path, _ = self._paths(symbol, interval)
+        meta = self._load_meta(key, meta_path, reload=True)
+        stored_timestamps, _ = self._read(ts_path, close_path)
+
+        if meta is None or start < meta["covered_from"] or not len(stored_timestamps):
+            # first load, or the requested window reaches further back than what is stored
+            timestamps, closes = self._fetch(provider, symbol, period, interval)
+            self._replace(ts_path, close_path, timestamps, closes)
+            self._save_meta(key, meta_path, {"covered_from": start, "synced_at": now})
+        elif now - meta["synced_at"] >= self.sync_ttl:
+            try:
+                timestamps, closes = self._fetch(provider, symbol, period, interval, start=int(stored_timestamps[-1]))
+                self._append(ts_path, close_path, stored_timestamps, timestamps, closes)
+                self._save_meta(key, meta_path, {**meta, "synced_at": now})
+            except Exception as e:
+                # serve what is stored rather than failing the chart
+                logging.error(f"Error syncing history for {symbol}: {str(e)}")
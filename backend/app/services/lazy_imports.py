@@ -0,0 +1,38 @@
+from functools import cache
+import importlib
+
+# imported on first use rather than with the app, together they are most of the time
+# `import app` takes, and workers, cli commands and most requests never touch them
+HEAVY_MODULES = ("numpy", "pandas", "yfinance", "openai")
+
+
+@cache
+def numpy():
+    import numpy
+    return numpy
+
+
+@cache
+def pandas():
+    import pandas
+    return pandas
+
+
+@cache
+def yfinance():
+    import yfinance
+    return yfinance
+
+
+# one client per key, built on the first analysis
+@cache
+def openai_client(api_key):
+    from openai import OpenAI
+    return OpenAI(api_key=api_key)
+
+
+# for a preforking server's parent, modules imported before the fork are shared by every
+# worker instead of each importing (and holding) its own copy on first use
+def preload_modules():
+    for name in HEAVY_MODULES:
+        importlib.import_module(name)
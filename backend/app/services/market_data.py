@@ -0,0 +1,406 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextvars import copy_context
+from os import path
+from threading import Event, Lock
+from zlib import crc32
+import logging
+import random
+import time
+from .history_store import HistoryStore, PERIOD_DAYS, DAY_MS
+from .lazy_imports import numpy, pandas, yfinance
+
+# bar size of the intraday intervals the fake provider generates, in minutes
+INTRADAY_MINUTES = {"1m": 1, "2m": 2, "5m": 5, "15m": 15, "30m": 30, "60m": 60, "90m": 90, "1h": 60}
+
+# fields that move during the trading day, everything else in `info` is treated as static
+VOLATILE_FIELDS = ("currentPrice", "previousClose")
+
+
+class MarketDataProvider:
+    # full company info, keyed like yfinance's `Ticker.get_info()`
+    def get_info(self, symbol):
+        raise NotImplementedError
+
+    # only the VOLATILE_FIELDS, should be cheaper than `get_info`
+    def get_quote(self, symbol):
+        raise NotImplementedError
+
+    # daily/intraday bars as a DataFrame indexed by date with at least a "Close" column,
+    # when `start` (epoch ms) is given only the bars from that point on are returned
+    def get_history(self, symbol, period="1y", interval="1d", start=None):
+        raise NotImplementedError
+
+
+class YFinanceProvider(MarketDataProvider):
+    def get_info(self, symbol):
+        return yfinance().Ticker(symbol).get_info()
+
+    def get_quote(self, symbol):
+        fast_info = yfinance().Ticker(symbol).fast_info
+        return {"currentPrice": fast_info.last_price, "previousClose": fast_info.previous_close}
+
+    def get_history(self, symbol, period="1y", interval="1d", start=None):
+        yf, pd = yfinance(), pandas()
+        if start is not None:
+            return yf.Ticker(symbol).history(start=pd.Timestamp(start, unit="ms", tz="UTC").to_pydatetime(), interval=interval)
+        return yf.Ticker(symbol).history(period=period, interval=interval)
+
+
+class FakeMarketDataProvider(MarketDataProvider):
+    # deterministic in-process provider for tests and benchmarks, every call sleeps for
+    # `latency` plus up to `jitter` seconds
+    def __init__(self, latency=0.0, jitter=0.0, invalid_symbols=(), seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.invalid_symbols = set(invalid_symbols)
+        self.prices = {}
+        self.calls = {"info": 0, "quote": 0, "history": 0}
+        self._lock = Lock()
+
+    def _call(self, kind):
+        with self._lock:
+            self.calls[kind] += 1
+            delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            time.sleep(delay)
+
+    def set_price(self, symbol, price):
+        self.prices[symbol] = price
+
+    def price(self, symbol):
+        return self.prices.get(symbol, float(10 + crc32(symbol.encode()) % 490))
+
+    def get_info(self, symbol):
+        self._call("info")
+        if symbol in self.invalid_symbols:
+            return {"trailingPegRatio": None}
+
+        price = self.price(symbol)
+        return {
+            "symbol": symbol,
+            "longName": f"{symbol} Inc.",
+            "industry": "Software - Application",
+            "sector": "Technology",
+            "website": f"https://www.{symbol.lower()}.example.com",
+            "exchange": "NMS",
+            "currency": "USD",
+            "currentPrice": price,
+            "previousClose": round(price * 0.99, 2),
+        }
+
+    def get_quote(self, symbol):
+        self._call("quote")
+        price = self.price(symbol)
+        return {"currentPrice": price, "previousClose": round(price * 0.99, 2)}
+
+    def get_history(self, symbol, period="1y", interval="1d", start=None):
+        self._call("history")
+        np, pd = numpy(), pandas()
+        if symbol in self.invalid_symbols:
+            return pd.DataFrame(columns=["Close"])
+
+        end = pd.Timestamp.now(tz="America/New_York").normalize()
+        if start is not None:
+            begin = pd.Timestamp(start, unit="ms", tz="UTC").tz_convert("America/New_York").normalize()
+        else:
+            begin = end - pd.Timedelta(days=PERIOD_DAYS.get(period, 366))
+        dates = pd.bdate_range(start=begin, end=end, name="Date")
+
+        # intraday bars cover the regular session of every business day
+        minutes = INTRADAY_MINUTES.get(interval)
+        if minutes:
+            session = pd.to_timedelta(np.arange(9 * 60 + 30, 16 * 60, minutes), unit="min")
+            local = dates.tz_localize(None).values
+            dates = pd.DatetimeIndex((local[:, None] + session.values[None, :]).ravel(), name="Date").tz_localize(dates.tz)
+
+        # closes only depend on (symbol, bar time) so overlapping fetches agree with each other
+        days = pd.DatetimeIndex(dates).as_unit("ms").asi8 / DAY_MS
+        phase = crc32(symbol.encode()) % 360
+        closes = self.price(symbol) * (1 + 0.05 * np.sin(days / 15 + phase) + 0.002 * np.sin(days * 400 + phase))
+        return pd.DataFrame({"Close": closes}, index=dates)
+
+
+class TimedProvider(MarketDataProvider):
+    # reports every call of the wrapped provider to the request metrics
+    def __init__(self, provider, name, metrics):
+        self.provider = provider
+        self.name = name
+        self.metrics = metrics
+
+    def get_info(self, symbol):
+        with self.metrics.upstream(self.name, "info"):
+            return self.provider.get_info(symbol)
+
+    def get_quote(self, symbol):
+        with self.metrics.upstream(self.name, "quote"):
+            return self.provider.get_quote(symbol)
+
+    def get_history(self, symbol, period="1y", interval="1d", start=None):
+        with self.metrics.upstream(self.name, "history"):
+            return self.provider.get_history(symbol, period=period, interval=interval, start=start)
+
+    # anything else (`set_price`, `calls`, ...) is the wrapped provider's
+    def __getattr__(self, name):
+        return getattr(self.provider, name)
+
+
+class _Entry:
+    __slots__ = ("info", "static_expires_at", "volatile_expires_at", "fetched_at")
+
+    def __init__(self, info, static_expires_at, volatile_expires_at, fetched_at):
+        self.info = info
+        self.static_expires_at = static_expires_at
+        self.volatile_expires_at = volatile_expires_at
+        # wall clock time of the fetch, also tells one version of a symbol's entry from the next
+        self.fetched_at = fetched_at
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = Event()
+        self.result = None
+        self.error = None
+
+
+class QuoteCache:
+    # bounded TTL + LRU cache of `info` dicts with per-symbol single-flight fetches,
+    # the static part of an entry outlives the volatile part which is refreshed through `get_quote`
+    def __init__(self, provider, max_size=1024, volatile_ttl=15, static_ttl=60 * 60 * 24, on_store=None):
+        self.provider = provider
+        self.on_store = on_store
+        self.max_size = max_size
+        self.volatile_ttl = volatile_ttl
+        self.static_ttl = static_ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._calls = {}
+        self._lock = Lock()
+
+    # fresh entry or None, never goes upstream
+    def peek(self, symbol):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(symbol)
+            if entry and entry.static_expires_at > now and entry.volatile_expires_at > now:
+                self._entries.move_to_end(symbol)
+                self.hits += 1
+                return dict(entry.info)
+        return None
+
+    def get_info(self, symbol):
+        return self.get_entry(symbol)[0]
+
+    # (info, time the entry was fetched)
+    def get_entry(self, symbol):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(symbol)
+            if entry and entry.static_expires_at > now and entry.volatile_expires_at > now:
+                self._entries.move_to_end(symbol)
+                self.hits += 1
+                return dict(entry.info), entry.fetched_at
+
+            # only the price is stale, so there is no need to re-fetch the whole info dict
+            kind = "quote" if entry and entry.static_expires_at > now else "info"
+            call = self._calls.get((symbol, kind))
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[(symbol, kind)] = call
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error:
+                raise call.error
+            return dict(call.result[0]), call.result[1]
+
+        try:
+            if kind == "quote":
+                quote = self.provider.get_quote(symbol)
+                info = {**entry.info, **{field: quote.get(field) for field in VOLATILE_FIELDS}}
+                # the static fields are the ones cached before, so they keep their expiry
+                static_expires_at = entry.static_expires_at
+            else:
+                info = self.provider.get_info(symbol)
+                static_expires_at = None
+            call.result = info, self._store(symbol, info, static_expires_at)
+            return dict(info), call.result[1]
+        except Exception as e:
+            logging.error(f"Error fetching {kind} for {symbol}: {str(e)}")
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop((symbol, kind), None)
+            call.event.set()
+
+    def _store(self, symbol, info, static_expires_at=None):
+        now = time.monotonic()
+        if static_expires_at is None:
+            # unknown symbols are only remembered for the short ttl
+            static_expires_at = now + (self.static_ttl if info.get("symbol") else self.volatile_ttl)
+        fetched_at = time.time()
+        with self._lock:
+            self._entries[symbol] = _Entry(info, static_expires_at, now + self.volatile_ttl, fetched_at)
+            self._entries.move_to_end(symbol)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        if self.on_store:
+            self.on_store(symbol, info)
+        return fetched_at
+
+    def invalidate(self, symbol=None):
+        with self._lock:
+            if symbol is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(symbol, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+            }
+
+
+class MarketData:
+    # flask extension fronting the configured provider with a shared QuoteCache
+    def __init__(self):
+        self.provider = None
+        self.cache = None
+        self.history = None
+        self.executor = None
+        self.quote_listeners = []
+
+    def init_app(self, app, provider=None):
+        history_dir = app.config["HISTORY_STORE_DIR"] or path.join(app.instance_path, "history")
+        self.history = HistoryStore(history_dir, sync_ttl=app.config["HISTORY_SYNC_TTL"])
+
+        if provider is None:
+            provider_name = app.config["MARKET_DATA_PROVIDER"]
+            if provider_name == "fake":
+                provider = FakeMarketDataProvider(latency=app.config["FAKE_MARKET_DATA_LATENCY"])
+            else:
+                provider = YFinanceProvider()
+
+        metrics = app.extensions.get("metrics")
+        if metrics:
+            provider = TimedProvider(provider, type(provider).__name__, metrics)
+
+        self.provider = provider
+        self.cache = QuoteCache(
+            provider,
+            max_size=app.config["QUOTE_CACHE_SIZE"],
+            volatile_ttl=app.config["QUOTE_VOLATILE_TTL"],
+            static_ttl=app.config["QUOTE_STATIC_TTL"],
+            on_store=self._quoted
+        )
+        if self.executor:
+            self.executor.shutdown(wait=False)
+        self.executor = ThreadPoolExecutor(max_workers=app.config["MARKET_DATA_WORKERS"], thread_name_prefix="market-data")
+        app.extensions["market_data"] = self
+
+    # `listener(symbol, info)` is called in the fetching thread with every info or quote fetched from the provider
+    def add_quote_listener(self, listener):
+        if listener not in self.quote_listeners:
+            self.quote_listeners.append(listener)
+
+    def _quoted(self, symbol, info):
+        for listener in self.quote_listeners:
+            try:
+                listener(symbol, info)
+            except Exception as e:
+                logging.error(f"Error in quote listener for {symbol}: {str(e)}")
+
+    def get_info(self, symbol):
+        return self.cache.get_info(symbol)
+
+    # `get_info` plus the time the quote was fetched, which changes with every refresh
+    def get_quoted_info(self, symbol):
+        return self.cache.get_entry(symbol)
+
+    # only the volatile fields, served from the same cache as `get_info`
+    def get_quote(self, symbol):
+        info = self.cache.get_info(symbol)
+        return {field: info.get(field) for field in VOLATILE_FIELDS}
+
+    # fetches every symbol concurrently on the shared pool, symbols that fail or
+    # miss the deadline are left out of the result
+    def get_infos(self, symbols, timeout=None):
+        infos = {}
+        pending = {}
+        for symbol in dict.fromkeys(symbols):
+            info = self.cache.peek(symbol)
+            if info is not None:
+                infos[symbol] = info
+            else:
+                # the copied context carries the request's metrics into the pool thread
+                pending[self.executor.submit(copy_context().run, self.cache.get_info, symbol)] = symbol
+
+        if not pending:
+            return infos
+
+        done, not_done = wait(pending, timeout=timeout)
+        for future in done:
+            try:
+                infos[pending[future]] = future.result()
+            except Exception as e:
+                logging.error(f"Error fetching info for {pending[future]}: {str(e)}")
+
+        if not_done:
+            # queued fetches are dropped so a slow provider can't pile up work on the pool
+            for future in not_done:
+                future.cancel()
+            logging.warning(f"Timed out fetching info for {len(not_done)} of {len(pending)} symbols")
+
+        return infos
+
+    def get_history(self, symbol, period="1y", interval="1d"):
+        return self.provider.get_history(symbol, period=period, interval=interval)
+
+    def get_history_series(self, symbol, period="1y", interval="1d"):
+        return self.history.get(self.provider, symbol, period=period, interval=interval)
+
+    # `get_history_series` for many symbols at once on the shared pool, symbols that fail or
+    # miss the deadline are left out of the result
+    def get_histories(self, symbols, period="1y", interval="1d", timeout=None):
+        pending = {
+            self.executor.submit(copy_context().run, self.get_history_series, symbol, period, interval): symbol
+            for symbol in dict.fromkeys(symbols)
+        }
+        if not pending:
+            return {}
+
+        series = {}
+        done, not_done = wait(pending, timeout=timeout)
+        for future in done:
+            try:
+                series[pending[future]] = future.result()
+            except Exception as e:
+                logging.error(f"Error fetching history for {pending[future]}: {str(e)}")
+
+        if not_done:
+            for future in not_done:
+                future.cancel()
+            logging.warning(f"Timed out fetching history for {len(not_done)} of {len(pending)} symbols")
+
+        return series
+
+    def stats(self):
+        return self.cache.stats()
@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+from threading import Thread, Event
+import logging
+from sqlalchemy import or_
+from ..extentions import db, market_data
+from ..models import Stock, Transaction, UserStock, User
+from .allocation import move_stock_allocations
+
+
+# `missing_only` picks the stocks that were never refreshed, rows from before the metadata
+# columns existed have no website, logo, exchange or currency until then
+def refresh_stock_metadata(max_age=None, batch_size=50, timeout=None, missing_only=False):
+    query = db.session.query(Stock.id)
+    if missing_only:
+        query = query.filter(Stock.metadata_refreshed_at.is_(None))
+    elif max_age is not None:
+        cutoff = datetime.now() - max_age
+        query = query.filter(or_(Stock.metadata_refreshed_at.is_(None), Stock.metadata_refreshed_at < cutoff))
+
+    stock_ids = [stock_id for (stock_id,) in query.order_by(Stock.metadata_refreshed_at.asc().nullsfirst()).all()]
+    refreshed = 0
+
+    for i in range(0, len(stock_ids), batch_size):
+        stocks = Stock.query.filter(Stock.id.in_(stock_ids[i:i + batch_size])).all()
+        infos = market_data.get_infos([stock.symbol for stock in stocks], timeout=timeout)
+
+        changed = []
+        for stock in stocks:
+            info = infos.get(stock.symbol)
+            # symbols that failed or timed out are picked up again on the next run
+            if info and info.get("symbol"):
+                shown = stock.to_dict()
+                stock.update_metadata(info)
+                refreshed += 1
+                if stock.to_dict() != shown:
+                    changed.append(stock.id)
+                if (stock.sector, stock.industry) != (shown["sector"], shown["industry"]):
+                    move_stock_allocations(stock, shown["sector"])
+
+        # the stock is part of the portfolio and transaction pages of everyone who traded or holds it
+        if changed:
+            User.bump_data_versions(
+                db.select(Transaction.user_id).where(Transaction.stock_id.in_(changed))
+                .union(db.select(UserStock.user_id).where(UserStock.stock_id.in_(changed)))
+            )
+        db.session.commit()
+
+    return refreshed, len(stock_ids)
+
+
+class MetadataRefresher:
+    # optional daemon thread that periodically refreshes stale stock metadata
+    def __init__(self, app):
+        self.app = app
+        self.stopped = Event()
+        self.thread = Thread(target=self.run, name="metadata-refresher", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+
+    def run(self):
+        interval = self.app.config["METADATA_REFRESH_INTERVAL"]
+        while not self.stopped.wait(interval):
+            try:
+                with self.app.app_context():
+                    refreshed, stale = refresh_stock_metadata(
+                        max_age=timedelta(seconds=self.app.config["METADATA_MAX_AGE"]),
+                        batch_size=self.app.config["METADATA_REFRESH_BATCH_SIZE"],
+                        timeout=self.app.config["MARKET_DATA_FETCH_TIMEOUT"]
+                    )
+                if stale:
+                    logging.info(f"Refreshed metadata for {refreshed} of {stale} stale stocks")
+            except Exception as e:
+                logging.error(f"Error refreshing stock metadata: {str(e)}")
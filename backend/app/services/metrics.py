@@ -0,0 +1,196 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+import logging
+import time
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# upper bounds in seconds, as in the prometheus client defaults
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# time spent by the current request, shared with the pool threads it hands work to
+# through `contextvars.copy_context()`
+_current = ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    __slots__ = ("sql_count", "sql_time", "upstream_count", "upstream_time", "json_time")
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.upstream_count = 0
+        self.upstream_time = 0.0
+        self.json_time = 0.0
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _number(value):
+    return f"{value:.6f}" if isinstance(value, float) else str(value)
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+class Metrics:
+    # per endpoint latency histograms plus SQL and upstream provider time, collected with
+    # request hooks and engine events and rendered in the prometheus text format
+    def __init__(self):
+        self.requests = {}
+        self.endpoints = {}
+        self.upstream_totals = {}
+        self.sql_totals = [0, 0.0]
+        self._listening = False
+        self._lock = Lock()
+
+    def init_app(self, app):
+        self.server_timing = app.config["SERVER_TIMING_HEADER"]
+        self.slow_request_threshold = app.config["SLOW_REQUEST_THRESHOLD"]
+        app.extensions["metrics"] = self
+
+        if not self._listening:
+            # every engine, including ones created after this point
+            event.listen(Engine, "before_cursor_execute", self._before_cursor_execute)
+            event.listen(Engine, "after_cursor_execute", self._after_cursor_execute)
+            self._listening = True
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+        # JSON encoding is timed at the provider so it can be told apart from the view
+        encode = app.json.response
+
+        def timed_response(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return encode(*args, **kwargs)
+            finally:
+                timings = _current.get()
+                if timings is not None:
+                    timings.json_time += time.perf_counter() - start
+
+        app.json.response = timed_response
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started_at"].pop()
+        timings = _current.get()
+        if timings is not None:
+            timings.sql_count += 1
+            timings.sql_time += elapsed
+        with self._lock:
+            self.sql_totals[0] += 1
+            self.sql_totals[1] += elapsed
+
+    # wraps a call to an external service (market data provider, OpenAI)
+    @contextmanager
+    def upstream(self, provider, kind):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            timings = _current.get()
+            if timings is not None:
+                timings.upstream_count += 1
+                timings.upstream_time += elapsed
+            with self._lock:
+                totals = self.upstream_totals.setdefault((provider, kind), [0, 0.0])
+                totals[0] += 1
+                totals[1] += elapsed
+
+    def _before_request(self):
+        g.metrics_started_at = time.perf_counter()
+        g.metrics_token = _current.set(RequestTimings())
+
+    def _after_request(self, response):
+        if "metrics_started_at" not in g:
+            return response
+
+        elapsed = time.perf_counter() - g.metrics_started_at
+        timings = _current.get()
+        _current.reset(g.metrics_token)
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        self._observe(request.method, endpoint, response.status_code, elapsed, timings)
+
+        if self.server_timing:
+            response.headers["Server-Timing"] = ", ".join([
+                f'db;dur={timings.sql_time * 1000:.2f};desc="{timings.sql_count} queries"',
+                f'upstream;dur={timings.upstream_time * 1000:.2f};desc="{timings.upstream_count} calls"',
+                f"json;dur={timings.json_time * 1000:.2f}",
+                f"total;dur={elapsed * 1000:.2f}",
+            ])
+
+        if self.slow_request_threshold and elapsed >= self.slow_request_threshold:
+            logging.warning(
+                f"Slow request {request.method} {request.path} {response.status_code} took {elapsed * 1000:.0f}ms "
+                f"(db {timings.sql_time * 1000:.0f}ms over {timings.sql_count} queries, "
+                f"upstream {timings.upstream_time * 1000:.0f}ms over {timings.upstream_count} calls, "
+                f"json {timings.json_time * 1000:.0f}ms)"
+            )
+        return response
+
+    def _observe(self, method, endpoint, status, elapsed, timings):
+        with self._lock:
+            histogram = self.requests.setdefault((method, endpoint, status), [[0] * len(LATENCY_BUCKETS), 0, 0.0])
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if elapsed <= bound:
+                    histogram[0][i] += 1
+            histogram[1] += 1
+            histogram[2] += elapsed
+
+            totals = self.endpoints.setdefault(endpoint, [0, 0.0, 0, 0.0, 0.0])
+            totals[0] += timings.sql_count
+            totals[1] += timings.sql_time
+            totals[2] += timings.upstream_count
+            totals[3] += timings.upstream_time
+            totals[4] += timings.json_time
+
+    def render(self):
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            family("http_request_duration_seconds", "histogram", "Request latency by method, endpoint and status.")
+            for (method, endpoint, status), (buckets, count, total) in sorted(self.requests.items()):
+                for bound, observed in zip(LATENCY_BUCKETS, buckets):
+                    lines.append(f"http_request_duration_seconds_bucket{_labels(method=method, endpoint=endpoint, status=status, le=bound)} {observed}")
+                lines.append(f"http_request_duration_seconds_bucket{_labels(method=method, endpoint=endpoint, status=status, le='+Inf')} {count}")
+                lines.append(f"http_request_duration_seconds_count{_labels(method=method, endpoint=endpoint, status=status)} {count}")
+                lines.append(f"http_request_duration_seconds_sum{_labels(method=method, endpoint=endpoint, status=status)} {total:.6f}")
+
+            for i, (name, help_text) in enumerate([
+                ("http_request_sql_statements_total", "SQL statements executed while serving the endpoint."),
+                ("http_request_sql_seconds_total", "Time spent in SQL while serving the endpoint."),
+                ("http_request_upstream_calls_total", "Upstream provider calls made while serving the endpoint."),
+                ("http_request_upstream_seconds_total", "Time spent in upstream providers while serving the endpoint."),
+                ("http_request_json_seconds_total", "Time spent encoding JSON responses for the endpoint."),
+            ]):
+                family(name, "counter", help_text)
+                for endpoint, totals in sorted(self.endpoints.items()):
+                    lines.append(f"{name}{_labels(endpoint=endpoint)} {_number(totals[i])}")
+
+            family("db_statements_total", "counter", "SQL statements executed by the process.")
+            lines.append(f"db_statements_total {self.sql_totals[0]}")
+            family("db_seconds_total", "counter", "Time spent in SQL by the process.")
+            lines.append(f"db_seconds_total {self.sql_totals[1]:.6f}")
+
+            family("upstream_calls_total", "counter", "Calls to upstream providers, including background work.")
+            for (provider, kind), (count, _) in sorted(self.upstream_totals.items()):
+                lines.append(f"upstream_calls_total{_labels(provider=provider, kind=kind)} {count}")
+            family("upstream_seconds_total", "counter", "Time spent in upstream providers, including background work.")
+            for (provider, kind), (_, total) in sorted(self.upstream_totals.items()):
+                lines.append(f"upstream_seconds_total{_labels(provider=provider, kind=kind)} {total:.6f}")
+
+        return "\n".join(lines) + "\n"
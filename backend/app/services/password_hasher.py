@@ -0,0 +1,103 @@
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from multiprocessing import get_all_start_methods, get_context
+from threading import BoundedSemaphore, Lock
+import os
+import bcrypt
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+# run in the pool processes
+def hash_password(password, rounds):
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+def check_password(password_hash, password):
+    return bcrypt.checkpw(password.encode("utf-8"), password_hash.encode("utf-8"))
+
+
+def hash_rounds(password_hash):
+    try:
+        return int(password_hash.split("$")[2])
+    except (IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    # bcrypt hashing and checking on a small process pool so a burst of logins can't hold the
+    # request threads, at most `max_pending` calls are running or queued and the rest are
+    # refused with `PasswordHasherBusy` instead of waiting behind them
+    def __init__(self):
+        self.rounds = 12
+        self.workers = 0
+        self.max_pending = 0
+        self.metrics = None
+        self.executor = None
+        self.pending = None
+        self.rejected = 0
+        self._lock = Lock()
+        # a worker forked from a parent that built the app can't use the parent's pool
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def init_app(self, app):
+        self.shutdown()
+        self.rounds = app.config["BCRYPT_LOG_ROUNDS"]
+        self.workers = app.config["PASSWORD_HASH_WORKERS"]
+        self.max_pending = app.config["PASSWORD_HASH_MAX_PENDING"]
+        self.pending = BoundedSemaphore(self.max_pending)
+        self.metrics = app.extensions.get("metrics")
+        app.extensions["password_hasher"] = self
+
+    # started on the first hash or check, so building the app (the cli, tests, a preforking
+    # server's parent) starts no processes. forked, spawning or a fork server would re-run the
+    # entry point of scripts that don't guard it with `if __name__ == "__main__"`, the children
+    # only ever run bcrypt so the locks of the app's threads they inherit don't matter
+    def _start_pool(self):
+        start_method = "fork" if "fork" in get_all_start_methods() else "spawn"
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=get_context(start_method))
+        self.executor.submit(hash_rounds, "").result()
+
+    # the pool's processes and threads belong to the parent, the child starts its own on first use
+    def _after_fork(self):
+        self.executor = None
+        self._lock = Lock()
+        if self.pending:
+            self.pending = BoundedSemaphore(self.max_pending)
+
+    def _run(self, kind, fn, *args):
+        if not self.pending.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise PasswordHasherBusy()
+
+        try:
+            if self.workers and not self.executor:
+                with self._lock:
+                    if not self.executor:
+                        self._start_pool()
+            with self.metrics.upstream("bcrypt", kind) if self.metrics else nullcontext():
+                # 0 workers hashes in the calling thread, still bounded by `max_pending`
+                if not self.executor:
+                    return fn(*args)
+                return self.executor.submit(fn, *args).result()
+        finally:
+            self.pending.release()
+
+    def hash(self, password):
+        return self._run("hash", hash_password, password, self.rounds)
+
+    def check(self, password_hash, password):
+        return self._run("check", check_password, password_hash, password)
+
+    # hashes made with a different cost are replaced the next time the password is checked
+    def needs_rehash(self, password_hash):
+        return hash_rounds(password_hash) != self.rounds
+
+    def shutdown(self):
+        with self._lock:
+            if self.executor:
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = None
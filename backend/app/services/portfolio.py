@@ -0,0 +1,359 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+import time
+from sqlalchemy import case, func
+from sqlalchemy.orm import contains_eager
+from ..extentions import db, market_data, portfolio_history as history_cache
+from ..models import Transaction, PositionSummary, Stock, User
+from .allocation import record_allocations
+from .history_store import window_start
+from .lazy_imports import numpy
+from .portfolio_history import portfolio_values
+
+CENT = Decimal("0.01")
+PRECISION = Decimal("0.0001")
+
+
+class OversoldError(ValueError):
+    def __init__(self, stock_id):
+        super().__init__(f"Position {stock_id} sells more shares than it holds")
+        self.stock_id = stock_id
+
+
+def _decay_scan(ratios, additions, max_log_range=500.0):
+    # x[i] = ratios[i] * x[i - 1] + additions[i] for ratios in [0, 1] as a scaled cumulative sum,
+    # reset after every zero ratio and rebased in blocks so the scale never underflows
+    np = numpy()
+    size = len(additions)
+    out = np.empty(size)
+    if not size:
+        return out
+
+    reset = ratios == 0
+    log_scale = np.cumsum(np.log(np.where(reset, 1.0, ratios)))
+    blocks = np.flatnonzero(np.diff(np.floor(log_scale / -max_log_range))) + 1
+
+    carry = 0.0
+    for start, end in zip(np.r_[0, blocks], np.r_[blocks, size]):
+        block_additions = additions[start:end].copy()
+        block_additions[0] += ratios[start] * carry
+        block_resets = reset[start:end].copy()
+        block_resets[0] = False
+
+        scale = log_scale[start:end] - log_scale[start]
+        weighted = np.cumsum(block_additions * np.exp(-scale))
+        # whatever was accumulated before the latest reset no longer counts
+        offsets = np.r_[0.0, weighted[np.flatnonzero(block_resets) - 1]]
+        out[start:end] = np.exp(scale) * (weighted - offsets[np.cumsum(block_resets)])
+        carry = out[end - 1]
+
+    return out
+
+
+# replays one position's fills (oldest first) under both average-cost and FIFO accounting,
+# sells never exceed the shares held at the time
+def replay(is_buy, quantities, prices):
+    np = numpy()
+    is_buy = np.asarray(is_buy, dtype=bool)
+    quantities = np.asarray(quantities, dtype=np.float64)
+    prices = np.asarray(prices, dtype=np.float64)
+    is_sell = ~is_buy
+
+    signed = np.where(is_buy, quantities, -quantities)
+    position = np.cumsum(signed)
+    previous = position - signed
+    notional = quantities * prices
+
+    # fifo: lots are laid end to end on a cumulative share axis that sells consume from the left,
+    # cost is piecewise linear along it so the cost of any range of shares is an interpolation
+    bought = np.r_[0.0, np.cumsum(quantities[is_buy])]
+    spent = np.r_[0.0, np.cumsum(notional[is_buy])]
+    sold = np.cumsum(np.where(is_buy, 0.0, quantities))
+    total_sold = sold[-1] if len(sold) else 0.0
+    consumed = np.interp(sold[is_sell], bought, spent) - np.interp(sold[is_sell] - quantities[is_sell], bought, spent)
+
+    open_quantity = np.zeros(len(quantities), dtype=np.int64)
+    open_quantity[is_buy] = np.clip(bought[1:] - np.maximum(bought[:-1], total_sold), 0, None)
+
+    # average cost: buys add their notional, sells scale the basis down by the share of the position sold
+    ratios = np.where(is_buy, 1.0, np.divide(position, previous, out=np.zeros_like(position), where=previous > 0))
+    basis = _decay_scan(ratios, np.where(is_buy, notional, 0.0))
+    previous_basis = np.r_[0.0, basis[:-1]]
+    # an oversold history divides by a zero or negative position, callers reject it
+    with np.errstate(divide="ignore", invalid="ignore"):
+        average_realized = quantities[is_sell] * (prices[is_sell] - previous_basis[is_sell] / previous[is_sell])
+
+    return {
+        "quantity": int(position[-1]) if len(position) else 0,
+        "cost_basis": float(basis[-1]) if len(basis) else 0.0,
+        "realized_pnl": float(average_realized.sum()),
+        "fifo_cost_basis": float(spent[-1] - np.interp(total_sold, bought, spent)),
+        "fifo_realized_pnl": float((notional[is_sell] - consumed).sum()),
+        "open_quantity": open_quantity,
+        "oversold": bool(len(position)) and bool(position.min() < 0),
+    }
+
+
+# rebuilds the summary rows and open FIFO lots of a user's positions from their full history,
+# `strict` raises `OversoldError` for a history that sells shares it doesn't hold at the time
+def rebuild_positions(user_id, stock_ids=None, strict=False):
+    # plain table rows with prices as floats, long histories spend most of the time in row processing
+    table = Transaction.__table__
+    statement = db.select(
+        table.c.id, table.c.stock_id, table.c.transaction_type, table.c.quantity,
+        db.cast(table.c.cost_per_share, db.Float), table.c.open_quantity
+    ).where(table.c.user_id == user_id)
+    summaries = PositionSummary.__table__
+    replaced = db.select(summaries.c.stock_id, summaries.c.quantity, summaries.c.fifo_cost_basis).where(summaries.c.user_id == user_id)
+    deleted = summaries.delete().where(summaries.c.user_id == user_id)
+    if stock_ids is not None:
+        statement = statement.where(table.c.stock_id.in_(stock_ids))
+        replaced = replaced.where(summaries.c.stock_id.in_(stock_ids))
+        deleted = deleted.where(summaries.c.stock_id.in_(stock_ids))
+
+    rows = db.session.execute(statement.order_by(table.c.stock_id, table.c.created_at, table.c.id)).all()
+    # what the allocation summaries counted for the positions being replaced
+    before = {stock_id: (quantity, cost_basis) for stock_id, quantity, cost_basis in db.session.execute(replaced)}
+    db.session.execute(deleted)
+    if not rows:
+        record_allocations(user_id, before, {})
+        return {}
+
+    np = numpy()
+    ids, stock_column, types, quantities, prices, stored_open = zip(*rows)
+    stock_column = np.array(stock_column, dtype=object)
+    is_buy = np.array(types, dtype=object) == "buy"
+    quantities = np.array(quantities, dtype=np.float64)
+    prices = np.array(prices, dtype=np.float64)
+    boundaries = np.r_[0, np.flatnonzero(stock_column[1:] != stock_column[:-1]) + 1, len(rows)]
+
+    rebuilt = {}
+    open_quantity = np.zeros(len(rows), dtype=np.int64)
+    for start, end in zip(boundaries[:-1], boundaries[1:]):
+        result = replay(is_buy[start:end], quantities[start:end], prices[start:end])
+        stock_id = stock_column[start]
+        if strict and result["oversold"]:
+            raise OversoldError(stock_id)
+        rebuilt[stock_id] = PositionSummary(
+            user_id=user_id, stock_id=stock_id, quantity=result["quantity"],
+            **{field: Decimal(result[field]).quantize(PRECISION) for field in ("cost_basis", "realized_pnl", "fifo_cost_basis", "fifo_realized_pnl")}
+        )
+        open_quantity[start:end] = result["open_quantity"]
+
+    db.session.add_all(rebuilt.values())
+    record_allocations(user_id, before, {stock_id: (summary.quantity, summary.fifo_cost_basis) for stock_id, summary in rebuilt.items()})
+
+    # only lots whose stored open quantity is off are written, null (never set) always is
+    changed = np.flatnonzero(is_buy & (np.array(stored_open, dtype=np.float64) != open_quantity))
+    if len(changed):
+        db.session.execute(
+            table.update().where(table.c.id == db.bindparam("lot_id")).values(open_quantity=db.bindparam("new_open_quantity")),
+            [{"lot_id": ids[i], "new_open_quantity": int(open_quantity[i])} for i in changed]
+        )
+
+    return rebuilt
+
+
+def rebuild_summaries(user_id=None):
+    user_ids = [user_id] if user_id else [row[0] for row in db.session.query(Transaction.user_id).distinct().all()]
+    for user_id in user_ids:
+        rebuild_positions(user_id)
+        db.session.commit()
+    return len(user_ids)
+
+
+# writes a user's fills as transactions and folds them into the position summaries, fills are
+# dicts with stock_id, transaction_type, quantity and cost_per_share. the summary rows are locked
+# in stock id order until the commit, an order netting to zero shares never touches the position
+# row so its lock can't serialize the read-modify-write below. raises `OversoldError` for a sell the position's transaction history holds fewer shares for
+# (a position without history, e.g. restored rows), the caller rolls back
+def record_fills(user_id, fills):
+    stock_ids = sorted(set(fill["stock_id"] for fill in fills))
+    summaries = {
+        summary.stock_id: summary
+        for summary in (
+            PositionSummary.query.filter(PositionSummary.user_id == user_id, PositionSummary.stock_id.in_(stock_ids))
+            .order_by(PositionSummary.stock_id)
+            .with_for_update()
+            .populate_existing()
+            .all()
+        )
+    }
+
+    # positions traded before summaries existed are replayed once from their history
+    missing = [stock_id for stock_id in stock_ids if stock_id not in summaries]
+    if missing:
+        summaries.update(rebuild_positions(user_id, missing))
+    for stock_id in missing:
+        if stock_id not in summaries:
+            summaries[stock_id] = PositionSummary(
+                user_id=user_id, stock_id=stock_id, quantity=0, cost_basis=Decimal(0),
+                realized_pnl=Decimal(0), fifo_cost_basis=Decimal(0), fifo_realized_pnl=Decimal(0)
+            )
+            db.session.add(summaries[stock_id])
+    before = {stock_id: (summary.quantity, summary.fifo_cost_basis) for stock_id, summary in summaries.items()}
+
+    # open lots, oldest first, only for positions something is sold from
+    lots = {stock_id: [] for stock_id in stock_ids}
+    selling = {fill["stock_id"] for fill in fills if fill["transaction_type"] == "sell"}
+    if selling:
+        for lot_id, stock_id, open_quantity, price in (
+            db.session.query(Transaction.id, Transaction.stock_id, Transaction.open_quantity, Transaction.cost_per_share)
+            .filter(Transaction.user_id == user_id, Transaction.stock_id.in_(selling), Transaction.open_quantity > 0)
+            .order_by(Transaction.created_at, Transaction.id)
+            .all()
+        ):
+            lots[stock_id].append({"id": lot_id, "open_quantity": open_quantity, "cost_per_share": price})
+
+    created_at = datetime.now()
+    rows = []
+    changed_lots = {}
+    for i, fill in enumerate(fills):
+        quantity = fill["quantity"]
+        price = Decimal(fill["cost_per_share"]).quantize(CENT)
+        notional = price * quantity
+        summary = summaries[fill["stock_id"]]
+        # explicit, strictly increasing timestamps keep replay order identical to fill order
+        row = {
+            "user_id": user_id, "stock_id": fill["stock_id"], "transaction_type": fill["transaction_type"],
+            "quantity": quantity, "cost_per_share": price, "total_cost": notional, "open_quantity": None,
+            "created_at": created_at + timedelta(microseconds=i)
+        }
+        rows.append(row)
+
+        if fill["transaction_type"] == "buy":
+            row["open_quantity"] = quantity
+            lots[fill["stock_id"]].append(row)
+            summary.quantity += quantity
+            summary.cost_basis += notional
+            summary.fifo_cost_basis += notional
+            continue
+
+        if summary.quantity < quantity:
+            raise OversoldError(fill["stock_id"])
+
+        average_cost = summary.cost_basis / summary.quantity
+        summary.realized_pnl += (notional - average_cost * quantity).quantize(PRECISION)
+        summary.quantity -= quantity
+        summary.cost_basis = (summary.cost_basis - average_cost * quantity).quantize(PRECISION) if summary.quantity else Decimal(0)
+
+        consumed = Decimal(0)
+        remaining = quantity
+        queue = lots[fill["stock_id"]]
+        while remaining:
+            if not queue:
+                raise OversoldError(fill["stock_id"])
+            lot = queue[0]
+            taken = min(lot["open_quantity"], remaining)
+            consumed += lot["cost_per_share"] * taken
+            lot["open_quantity"] -= taken
+            remaining -= taken
+            if "id" in lot:
+                changed_lots[lot["id"]] = lot["open_quantity"]
+            if not lot["open_quantity"]:
+                queue.pop(0)
+
+        summary.fifo_realized_pnl += notional - consumed
+        summary.fifo_cost_basis = summary.fifo_cost_basis - consumed if summary.quantity else Decimal(0)
+
+    # a table insert so buys and sells (null open quantity) go out as one executemany batch
+    db.session.execute(Transaction.__table__.insert(), rows)
+    if changed_lots:
+        db.session.execute(db.update(Transaction), [{"id": lot_id, "open_quantity": open_quantity} for lot_id, open_quantity in changed_lots.items()])
+    record_allocations(user_id, before, {stock_id: (summary.quantity, summary.fifo_cost_basis) for stock_id, summary in summaries.items()})
+    User.bump_data_versions([user_id])
+
+    return rows
+
+
+# current valuation of every position the user has traded, priced through the quote cache
+def portfolio_summary(user_id, method="fifo", timeout=None):
+    query = (
+        PositionSummary.query.join(PositionSummary.stock).options(contains_eager(PositionSummary.stock))
+        .filter(PositionSummary.user_id == user_id)
+        .order_by(Stock.symbol)
+    )
+    summaries = query.all()
+
+    # history recorded before summaries existed is replayed on the first read
+    if not summaries and db.session.query(Transaction.query.filter(Transaction.user_id == user_id).exists()).scalar():
+        rebuild_positions(user_id)
+        db.session.commit()
+        summaries = query.all()
+    infos = market_data.get_infos([summary.stock.symbol for summary in summaries if summary.quantity], timeout=timeout)
+
+    positions = []
+    missing_prices = []
+    totals = dict.fromkeys(("cost_basis", "market_value", "unrealized_pnl", "realized_pnl"), Decimal(0))
+    for summary in summaries:
+        position = {"symbol": summary.stock.symbol, "company_name": summary.stock.company_name, **summary.to_dict(method)}
+        price = (infos.get(summary.stock.symbol) or {}).get("currentPrice")
+        position["current_price"] = price
+        position["market_value"] = None
+        position["unrealized_pnl"] = None
+        if summary.quantity and price is None:
+            missing_prices.append(summary.stock.symbol)
+        elif summary.quantity:
+            position["market_value"] = (Decimal(str(price)) * summary.quantity).quantize(CENT)
+            position["unrealized_pnl"] = (position["market_value"] - position["cost_basis"]).quantize(CENT)
+            totals["market_value"] += position["market_value"]
+            totals["unrealized_pnl"] += position["unrealized_pnl"]
+
+        totals["cost_basis"] += position["cost_basis"]
+        totals["realized_pnl"] += position["realized_pnl"]
+        positions.append(position)
+
+    return {"method": method, "positions": positions, "totals": totals, "missing_prices": missing_prices}
+
+
+# daily market value of the user's portfolio over `period`, memoized until their next trade
+def portfolio_history(user_id, period="1y", timeout=None):
+    latest = (
+        db.session.query(Transaction.id)
+        .filter(Transaction.user_id == user_id)
+        .order_by(Transaction.created_at.desc(), Transaction.id)
+        .first()
+    )
+    marker = latest[0] if latest else None
+    cached = history_cache.get((user_id, period), marker)
+    if cached is not None:
+        return cached
+
+    start = datetime.fromtimestamp(window_start(period, int(time.time() * 1000)) / 1000)
+    signed_quantity = case((Transaction.transaction_type == "buy", Transaction.quantity), else_=-Transaction.quantity)
+
+    # positions held when the window opens, then only the trades inside it
+    opening = {
+        symbol: int(quantity)
+        for symbol, quantity in (
+            db.session.query(Stock.symbol, func.sum(signed_quantity))
+            .join(Stock, Stock.id == Transaction.stock_id)
+            .filter(Transaction.user_id == user_id, Transaction.created_at < start)
+            .group_by(Stock.symbol)
+            .all()
+        )
+        if quantity
+    }
+    trades = (
+        db.session.query(Stock.symbol, signed_quantity, Transaction.created_at)
+        .join(Stock, Stock.id == Transaction.stock_id)
+        .filter(Transaction.user_id == user_id, Transaction.created_at >= start)
+        .all()
+    )
+    trade_symbols = [symbol for symbol, _, _ in trades]
+    trade_quantities = [quantity for _, quantity, _ in trades]
+    trade_timestamps = [int(created_at.timestamp() * 1000) for _, _, created_at in trades]
+
+    symbols = sorted(set(opening) | set(trade_symbols))
+    series = market_data.get_histories(symbols, period=period, interval="1d", timeout=timeout)
+    timestamps, values = portfolio_values(opening, (trade_symbols, trade_quantities, trade_timestamps), series)
+
+    result = {
+        "period": period,
+        "data": list(zip(timestamps.tolist(), numpy().round(values, 2).tolist())),
+        "missing_symbols": [symbol for symbol in symbols if symbol not in series or not len(series[symbol][0])],
+    }
+    # a partial result is not worth keeping
+    if not result["missing_symbols"]:
+        history_cache.put((user_id, period), marker, result)
+    return result
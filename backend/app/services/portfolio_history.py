@@ -0,0 +1,77 @@
+from collections import OrderedDict
+from threading import Lock
+import time
+from .history_store import empty_series
+from .lazy_imports import numpy, pandas
+
+
+# daily market value of a portfolio: holdings per (day, symbol) from the opening positions plus
+# the cumulative signed trades, times the forward-filled closes aligned on the union of bar dates,
+# `trades` is (symbols, signed quantities, epoch ms) and `series` maps symbols to (timestamps, closes)
+def portfolio_values(opening, trades, series):
+    np, pd = numpy(), pandas()
+    trade_symbols, trade_quantities, trade_timestamps = trades
+    symbols = sorted(set(opening) | set(trade_symbols))
+    bars = [series[symbol][0] for symbol in symbols if symbol in series]
+    if not bars:
+        return empty_series()
+    axis = np.unique(np.concatenate(bars))
+    if not len(axis):
+        return empty_series()
+
+    prices = np.full((len(axis), len(symbols)), np.nan)
+    for column, symbol in enumerate(symbols):
+        timestamps, closes = series.get(symbol) or empty_series()
+        prices[np.searchsorted(axis, timestamps), column] = closes
+    # a symbol without a bar on some date keeps its previous close
+    prices = np.nan_to_num(pd.DataFrame(prices).ffill().to_numpy(), nan=0.0)
+
+    # a trade counts from the close of the bar it happened on
+    rows = np.clip(np.searchsorted(axis, np.asarray(trade_timestamps, dtype=np.int64), side="right") - 1, 0, None)
+    columns = pd.Index(symbols).get_indexer(list(trade_symbols))
+    changes = np.zeros((len(axis), len(symbols)))
+    np.add.at(changes, (rows, columns), np.asarray(trade_quantities, dtype=np.float64))
+
+    holdings = np.cumsum(changes, axis=0) + np.array([opening.get(symbol, 0) for symbol in symbols], dtype=np.float64)
+    return axis, (holdings * prices).sum(axis=1)
+
+
+class PortfolioHistoryCache:
+    # bounded LRU of computed portfolio series per (user, period), an entry only stands for the
+    # trade history it was computed from (`marker`) and for at most `ttl` seconds of price moves
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def init_app(self, app):
+        self.max_size = app.config["PORTFOLIO_HISTORY_CACHE_SIZE"]
+        self.ttl = app.config["PORTFOLIO_HISTORY_TTL"]
+        app.extensions["portfolio_history"] = self
+
+    def get(self, key, marker):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] == marker and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+            return None
+
+    def put(self, key, marker, value):
+        with self._lock:
+            self._entries[key] = (marker, time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, user_id):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == user_id]:
+                del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "max_size": self.max_size}
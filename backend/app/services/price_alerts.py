@@ -0,0 +1,362 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Lock, Thread
+import logging
+import time
+from .lazy_imports import numpy
+from .price_stream import NAMESPACE, user_room
+
+
+class _Book:
+    # one symbol's alerts, each direction as parallel (thresholds, alert ids, user indexes) arrays
+    # sorted by threshold, alerts added since the last tick wait in `pending`
+    __slots__ = ("above", "below", "pending")
+
+    def __init__(self, above, below):
+        self.above = above
+        self.below = below
+        self.pending = []
+
+    def size(self):
+        return len(self.above[0]) + len(self.below[0]) + len(self.pending)
+
+
+def _empty_side():
+    np = numpy()
+    return np.empty(0), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32)
+
+
+def _slice(side, start, stop):
+    # views of what is left, copied once they hold on to a base more than twice their size
+    kept = tuple(array[start:stop] for array in side)
+    if kept[0].base is not None and len(kept[0]) * 2 < len(kept[0].base):
+        kept = tuple(array.copy() for array in kept)
+    return kept
+
+
+class PriceAlerts:
+    # every active alert kept in memory, grouped by symbol, in columnar arrays sorted by threshold.
+    # a quote refresh locates the price in each direction with one binary search and fires the
+    # crossed end of the array, so a tick costs O(log alerts + fired) whatever the number of
+    # users and alerts. fired alerts are one-shot: taken out of the arrays, marked in the
+    # database and pushed to their user's Socket.IO room. every worker keeps its own books and
+    # reads the alerts other workers created every `PRICE_ALERT_RELOAD_INTERVAL` seconds, the
+    # database decides which worker fires an alert so nobody is notified twice
+    def __init__(self):
+        self.app = None
+        self.socketio = None
+        self.market_data = None
+        self.store = None
+        self.executor = None
+        self.stopped = None
+        self._reset()
+        self._lock = Lock()
+
+    def _reset(self):
+        self.books = {}
+        self.user_ids = []
+        self.user_index = {}
+        self.loaded = False
+        self.loading = False
+        self.deferred = []
+        # reloads read the ids over `reload_after`, `last_id` is the highest id read so far
+        self.reload_after = None
+        self.last_id = None
+        self.reload_due = 0.0
+        self.reloading = False
+        self.reloaded = 0
+        self.ticks = 0
+        self.fired = 0
+        self.notified = 0
+        self.evaluate_time_total = 0.0
+        self.evaluate_time_max = 0.0
+
+    # `store` is the alert model, with `iter_active()` and `trigger(alert_ids, price)`
+    def init_app(self, app, socketio, market_data, store):
+        self.app = app
+        self.socketio = socketio
+        self.market_data = market_data
+        self.store = store
+        self.poll_interval = app.config["PRICE_ALERT_POLL_INTERVAL"]
+        self.reload_interval = app.config["PRICE_ALERT_RELOAD_INTERVAL"]
+        self.fetch_timeout = app.config["MARKET_DATA_FETCH_TIMEOUT"]
+        self._reset()
+        if self.executor:
+            self.executor.shutdown(wait=False)
+        # a single thread, so firings are written and pushed in the order they happened
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="price-alerts")
+        market_data.add_quote_listener(self.on_quote)
+        app.extensions["price_alerts"] = self
+
+    def _user(self, user_id):
+        index = self.user_index.get(user_id)
+        if index is None:
+            index = self.user_index[user_id] = len(self.user_ids)
+            self.user_ids.append(user_id)
+        return index
+
+    # reads every active alert from the store, the first quote refresh starts it on the engine's thread.
+    # ticks are ignored until it is done, alerts added or removed meanwhile are applied after it
+    def load(self):
+        np = numpy()
+        with self._lock:
+            if self.loaded:
+                return
+            self.loading = True
+
+        ids, users, symbol_keys, thresholds = [], [], [], []
+        user_index, symbols = {}, {}
+        with self.app.app_context():
+            for alert_id, user_id, symbol, is_above, threshold in self.store.iter_active():
+                ids.append(alert_id)
+                users.append(user_index.setdefault(user_id, len(user_index)))
+                # symbol and direction in one sort key, above first
+                symbol_keys.append(symbols.setdefault(symbol, len(symbols)) * 2 + (not is_above))
+                thresholds.append(threshold)
+
+        keys = np.array(symbol_keys, dtype=np.int64)
+        thresholds = np.array(thresholds, dtype=np.float64)
+        order = np.lexsort((thresholds, keys))
+        keys, thresholds = keys[order], thresholds[order]
+        ids = np.array(ids, dtype=np.int64)[order]
+        users = np.array(users, dtype=np.int32)[order]
+        bounds = keys.searchsorted(np.arange(len(symbols) * 2 + 1))
+
+        with self._lock:
+            # the user indexes of the load to the engine's
+            users = np.array([self._user(user_id) for user_id in user_index], dtype=np.int32)[users]
+            for symbol, index in symbols.items():
+                start, middle, stop = bounds[index * 2:index * 2 + 3]
+                # copies, so the books don't hold on to the arrays of all alerts
+                self.books[symbol] = _Book(
+                    tuple(array[start:middle].copy() for array in (thresholds, ids, users)),
+                    tuple(array[middle:stop].copy() for array in (thresholds, ids, users))
+                )
+            for change, args in self.deferred:
+                change(*args)
+            self.deferred = []
+            self.reload_after = self.last_id = int(ids.max()) if len(ids) else 0
+            self.reload_due = time.monotonic() + self.reload_interval
+            self.loaded = True
+            self.loading = False
+        logging.info(f"Loaded {len(ids)} price alerts for {len(symbols)} symbols")
+
+    def _start_loading(self):
+        with self._lock:
+            if self.loaded or self.loading:
+                return
+            self.loading = True
+        self.executor.submit(self._load)
+
+    def _load(self):
+        try:
+            self.load()
+        except Exception as e:
+            logging.error(f"Error loading price alerts: {str(e)}")
+            with self._lock:
+                self.loading = False
+                self.deferred = []
+
+    # reads the alerts created since the last reload, the ones this worker added are already in the
+    # books. it starts from the highest id the reload before it read rather than its own, so an alert
+    # whose transaction committed after one with a higher id is still picked up
+    def reload(self):
+        with self._lock:
+            if not self.loaded:
+                return
+            after = self.reload_after
+
+        with self.app.app_context():
+            rows = list(self.store.iter_active(after_id=after))
+
+        with self._lock:
+            for alert_id, user_id, symbol, is_above, threshold in rows:
+                self._add(symbol, (is_above, threshold, alert_id, user_id))
+            self.reload_after = self.last_id
+            self.last_id = max([self.last_id, *(row[0] for row in rows)])
+            self.reloaded += 1
+
+    def _reload_if_due(self):
+        with self._lock:
+            if not self.reload_interval or self.reloading or time.monotonic() < self.reload_due:
+                return
+            self.reloading = True
+        self.executor.submit(self._reload)
+
+    def _reload(self):
+        try:
+            self.reload()
+        except Exception as e:
+            logging.error(f"Error reloading price alerts: {str(e)}")
+        finally:
+            with self._lock:
+                self.reloading = False
+                self.reload_due = time.monotonic() + self.reload_interval
+
+    # a committed alert, alerts added before the engine starts loading are read by the load
+    def add(self, alert):
+        # read before taking the lock, a committed alert reloads its attributes on first access
+        row = (alert.direction == "above", float(alert.threshold), alert.id, alert.user_id)
+        with self._lock:
+            if self.loaded:
+                self._add(alert.symbol, row)
+            elif self.loading:
+                self.deferred.append((self._add, (alert.symbol, row)))
+
+    def _add(self, symbol, row):
+        is_above, threshold, alert_id, user_id = row
+        book = self.books.get(symbol)
+        if book is None:
+            book = self.books[symbol] = _Book(_empty_side(), _empty_side())
+        # the load may already have read it
+        side = book.above if is_above else book.below
+        if (side[1] == alert_id).any() or any(pending[2] == alert_id for pending in book.pending):
+            return
+        book.pending.append((is_above, threshold, alert_id, self._user(user_id)))
+
+    def remove(self, alert_id, symbol):
+        with self._lock:
+            if self.loaded:
+                self._remove(alert_id, symbol)
+            elif self.loading:
+                self.deferred.append((self._remove, (alert_id, symbol)))
+
+    def _remove(self, alert_id, symbol):
+        book = self.books.get(symbol)
+        if book is None:
+            return
+        book.pending = [row for row in book.pending if row[2] != alert_id]
+        for name in ("above", "below"):
+            side = getattr(book, name)
+            keep = side[1] != alert_id
+            if not keep.all():
+                setattr(book, name, tuple(array[keep] for array in side))
+        if not book.size():
+            del self.books[symbol]
+
+    def _merge(self, book):
+        np = numpy()
+        for name, is_above in (("above", True), ("below", False)):
+            rows = [row for row in book.pending if row[0] == is_above]
+            if not rows:
+                continue
+            thresholds, ids, users = getattr(book, name)
+            thresholds = np.concatenate((thresholds, np.array([row[1] for row in rows], dtype=np.float64)))
+            ids = np.concatenate((ids, np.array([row[2] for row in rows], dtype=np.int64)))
+            users = np.concatenate((users, np.array([row[3] for row in rows], dtype=np.int32)))
+            order = thresholds.argsort(kind="stable")
+            setattr(book, name, (thresholds[order], ids[order], users[order]))
+        book.pending = []
+
+    # takes the alerts `price` crosses out of the symbol's book and returns them as
+    # (alert ids, user indexes, thresholds, is above) arrays, or None when nothing fires
+    def evaluate(self, symbol, price):
+        np = numpy()
+        start = time.perf_counter()
+        with self._lock:
+            self.ticks += 1
+            book = self.books.get(symbol)
+            fired = None
+            if book is not None:
+                if book.pending:
+                    self._merge(book)
+                above, below = book.above, book.below
+                # "above" alerts at or under the price fire, "below" alerts at or over it
+                crossed_above = above[0].searchsorted(price, side="right")
+                crossed_below = below[0].searchsorted(price, side="left")
+
+                if crossed_above or crossed_below < len(below[0]):
+                    thresholds, alert_ids, users = (
+                        np.concatenate((a[:crossed_above], b[crossed_below:]))
+                        for a, b in zip(above, below)
+                    )
+                    fired = alert_ids, users, thresholds, np.arange(len(alert_ids)) < crossed_above
+                    book.above = _slice(above, crossed_above, len(above[0]))
+                    book.below = _slice(below, 0, crossed_below)
+                    self.fired += len(fired[0])
+                    if not book.size():
+                        del self.books[symbol]
+
+            elapsed = time.perf_counter() - start
+            self.evaluate_time_total += elapsed
+            self.evaluate_time_max = max(self.evaluate_time_max, elapsed)
+        return fired
+
+    # quote listener of market data, called with every refreshed quote
+    def on_quote(self, symbol, info):
+        if not self.loaded:
+            self._start_loading()
+            return
+        self._reload_if_due()
+
+        price = info.get("currentPrice")
+        if price is None:
+            return
+
+        fired = self.evaluate(symbol, float(price))
+        if fired is not None:
+            self.executor.submit(self._notify, symbol, price, fired)
+
+    def _notify(self, symbol, price, fired):
+        alert_ids, users, thresholds, above = fired
+        try:
+            with self.app.app_context():
+                triggered = set(self.store.trigger(alert_ids.tolist(), price))
+        except Exception as e:
+            logging.error(f"Error triggering price alerts for {symbol}: {str(e)}")
+            # back in the book, so the next tick tries again
+            with self._lock:
+                book = self.books.get(symbol)
+                if book is None:
+                    book = self.books[symbol] = _Book(_empty_side(), _empty_side())
+                book.pending.extend(zip(above.tolist(), thresholds.tolist(), alert_ids.tolist(), users.tolist()))
+            return
+
+        for alert_id, user, threshold, is_above in zip(alert_ids.tolist(), users.tolist(), thresholds.tolist(), above.tolist()):
+            if alert_id not in triggered:
+                continue
+            self.socketio.emit("alert", {
+                "id": alert_id,
+                "symbol": symbol,
+                "direction": "above" if is_above else "below",
+                "threshold": threshold,
+                "price": price,
+            }, to=user_room(self.user_ids[user]), namespace=NAMESPACE)
+            self.notified += 1
+
+    # refreshes the quotes of every symbol with alerts every `PRICE_ALERT_POLL_INTERVAL` seconds, so
+    # alerts fire for symbols nobody has open, fresh cached quotes are not fetched again
+    def start(self):
+        self.stopped = Event()
+        Thread(target=self._poll, name="price-alerts-poller", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.stopped:
+            self.stopped.set()
+
+    def _poll(self):
+        self._start_loading()
+        while not self.stopped.wait(self.poll_interval):
+            # a worker whose books are empty gets no quotes to notice new alerts on
+            if self.loaded:
+                self._reload_if_due()
+            with self._lock:
+                symbols = list(self.books)
+            try:
+                self.market_data.get_infos(symbols, timeout=self.fetch_timeout)
+            except Exception as e:
+                logging.error(f"Error refreshing quotes for price alerts: {str(e)}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "loaded": self.loaded,
+                "alerts": sum(book.size() for book in self.books.values()),
+                "symbols": len(self.books),
+                "ticks": self.ticks,
+                "fired": self.fired,
+                "notified": self.notified,
+                "reloads": self.reloaded,
+                "evaluate_ms_avg": round(self.evaluate_time_total / self.ticks * 1000, 4) if self.ticks else 0.0,
+                "evaluate_ms_max": round(self.evaluate_time_max * 1000, 4),
+            }
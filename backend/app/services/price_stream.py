@@ -0,0 +1,170 @@
+from threading import Event, Lock
+import logging
+import time
+
+NAMESPACE = "/prices"
+
+
+def room_for(symbol):
+    return f"price:{symbol}"
+
+
+# every connection also joins its user's room for per-user notifications
+def user_room(user_id):
+    return f"user:{user_id}"
+
+
+class _Poller:
+    __slots__ = ("symbol", "interval", "wake", "last_price", "idle_since")
+
+    def __init__(self, symbol, interval):
+        self.symbol = symbol
+        self.interval = interval
+        self.wake = Event()
+        self.last_price = None
+        self.idle_since = None
+
+
+class PriceStream:
+    # one poller per subscribed symbol (not per client) pushing price changes to a Socket.IO room,
+    # pollers slow down while the price is flat or nobody listens and stop once idle for long enough
+    def __init__(self):
+        self.socketio = None
+        self.source = None
+        self.subscriptions = {}
+        self.subscribers = {}
+        self.pollers = {}
+        self.ticks = 0
+        self.emits = 0
+        self.fan_out = 0
+        self.emit_latency_total = 0.0
+        self.emit_latency_max = 0.0
+        self._lock = Lock()
+
+    # `source` is anything with `get_quote(symbol)`, market data by default
+    def init_app(self, app, socketio, source):
+        self.socketio = socketio
+        self.source = source
+        self.interval = app.config["PRICE_STREAM_INTERVAL"]
+        self.max_interval = app.config["PRICE_STREAM_MAX_INTERVAL"]
+        self.idle_timeout = app.config["PRICE_STREAM_IDLE_TIMEOUT"]
+        app.extensions["price_stream"] = self
+
+    # subscribes the connection to `symbols` for as long as it holds no more than `limit` symbols in
+    # total and returns the ones of `symbols` it is subscribed to
+    def subscribe(self, sid, symbols, limit=None):
+        started = []
+        accepted = []
+        with self._lock:
+            subscribed = self.subscriptions.setdefault(sid, set())
+            for symbol in symbols:
+                if symbol in subscribed:
+                    accepted.append(symbol)
+                    continue
+                if limit is not None and len(subscribed) >= limit:
+                    continue
+                subscribed.add(symbol)
+                accepted.append(symbol)
+                self.subscribers[symbol] = self.subscribers.get(symbol, 0) + 1
+
+                poller = self.pollers.get(symbol)
+                if poller is None:
+                    poller = self.pollers[symbol] = _Poller(symbol, self.interval)
+                    started.append(poller)
+                else:
+                    # a backed off poller goes back to full speed for its new listener
+                    poller.interval = self.interval
+                    poller.idle_since = None
+                    poller.wake.set()
+            if not subscribed:
+                del self.subscriptions[sid]
+
+        for poller in started:
+            self.socketio.start_background_task(self._poll, poller)
+        return accepted
+
+    def unsubscribe(self, sid, symbols=None):
+        with self._lock:
+            subscribed = self.subscriptions.get(sid, set())
+            for symbol in list(subscribed if symbols is None else symbols):
+                if symbol in subscribed:
+                    subscribed.discard(symbol)
+                    self.subscribers[symbol] -= 1
+                    if not self.subscribers[symbol]:
+                        del self.subscribers[symbol]
+            if not subscribed:
+                self.subscriptions.pop(sid, None)
+
+    def last_price(self, symbol):
+        poller = self.pollers.get(symbol)
+        return poller.last_price if poller else None
+
+    def _poll(self, poller):
+        symbol = poller.symbol
+        while True:
+            with self._lock:
+                listeners = self.subscribers.get(symbol, 0)
+                if not listeners:
+                    poller.idle_since = poller.idle_since or time.monotonic()
+                    if time.monotonic() - poller.idle_since >= self.idle_timeout:
+                        del self.pollers[symbol]
+                        return
+
+            if listeners:
+                self._tick(poller, listeners)
+            else:
+                poller.interval = min(poller.interval * 2, self.max_interval)
+
+            poller.wake.wait(poller.interval)
+            poller.wake.clear()
+
+    def _tick(self, poller, listeners):
+        try:
+            quote = self.source.get_quote(poller.symbol)
+        except Exception as e:
+            logging.error(f"Error polling price for {poller.symbol}: {str(e)}")
+            poller.interval = min(poller.interval * 2, self.max_interval)
+            return
+
+        fetched_at = time.monotonic()
+        price = quote.get("currentPrice")
+        with self._lock:
+            self.ticks += 1
+
+        # unchanged prices are coalesced away and the poller slows down
+        if price is None or price == poller.last_price:
+            poller.interval = min(poller.interval * 1.5, self.max_interval)
+            return
+
+        poller.last_price = price
+        poller.interval = self.interval
+        previous_close = quote.get("previousClose")
+        change = round(price - previous_close, 2) if previous_close else None
+        self.socketio.emit("price", {
+            "symbol": poller.symbol,
+            "currentPrice": price,
+            "regularMarketChange": change,
+            "regularMarketChangePercent": round(change / previous_close * 100, 2) if change is not None else None,
+            "timestamp": int(time.time() * 1000),
+        }, to=room_for(poller.symbol), namespace=NAMESPACE)
+
+        latency = time.monotonic() - fetched_at
+        with self._lock:
+            self.emits += 1
+            self.fan_out += listeners
+            self.emit_latency_total += latency
+            self.emit_latency_max = max(self.emit_latency_max, latency)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "symbols": len(self.pollers),
+                "clients": len(self.subscriptions),
+                "subscriptions": sum(self.subscribers.values()),
+                "ticks": self.ticks,
+                "emits": self.emits,
+                "fan_out": self.fan_out,
+                "avg_fan_out": round(self.fan_out / self.emits, 2) if self.emits else 0,
+                "avg_emit_latency_ms": round(self.emit_latency_total / self.emits * 1000, 3) if self.emits else 0,
+                "max_emit_latency_ms": round(self.emit_latency_max * 1000, 3),
+            }
@@ -0,0 +1,34 @@
+from decimal import Decimal
+import time
+from flask import current_app
+from itsdangerous import URLSafeSerializer, BadSignature
+
+
+def _serializer():
+    return URLSafeSerializer(current_app.config["SECRET_KEY"], salt="quote-token")
+
+
+# signed (symbol, price, user id) triple, `issued_at` is when the price was quoted and defaults to now
+def issue_quote_token(symbol, price, user_id, issued_at=None):
+    issued_at = int(time.time() if issued_at is None else issued_at)
+    return _serializer().dumps({"symbol": symbol, "price": str(price), "user_id": user_id, "issued_at": issued_at})
+
+
+# the quoted price as a Decimal, or None when the token is missing, tampered with,
+# expired or was issued for another symbol/user
+def verify_quote_token(token, symbol, user_id):
+    if not isinstance(token, str) or not token:
+        return None
+
+    try:
+        quote = _serializer().loads(token)
+    except BadSignature:
+        return None
+
+    if quote.get("symbol") != symbol or quote.get("user_id") != user_id:
+        return None
+
+    if time.time() - quote.get("issued_at", 0) > current_app.config["QUOTE_TOKEN_TTL"]:
+        return None
+
+    return Decimal(quote["price"])
@@ -0,0 +1,170 @@
+from bisect import bisect_left, insort
+from heapq import heapify, heappop, heapreplace, nsmallest
+from math import inf
+from threading import Lock
+import json
+import logging
+import re
+
+TOKEN_PATTERN = re.compile(r"[A-Z0-9]+")
+
+# sorts after every character that can follow a prefix
+PREFIX_END = "\uffff"
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.upper())
+
+
+# [low, high) of the keys starting with `prefix`, keys are strings or tuples led by one
+def prefix_range(keys, prefix):
+    if isinstance(prefix, tuple):
+        return bisect_left(keys, prefix), bisect_left(keys, (prefix[0] + PREFIX_END,))
+    return bisect_left(keys, prefix), bisect_left(keys, prefix + PREFIX_END)
+
+
+class SymbolIndex:
+    # in-memory prefix index over ticker symbols and company names, kept as sorted arrays
+    # searched with bisect, results are ranked as exact ticker, ticker prefix, company name
+    # prefix and finally company names with a word starting with every query word
+    def __init__(self):
+        self.names = {}
+        # the distinct words of each company name as " WORD WORD", a word prefix is then one substring check
+        self.words = {}
+        self.app = None
+        self.store = None
+        self._symbols = []
+        self._name_keys = []
+        # (word, len(symbol), symbol) so the entries of one word are already in rank order
+        self._token_keys = []
+        self._lock = Lock()
+
+    # `SYMBOL_LISTINGS_FILE` is a JSON list of {"symbol", "company_name"} objects, `store` is the
+    # stock model, with `iter_listings()`
+    def init_app(self, app, store):
+        self.app = app
+        self.store = store
+        listings_file = app.config["SYMBOL_LISTINGS_FILE"]
+        try:
+            with open(listings_file) as f:
+                self.add_many((listing["symbol"], listing["company_name"]) for listing in json.load(f))
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"Error loading symbol listings from {listings_file}: {str(e)}")
+        app.extensions["symbol_index"] = self
+        self.load_stored()
+
+    # merges in the stocks already in the database, on a database without the tables yet the routes
+    # creating stocks add them as they go
+    def load_stored(self):
+        try:
+            with self.app.app_context():
+                self.add_many(self.store.iter_listings())
+        except Exception as e:
+            logging.warning(f"Error loading stored symbols: {str(e)}")
+
+    def _insert(self, symbol, company_name, add=insort):
+        upper_name = company_name.upper()
+        self.words[symbol] = "".join(f" {token}" for token in set(tokenize(upper_name)))
+        add(self._symbols, symbol)
+        add(self._name_keys, (upper_name, symbol))
+        for token in self.words[symbol].split():
+            add(self._token_keys, (token, len(symbol), symbol))
+
+    def _remove(self, symbol, company_name):
+        self._symbols.pop(bisect_left(self._symbols, symbol))
+        self._name_keys.pop(bisect_left(self._name_keys, (company_name.upper(), symbol)))
+        for token in self.words.pop(symbol).split():
+            self._token_keys.pop(bisect_left(self._token_keys, (token, len(symbol), symbol)))
+
+    def add(self, symbol, company_name):
+        self.add_many([(symbol, company_name)])
+
+    def add_many(self, listings):
+        with self._lock:
+            changes = {}
+            for symbol, company_name in listings:
+                symbol = symbol.strip().upper()
+                company_name = company_name or ""
+                if symbol and self.names.get(symbol) != company_name:
+                    changes[symbol] = company_name
+
+            # renamed entries leave while the arrays are still sorted
+            for symbol in changes:
+                if symbol in self.names:
+                    self._remove(symbol, self.names[symbol])
+
+            # big batches (the startup load) are appended and sorted once instead of inserted one by one
+            bulk = len(changes) > 64
+            for symbol, company_name in changes.items():
+                self.names[symbol] = company_name
+                self._insert(symbol, company_name, add=list.append if bulk else insort)
+
+            if bulk:
+                self._symbols.sort()
+                self._name_keys.sort()
+                self._token_keys.sort()
+
+    def search(self, query, limit=10):
+        upper_query = query.strip().upper()
+        query_tokens = tokenize(upper_query)
+        if not query_tokens:
+            return []
+
+        results = []
+        seen = set()
+
+        # tiers are taken in order, within a tier shorter tickers come first
+        def take(symbols):
+            for symbol in nsmallest(limit + len(seen), symbols, key=lambda symbol: (len(symbol), symbol)):
+                if symbol not in seen and len(results) < limit:
+                    seen.add(symbol)
+                    results.append(symbol)
+
+        with self._lock:
+            compact_query = query_tokens[0] if len(query_tokens) == 1 else upper_query
+            if compact_query in self.names:
+                take([compact_query])
+
+            low, high = prefix_range(self._symbols, compact_query)
+            take(self._symbols[low:high])
+
+            if len(results) < limit:
+                low, high = prefix_range(self._name_keys, (upper_query,))
+                take([symbol for _, symbol in self._name_keys[low:high]])
+
+            if len(results) < limit:
+                # candidates come from the query word with the fewest matches, walked in rank order
+                # across every indexed word it is a prefix of, the other words are checked per candidate
+                ranges = sorted(((prefix_range(self._token_keys, (token,)), token) for token in query_tokens), key=lambda item: item[0][1] - item[0][0])
+                (low, high), _ = ranges[0]
+                others = [f" {token}" for _, token in ranges[1:]]
+                for symbol in self._ranked_symbols(low, high):
+                    if len(results) == limit:
+                        break
+                    if symbol not in seen and all(other in self.words[symbol] for other in others):
+                        seen.add(symbol)
+                        results.append(symbol)
+
+            return [{"symbol": symbol, "company_name": self.names[symbol]} for symbol in results]
+
+    # symbols of the token keys in [low, high) in (len(symbol), symbol) order, the entries of each
+    # word are a run already in that order so the runs are merged lazily and a search only pays
+    # for the candidates it looks at plus one bisect per distinct word
+    def _ranked_symbols(self, low, high):
+        keys = self._token_keys
+        heap = []
+        while low < high:
+            end = bisect_left(keys, (keys[low][0], inf), low, high)
+            heap.append((keys[low][1], keys[low][2], low + 1, end))
+            low = end
+        heapify(heap)
+        while heap:
+            _, symbol, index, end = heap[0]
+            yield symbol
+            if index < end:
+                heapreplace(heap, (keys[index][1], keys[index][2], index + 1, end))
+            else:
+                heappop(heap)
+
+    def __len__(self):
+        return len(self.names)
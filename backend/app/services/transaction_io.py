@@ -0,0 +1,236 @@
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from io import BufferedReader, StringIO, TextIOWrapper
+import csv
+import json
+import uuid
+from ..extentions import db, market_data, portfolio_history as history_cache
+from ..models import Transaction, Stock, UserStock, User
+from .portfolio import rebuild_positions, OversoldError, CENT
+
+COLUMNS = ["created_at", "symbol", "transaction_type", "quantity", "cost_per_share", "total_cost", "id"]
+
+
+class TransactionImportError(ValueError):
+    pass
+
+
+# a user's transactions oldest first, fetched `chunk_size` rows at a time through a server side
+# cursor so memory stays flat whatever the length of the history
+def export_rows(user_id, chunk_size=1000):
+    statement = (
+        db.select(
+            Transaction.created_at, Stock.symbol, Transaction.transaction_type, Transaction.quantity,
+            Transaction.cost_per_share, Transaction.total_cost, Transaction.id
+        )
+        .join(Stock, Stock.id == Transaction.stock_id)
+        .where(Transaction.user_id == user_id)
+        .order_by(Transaction.created_at, Transaction.id)
+        .execution_options(yield_per=chunk_size)
+    )
+    for partition in db.session.execute(statement).partitions():
+        yield partition
+
+
+def export_csv(user_id, chunk_size=1000):
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for partition in export_rows(user_id, chunk_size):
+        writer.writerows((created_at.isoformat(), *rest) for created_at, *rest in partition)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def export_ndjson(user_id, chunk_size=1000):
+    for partition in export_rows(user_id, chunk_size):
+        yield "".join(
+            json.dumps({
+                "created_at": created_at.isoformat(), "symbol": symbol, "transaction_type": transaction_type,
+                "quantity": quantity, "cost_per_share": str(cost_per_share), "total_cost": str(total_cost), "id": transaction_id
+            }) + "\n"
+            for created_at, symbol, transaction_type, quantity, cost_per_share, total_cost, transaction_id in partition
+        )
+
+
+# uploads are read a line at a time, `stream` is a binary file-like object such as `request.stream`
+def _text(stream):
+    if not hasattr(stream, "read1"):
+        stream = BufferedReader(stream)
+    return TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+
+
+# (line number, record) pairs, records are dicts keyed like the export columns
+def parse_csv(stream):
+    reader = csv.DictReader(_text(stream))
+    for record in reader:
+        yield reader.line_num, record
+
+
+def parse_ndjson(stream):
+    for line_number, line in enumerate(_text(stream), 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            raise TransactionImportError(f"Line {line_number}: invalid JSON")
+        if not isinstance(record, dict):
+            raise TransactionImportError(f"Line {line_number}: expected an object")
+        yield line_number, record
+
+
+def _parse_record(line_number, record):
+    try:
+        created_at = datetime.fromisoformat(str(record["created_at"]))
+        symbol = str(record["symbol"]).strip().upper()
+        transaction_type = str(record["transaction_type"]).strip().lower()
+        quantity = int(record["quantity"])
+        cost_per_share = Decimal(str(record["cost_per_share"])).quantize(CENT)
+        # the id of an exported transaction, optional for histories from elsewhere
+        transaction_id = str(uuid.UUID(str(record["id"]))) if record.get("id") else None
+    except KeyError as e:
+        raise TransactionImportError(f"Line {line_number}: missing {e.args[0]}")
+    except (TypeError, ValueError, InvalidOperation):
+        raise TransactionImportError(f"Line {line_number}: invalid value")
+
+    # stored like the rest of the history, in naive local time
+    if created_at.tzinfo:
+        created_at = created_at.astimezone().replace(tzinfo=None)
+    if not symbol or transaction_type not in ("buy", "sell") or quantity <= 0 or not cost_per_share > 0 or created_at > datetime.now():
+        raise TransactionImportError(f"Line {line_number}: invalid value")
+    return created_at, symbol, transaction_type, quantity, cost_per_share, transaction_id
+
+
+# stock ids for `symbols`, creating the stocks the provider knows and the table doesn't yet
+def _resolve_stocks(symbols, stock_ids, timeout):
+    missing = [symbol for symbol in symbols if symbol not in stock_ids]
+    if not missing:
+        return []
+
+    stock_ids.update(db.session.query(Stock.symbol, Stock.id).filter(Stock.symbol.in_(missing)).all())
+    missing = [symbol for symbol in missing if symbol not in stock_ids]
+    if not missing:
+        return []
+
+    infos = market_data.get_infos(missing, timeout=timeout)
+    new_stocks = []
+    for symbol in missing:
+        info = infos.get(symbol) or {}
+        if not all(info.get(field) for field in ("longName", "industry", "sector")):
+            raise TransactionImportError(f"Unknown stock symbol {symbol}")
+        stock = Stock(id=str(uuid.uuid4()), symbol=symbol, company_name=info["longName"], industry=info["industry"], sector=info["sector"])
+        stock.update_metadata(info)
+        new_stocks.append(stock)
+        stock_ids[symbol] = stock.id
+
+    db.session.add_all(new_stocks)
+    db.session.flush()
+    return new_stocks
+
+
+# writes parsed upload records as the user's transactions in chunks of bulk inserts, then replays
+# the touched positions once to refresh their P&L summaries and open FIFO lots and moves the share
+# counts by the net imported quantities, nothing is committed so the caller can roll the whole
+# import back on an error. transactions keep their exported ids and the ones the user already has
+# are skipped, so importing the same file again changes nothing
+def import_transactions(user_id, records, chunk_size=10000, max_rows=None, timeout=None):
+    stock_ids = {}
+    new_stocks = []
+    deltas = {}
+    seen = set()
+    parsed = 0
+    imported = 0
+    previous = None
+    bump = 0
+
+    chunk = []
+    for line_number, record in records:
+        created_at, symbol, transaction_type, quantity, cost_per_share, transaction_id = _parse_record(line_number, record)
+        parsed += 1
+        if max_rows and parsed > max_rows:
+            raise TransactionImportError(f"Imports are limited to {max_rows} transactions")
+
+        # fills sharing a timestamp keep their order in the file
+        bump = bump + 1 if created_at == previous else 0
+        previous = created_at
+        if transaction_id in seen:
+            continue
+        if transaction_id:
+            seen.add(transaction_id)
+        chunk.append((symbol, {
+            "id": transaction_id or str(uuid.uuid4()), "user_id": user_id, "transaction_type": transaction_type,
+            "quantity": quantity, "cost_per_share": cost_per_share, "total_cost": cost_per_share * quantity,
+            # buys start out as untouched lots, the replay below closes what later sells consumed
+            "open_quantity": quantity if transaction_type == "buy" else None,
+            "created_at": created_at + timedelta(microseconds=bump)
+        }))
+
+        if len(chunk) == chunk_size:
+            imported += _write_chunk(user_id, chunk, stock_ids, new_stocks, deltas, timeout)
+            chunk = []
+    if chunk:
+        imported += _write_chunk(user_id, chunk, stock_ids, new_stocks, deltas, timeout)
+
+    if not parsed:
+        raise TransactionImportError("No transactions to import")
+    if not imported:
+        return {"imported": 0, "skipped": parsed, "positions_updated": 0, "new_stocks": []}
+
+    try:
+        summaries = rebuild_positions(user_id, list(deltas), strict=True)
+    except OversoldError as e:
+        symbol = next(symbol for symbol, stock_id in stock_ids.items() if stock_id == e.stock_id)
+        raise TransactionImportError(f"Sells of {symbol} exceed the shares held at the time")
+
+    # positions move by the net imported shares, in one upsert, and closed ones are removed
+    deltas = {stock_id: delta for stock_id, delta in deltas.items() if delta}
+    positions = UserStock.add_shares_bulk(user_id, deltas) if deltas else {}
+    if any(quantity < 0 for quantity in positions.values()):
+        raise TransactionImportError("Sells exceed the shares held")
+    closed = [stock_id for stock_id, quantity in positions.items() if not quantity]
+    if closed:
+        table = UserStock.__table__
+        db.session.execute(table.delete().where(table.c.user_id == user_id, table.c.stock_id.in_(closed)))
+
+    # an import can land before the latest trade, which is what cached series are checked against
+    history_cache.discard(user_id)
+    User.bump_data_versions([user_id])
+
+    return {
+        "imported": imported,
+        "skipped": parsed - imported,
+        "positions_updated": len(summaries),
+        "new_stocks": [(stock.symbol, stock.company_name) for stock in new_stocks],
+    }
+
+
+def _owners(ids):
+    return dict(db.session.query(Transaction.id, Transaction.user_id).filter(Transaction.id.in_(ids)).all())
+
+
+# writes the chunk's transactions the user doesn't have yet and returns how many. an exported id
+# taken by another user's transaction, another account's export, is replaced by one derived from
+# it, so that import is repeatable too
+def _write_chunk(user_id, chunk, stock_ids, new_stocks, deltas, timeout):
+    owners = _owners([row["id"] for _, row in chunk])
+    for _, row in chunk:
+        if owners.get(row["id"], user_id) != user_id:
+            row["id"] = str(uuid.uuid5(uuid.NAMESPACE_URL, f"{user_id}/{row['id']}"))
+    owners.update(_owners([row["id"] for _, row in chunk if row["id"] not in owners]))
+    chunk = [(symbol, row) for symbol, row in chunk if row["id"] not in owners]
+    if not chunk:
+        return 0
+
+    new_stocks += _resolve_stocks(list(dict.fromkeys(symbol for symbol, _ in chunk)), stock_ids, timeout)
+    rows = []
+    for symbol, row in chunk:
+        row["stock_id"] = stock_ids[symbol]
+        deltas[row["stock_id"]] = deltas.get(row["stock_id"], 0) + (row["quantity"] if row["transaction_type"] == "buy" else -row["quantity"])
+        rows.append(row)
+    # the table insert keeps null open quantities of sells in the same executemany batch, the ORM
+    # bulk insert splits the batch wherever the set of non-null columns changes
+    db.session.execute(Transaction.__table__.insert(), rows)
+    return len(rows)
@@ -0,0 +1,75 @@
+from collections import OrderedDict
+from threading import Lock
+import time
+
+
+class CachedUser:
+    # what protected routes need of the signed in user, a plain snapshot so it can be shared
+    # between requests without a session
+    __slots__ = ("id", "data")
+
+    def __init__(self, data):
+        self.id = data["id"]
+        self.data = data
+
+    def to_dict(self):
+        return dict(self.data)
+
+
+class UserCache:
+    # bounded LRU of signed in users by id, entries live for at most `ttl` seconds and are
+    # dropped as soon as their row is updated or deleted, a size of 0 turns it off
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.max_size = 0
+        self.ttl = 0
+        self._entries = OrderedDict()
+        # bumped on every invalidation so a load racing one doesn't put the old row back
+        self._version = 0
+        self._lock = Lock()
+
+    def init_app(self, app):
+        self.max_size = app.config["USER_CACHE_SIZE"]
+        self.ttl = app.config["USER_CACHE_TTL"]
+        self.clear()
+        app.extensions["user_cache"] = self
+
+    # `load(user_id)` returns the user's `to_dict()` or None, missing users aren't cached
+    def get(self, user_id, load):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[0] > time.monotonic():
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            version = self._version
+
+        data = load(user_id)
+        if data is None:
+            return None
+
+        user = CachedUser(data)
+        with self._lock:
+            if self.max_size and version == self._version:
+                self._entries[user_id] = (time.monotonic() + self.ttl, user)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return user
+
+    def invalidate(self, user_ids):
+        with self._lock:
+            self._version += 1
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "max_size": self.max_size}
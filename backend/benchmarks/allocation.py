@@ -0,0 +1,159 @@
+# sector/industry allocation and most held symbols/sectors read from the summary tables against
+# aggregating positions on every request, the cost the summaries add to a trade, and the full
+# rebuild used for backfills, over a population of users holding a few positions each
+#
+#   python -m benchmarks.allocation --users 100000 --positions 5 --stocks 500
+import argparse
+import json
+import random
+import time
+import uuid
+from decimal import Decimal
+from .common import make_app, seed_user, login, percentile, timed, symbols, StatementCounter
+from app.extentions import db
+from app.models import User, Stock, UserStock, PositionSummary, AllocationSummary, HoldingSummary
+from app.services import FakeMarketDataProvider
+from app.services.allocation import rebuild_allocations, rebuild_holdings, portfolio_allocation, most_held
+
+SECTORS = ["Technology", "Healthcare", "Financial Services", "Energy", "Utilities", "Industrials",
+           "Consumer Cyclical", "Consumer Defensive", "Real Estate", "Basic Materials", "Communication Services"]
+
+
+def seed_population(app, provider, users, positions, stock_count, chunk_size=20000):
+    rng = random.Random(0)
+    with app.app_context():
+        stocks = {}
+        for i, symbol in enumerate(symbols(stock_count)):
+            sector = SECTORS[i % len(SECTORS)]
+            stocks[symbol] = {"id": str(uuid.uuid4()), "symbol": symbol, "company_name": f"{symbol} Inc.", "sector": sector, "industry": f"{sector} {i % 5}"}
+        db.session.execute(db.insert(Stock), list(stocks.values()))
+
+        # a few symbols are held by far more users than the rest
+        weights = [1 / (rank + 1) for rank in range(stock_count)]
+        names = list(stocks)
+        for start in range(0, users, chunk_size):
+            user_rows, holdings, summaries = [], [], []
+            for i in range(start, min(users, start + chunk_size)):
+                user_id = str(uuid.uuid4())
+                user_rows.append({"id": user_id, "email": f"holder{i}@example.com", "first_name": "Bench", "last_name": "User", "password_hash": "x"})
+                for symbol in set(rng.choices(names, weights, k=positions)):
+                    quantity = rng.randint(1, 100)
+                    cost_basis = Decimal(str(provider.price(symbol))) * quantity
+                    holdings.append({"id": str(uuid.uuid4()), "user_id": user_id, "stock_id": stocks[symbol]["id"], "quantity": quantity})
+                    summaries.append({
+                        "id": str(uuid.uuid4()), "user_id": user_id, "stock_id": stocks[symbol]["id"], "quantity": quantity,
+                        "cost_basis": cost_basis, "fifo_cost_basis": cost_basis, "realized_pnl": 0, "fifo_realized_pnl": 0
+                    })
+            db.session.execute(db.insert(User), user_rows)
+            db.session.execute(db.insert(UserStock), holdings)
+            db.session.execute(db.insert(PositionSummary), summaries)
+        db.session.commit()
+
+
+# what the endpoints would do without the summaries
+def aggregate_user(user_id):
+    return (
+        db.session.query(Stock.sector, Stock.industry, db.func.count(), db.func.sum(UserStock.quantity))
+        .join(UserStock, UserStock.stock_id == Stock.id)
+        .filter(UserStock.user_id == user_id)
+        .group_by(Stock.sector, Stock.industry)
+        .all()
+    )
+
+
+def aggregate_everyone(limit):
+    return [
+        db.session.query(column, db.func.count().label("holders"))
+        .join(UserStock, UserStock.stock_id == Stock.id)
+        .group_by(column)
+        .order_by(db.desc("holders"))
+        .limit(limit)
+        .all()
+        for column in (Stock.symbol, Stock.sector)
+    ]
+
+
+def snapshot():
+    return (
+        sorted((row.user_id, row.sector, row.industry, row.positions, row.quantity, row.cost_basis) for row in AllocationSummary.query.filter(AllocationSummary.positions > 0)),
+        sorted((row.scope, row.name, row.positions, row.quantity, row.cost_basis) for row in HoldingSummary.query.filter(HoldingSummary.positions > 0)),
+    )
+
+
+def ms(samples, q):
+    return round(percentile(samples, q) * 1000, 3)
+
+
+def run(users, positions, stock_count, trades, repeat):
+    provider = FakeMarketDataProvider()
+    app = make_app(provider=provider)
+    start = time.perf_counter()
+    seed_population(app, provider, users, positions, stock_count)
+    result = {"users": users, "stocks": stock_count, "seed_s": round(time.perf_counter() - start, 1)}
+
+    with app.app_context():
+        result["positions"] = PositionSummary.query.count()
+        start = time.perf_counter()
+        rebuild_allocations()
+        rebuild_holdings()
+        db.session.commit()
+        result["rebuild_s"] = round(time.perf_counter() - start, 2)
+        result["allocation_rows"] = AllocationSummary.query.count()
+
+    seed_user(app)
+    client = login(app)
+    with app.app_context():
+        counter = StatementCounter(db.engine)
+
+    # trades through the routes, every one updates the summaries in its own transaction
+    rng = random.Random(1)
+    names = symbols(stock_count)
+    buy_samples, buy_statements = [], []
+    for _ in range(trades):
+        symbol = rng.choice(names[:50])
+        before = counter.statements
+        started = time.perf_counter()
+        response = client.post("/api/stocks/buy", json={"symbol": symbol, "quantity": rng.randint(1, 5), "current_price": provider.price(symbol)})
+        buy_samples.append(time.perf_counter() - started)
+        buy_statements.append(counter.statements - before)
+        assert response.status_code == 200, response.get_json()
+    for symbol in names[:10]:
+        holding = client.get("/api/users/me/portfolio").get_json()
+        quantity = next((item["quantity"] for item in holding if item["stock"]["symbol"] == symbol), 0)
+        if quantity:
+            assert client.post("/api/stocks/sell", json={"symbol": symbol, "quantity": quantity, "current_price": provider.price(symbol)}).status_code == 200
+    result["buy_ms_p50"] = ms(buy_samples, 50)
+    result["buy_statements"] = max(buy_statements)
+
+    allocation = client.get("/api/users/me/portfolio/allocation").get_json()
+    assert allocation["sectors"], allocation
+    result["allocation_ms_p50"] = ms(timed(lambda: client.get("/api/users/me/portfolio/allocation"), repeat), 50)
+    result["most_held_ms_p50"] = ms(timed(lambda: client.get("/api/stocks/most-held?limit=10"), repeat), 50)
+
+    with app.app_context():
+        user_id = db.session.query(User.id).filter_by(email="bench@example.com").scalar()
+        result["summary_user_ms_p50"] = ms(timed(lambda: portfolio_allocation(user_id), repeat), 50)
+        result["aggregate_user_ms_p50"] = ms(timed(lambda: aggregate_user(user_id), repeat), 50)
+        result["summary_everyone_ms_p50"] = ms(timed(lambda: most_held(10), repeat), 50)
+        result["aggregate_everyone_ms_p50"] = ms(timed(lambda: aggregate_everyone(10), max(1, repeat // 20)), 50)
+
+        # the summaries kept up by the trades match a rebuild from scratch
+        incremental = snapshot()
+        rebuild_allocations()
+        rebuild_holdings()
+        assert snapshot() == incremental
+        db.session.rollback()
+
+    print(json.dumps(result))
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--positions", type=int, default=5)
+    parser.add_argument("--stocks", type=int, default=500)
+    parser.add_argument("--trades", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    run(args.users, args.positions, args.stocks, args.trades, args.repeat)
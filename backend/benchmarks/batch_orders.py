@@ -0,0 +1,56 @@
+# a 50 symbol rebalance as 50 POST /api/stocks/buy calls vs one POST /api/stocks/orders,
+# counting SQL statements and commits for each
+#
+#   python -m benchmarks.batch_orders --orders 50 --latency 0.01
+import argparse
+import json
+import time
+from .common import make_app, seed_user, login, symbols, StatementCounter
+from app.extentions import db, market_data
+from app.services import FakeMarketDataProvider
+
+
+def run(order_count, latency):
+    provider = FakeMarketDataProvider(latency=latency)
+    app = make_app(provider)
+    seed_user(app)
+    client = login(app)
+    with app.app_context():
+        counter = StatementCounter(db.engine)
+
+    orders = [
+        {"symbol": symbol, "transaction_type": "buy", "quantity": 1, "current_price": provider.price(symbol)}
+        for symbol in symbols(order_count)
+    ]
+    results = []
+
+    for mode in ("single", "batch"):
+        market_data.cache.invalidate()
+        counter.reset()
+        start = time.perf_counter()
+        if mode == "single":
+            for order in orders:
+                response = client.post("/api/stocks/buy", json=order)
+                assert response.status_code == 200, response.get_json()
+        else:
+            response = client.post("/api/stocks/orders", json={"orders": orders})
+            assert response.status_code == 200, response.get_json()
+        elapsed = time.perf_counter() - start
+
+        results.append({
+            "mode": mode,
+            "orders": order_count,
+            "elapsed_ms": round(elapsed * 1000, 1),
+            "statements": counter.statements,
+            "commits": counter.commits,
+        })
+        print(json.dumps(results[-1]))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.01)
+    args = parser.parse_args()
+    run(args.orders, args.latency)
@@ -0,0 +1,56 @@
+# GET /api/stocks/<symbol> response size and latency for long or fine grained ranges, with the
+# full series against the LTTB downsampled one, plus how far the reduced line strays from the original
+#
+#   python -m benchmarks.chart_downsampling --max-points 1000
+import argparse
+import json
+import numpy as np
+from .common import make_app, seed_user, login, percentile, timed
+from app.extentions import market_data
+
+RANGES = [("1y", "1d"), ("max", "1d"), ("5y", "1h"), ("1y", "5m"), ("1y", "1m")]
+
+
+def run(max_points, repeat):
+    # the limit is lifted so the full series can still be requested as the baseline
+    app = make_app(CHART_MAX_POINTS_LIMIT=10 ** 9)
+    seed_user(app)
+    client = login(app)
+    results = []
+
+    for period, interval in RANGES:
+        full_url = f"/api/stocks/S0000?period={period}&interval={interval}&max_points={10 ** 9}"
+        reduced_url = f"/api/stocks/S0000?period={period}&interval={interval}&max_points={max_points}"
+        full = client.get(full_url)  # also syncs the history store
+        reduced = client.get(reduced_url)
+        assert full.status_code == 200 and reduced.status_code == 200
+
+        with app.app_context():
+            timestamps, closes = market_data.get_history_series("S0000", period=period, interval=interval)
+        reduced_data = np.array(reduced.get_json()["data"])
+        error = np.abs(np.interp(timestamps, reduced_data[:, 0], reduced_data[:, 1]) - closes).max() / np.ptp(closes)
+
+        full_samples = timed(lambda: client.get(full_url), repeat)
+        reduced_samples = timed(lambda: client.get(reduced_url), repeat)
+        results.append({
+            "period": period,
+            "interval": interval,
+            "points": len(full.get_json()["data"]),
+            "reduced_points": len(reduced_data),
+            "full_bytes": len(full.data),
+            "reduced_bytes": len(reduced.data),
+            "full_p50_ms": round(percentile(full_samples, 50) * 1000, 2),
+            "reduced_p50_ms": round(percentile(reduced_samples, 50) * 1000, 2),
+            "max_error_of_range": round(float(error), 4),
+        })
+        print(json.dumps(results[-1]))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max-points", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+    results = run(args.max_points, args.repeat)
+    assert all(result["reduced_points"] <= args.max_points for result in results)
@@ -0,0 +1,170 @@
+from datetime import datetime, timedelta
+from itertools import islice
+from os import environ, path
+import tempfile
+import time
+import uuid
+from sqlalchemy import event
+
+# benchmarks never talk to Postgres, Yahoo or OpenAI unless told to
+_workdir = tempfile.mkdtemp(prefix="financial-app-bench-")
+environ.setdefault("FLASK_ENV", "development")
+environ.setdefault("DATABASE_URL", f"sqlite:///{path.join(_workdir, 'bench.db')}")
+environ.setdefault("SECRET_KEY", "benchmark-secret")
+environ.setdefault("JWT_SECRET_KEY", "benchmark-jwt-secret")
+environ.setdefault("OPENAI_API_KEY", "benchmark")
+environ.setdefault("HISTORY_STORE_DIR", path.join(_workdir, "history"))
+
+from app import create_app
+from app.config import Config
+from app.extentions import db, market_data
+from app.models import User, Stock, UserStock, Transaction
+from app.services import FakeMarketDataProvider
+from app.services.portfolio import rebuild_summaries
+
+
+def make_app(provider=None, **config):
+    # sqlite serializes writers, give concurrent benchmarks time to wait for the lock
+    if environ["DATABASE_URL"].startswith("sqlite"):
+        config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", {**Config.SQLALCHEMY_ENGINE_OPTIONS, "connect_args": {"timeout": 30}})
+    app = create_app(config)
+    market_data.init_app(app, provider=provider or FakeMarketDataProvider())
+    # only the primary, a replica bind one app configured stays in the shared metadata of the next
+    with app.app_context():
+        db.drop_all(bind_key=None)
+        db.create_all(bind_key=None)
+    return app
+
+
+def symbols(count):
+    return [f"S{i:04d}" for i in range(count)]
+
+
+def seed_user(app, email="bench@example.com", holdings=0, password="password"):
+    with app.app_context():
+        user = User(email=email, first_name="Bench", last_name="User")
+        user.set_password(password)
+        db.session.add(user)
+        db.session.flush()
+
+        for symbol in symbols(holdings):
+            stock = Stock.query.filter_by(symbol=symbol).first()
+            if not stock:
+                stock = Stock(symbol=symbol, company_name=f"{symbol} Inc.", industry="Software", sector="Technology")
+                db.session.add(stock)
+                db.session.flush()
+            db.session.add(UserStock(user_id=user.id, stock_id=stock.id, quantity=10))
+
+        db.session.commit()
+        return user.id
+
+
+# `count` buys spread over the user's holdings, one second apart and oldest first
+def seed_transactions(app, user_id, count, chunk_size=10000):
+    with app.app_context():
+        stock_ids = [stock_id for (stock_id,) in db.session.query(UserStock.stock_id).filter_by(user_id=user_id).all()]
+        start = datetime.now() - timedelta(seconds=count)
+        for offset in range(0, count, chunk_size):
+            db.session.execute(db.insert(Transaction), [
+                {
+                    "id": str(uuid.uuid4()),
+                    "user_id": user_id,
+                    "stock_id": stock_ids[i % len(stock_ids)],
+                    "transaction_type": "buy",
+                    "quantity": 1,
+                    "cost_per_share": 100,
+                    "total_cost": 100,
+                    "created_at": start + timedelta(seconds=i)
+                }
+                for i in range(offset, min(count, offset + chunk_size))
+            ])
+        db.session.commit()
+
+
+# `users` users holding the same `holdings` stocks, each with `transactions` one share buys
+# spread over their holdings, positions and P&L summaries consistent with that history
+def seed_dataset(app, users, holdings, transactions, password="password", chunk_size=10000):
+    with app.app_context():
+        # one hash for everyone, hashing per user would dominate seeding
+        password_hash = User(email="", first_name="", last_name="")
+        password_hash.set_password(password)
+        password_hash = password_hash.password_hash
+
+        stock_ids = {symbol: str(uuid.uuid4()) for symbol in symbols(holdings)}
+        db.session.execute(db.insert(Stock), [
+            {"id": stock_id, "symbol": symbol, "company_name": f"{symbol} Inc.", "industry": "Software", "sector": "Technology"}
+            for symbol, stock_id in stock_ids.items()
+        ])
+
+        user_ids = [str(uuid.uuid4()) for _ in range(users)]
+        db.session.execute(db.insert(User), [
+            {"id": user_id, "email": f"user{i}@example.com", "first_name": "Bench", "last_name": f"User {i}", "password_hash": password_hash}
+            for i, user_id in enumerate(user_ids)
+        ])
+
+        stock_list = list(stock_ids.values())
+        db.session.execute(db.insert(UserStock), [
+            {"id": str(uuid.uuid4()), "user_id": user_id, "stock_id": stock_id, "quantity": transactions // holdings + (i < transactions % holdings)}
+            for user_id in user_ids
+            for i, stock_id in enumerate(stock_list)
+            if transactions // holdings + (i < transactions % holdings)
+        ])
+
+        start = datetime.now() - timedelta(seconds=transactions)
+        rows = (
+            {
+                "id": str(uuid.uuid4()), "user_id": user_id, "stock_id": stock_list[i % holdings],
+                "transaction_type": "buy", "quantity": 1, "cost_per_share": 100, "total_cost": 100,
+                "open_quantity": 1, "created_at": start + timedelta(seconds=i)
+            }
+            for user_id in user_ids
+            for i in range(transactions)
+        )
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            db.session.execute(db.insert(Transaction), chunk)
+        db.session.commit()
+
+        rebuild_summaries()
+        return [f"user{i}@example.com" for i in range(users)]
+
+
+def login(app, email="bench@example.com", password="password"):
+    client = app.test_client()
+    response = client.post("/api/auth/login", json={"email": email, "password": password})
+    assert response.status_code == 200, response.get_json()
+    return client
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+class StatementCounter:
+    def __init__(self, engine):
+        self.statements = 0
+        self.commits = 0
+        event.listen(engine, "before_cursor_execute", self.on_execute)
+        event.listen(engine, "commit", self.on_commit)
+
+    def on_execute(self, *args):
+        self.statements += 1
+
+    def on_commit(self, *args):
+        self.commits += 1
+
+    def reset(self):
+        self.statements = 0
+        self.commits = 0
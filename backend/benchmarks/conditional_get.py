@@ -0,0 +1,67 @@
+# bytes on the wire and server CPU per request for the stock page, portfolio and transactions,
+# sent in full uncompressed, gzip and brotli compressed, and revalidated with If-None-Match (304)
+#
+#   python -m benchmarks.conditional_get --holdings 50 --transactions 1000 --repeat 200
+import argparse
+import json
+import time
+from .common import make_app, seed_user, seed_transactions, login
+
+ENDPOINTS = [
+    "/api/stocks/S0000",
+    "/api/stocks/S0000?period=5y",
+    "/api/users/me/portfolio",
+    "/api/users/me/transactions?per_page=50",
+]
+
+MODES = {
+    "identity": {},
+    "gzip": {"Accept-Encoding": "gzip"},
+    "br": {"Accept-Encoding": "br"},
+    "not_modified": {},
+}
+
+
+def measure(client, url, headers, repeat):
+    response = client.get(url, headers=headers)
+    # CPU time of the process, the test client runs the request in this thread
+    start = time.process_time()
+    for _ in range(repeat):
+        client.get(url, headers=headers)
+    cpu = (time.process_time() - start) / repeat
+    return response, cpu
+
+
+def run(holdings, transactions, repeat):
+    app = make_app()
+    user_id = seed_user(app, holdings=holdings)
+    seed_transactions(app, user_id, transactions)
+    client = login(app)
+
+    results = []
+    for url in ENDPOINTS:
+        etag = client.get(url).headers["ETag"]
+        for mode, headers in MODES.items():
+            if mode == "not_modified":
+                headers = {"If-None-Match": etag}
+            response, cpu = measure(client, url, headers, repeat)
+            result = {
+                "endpoint": url,
+                "mode": mode,
+                "status": response.status_code,
+                "bytes": len(response.data),
+                "cpu_ms": round(cpu * 1000, 3),
+            }
+            print(json.dumps(result))
+            results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--holdings", type=int, default=50)
+    parser.add_argument("--transactions", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    for result in run(args.holdings, args.transactions, args.repeat):
+        assert result["status"] == (304 if result["mode"] == "not_modified" else 200)
@@ -0,0 +1,95 @@
+# cold start budget: `from app import create_app; create_app()` in a fresh interpreter under
+# `python -X importtime`, failing when it takes longer than `--budget-ms` or imports one of the
+# modules that are meant to load on first use, `--preload` shows the cost PRELOAD_MODULES adds
+#
+#   python -m benchmarks.import_time --budget-ms 1200
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+BUDGET_MS = 1200
+
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+create_app({"PRELOAD_MODULES": %s})
+created = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "create_app_ms": (created - imported) * 1000,
+    "modules": sorted(sys.modules),
+}))
+"""
+
+
+# milliseconds per third party package from the `-X importtime` report on stderr, a package's
+# first import includes its submodules and whatever else it pulls in
+def parse_importtime(report):
+    packages = {}
+    for line in report.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        package = name.strip().split(".")[0]
+        if package in sys.stdlib_module_names or package.startswith("_"):
+            continue
+        packages[package] = max(packages.get(package, 0), int(cumulative) / 1000)
+    return packages
+
+
+def measure(preload):
+    workdir = tempfile.mkdtemp(prefix="financial-app-import-")
+    env = {
+        **os.environ,
+        "FLASK_ENV": os.environ.get("FLASK_ENV", "development"),
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'import.db')}",
+        "SECRET_KEY": "benchmark-secret",
+        "JWT_SECRET_KEY": "benchmark-jwt-secret",
+        "HISTORY_STORE_DIR": os.path.join(workdir, "history"),
+    }
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD % preload],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), env=env, capture_output=True, text=True, check=True
+    )
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result["packages"] = parse_importtime(completed.stderr)
+    return result
+
+
+def run(budget_ms, repeat, preload, top):
+    from app.services.lazy_imports import HEAVY_MODULES
+
+    # the fastest of a few runs, the first one also pays for a cold page cache and writing .pyc files
+    runs = [measure(preload) for _ in range(repeat)]
+    best = min(runs, key=lambda run: run["import_ms"] + run["create_app_ms"])
+    total_ms = best["import_ms"] + best["create_app_ms"]
+
+    result = {
+        "preload": preload,
+        "import_ms": round(best["import_ms"], 1),
+        "create_app_ms": round(best["create_app_ms"], 1),
+        "total_ms": round(total_ms, 1),
+        "budget_ms": budget_ms,
+        "heavy_modules_loaded": [name for name in HEAVY_MODULES if name in best["modules"]],
+        "slowest_packages_ms": {name: round(ms, 1) for name, ms in sorted(best["packages"].items(), key=lambda item: -item[1])[:top]},
+    }
+    print(json.dumps(result))
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--budget-ms", type=float, default=BUDGET_MS)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--preload", action="store_true")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+    result = run(args.budget_ms, args.repeat, args.preload, args.top)
+    if not args.preload:
+        assert not result["heavy_modules_loaded"], f"imported by create_app(): {result['heavy_modules_loaded']}"
+        assert result["total_ms"] <= args.budget_ms, f"create_app() took {result['total_ms']}ms, over the {args.budget_ms}ms budget"
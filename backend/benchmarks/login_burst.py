@@ -0,0 +1,72 @@
+# latency of a non-auth endpoint (GET /api/users/me/portfolio) while a burst of logins runs
+# alongside it, with bcrypt in the request threads and unbounded against the process pool
+# with the pending limit, plus how many of the logins got through or were turned away
+#
+#   python -m benchmarks.login_burst --threads 16 --logins 20 --rounds 12
+import argparse
+import json
+import time
+from threading import Thread
+from .common import make_app, seed_user, login, percentile, timed
+
+MODES = {
+    "inline": {"PASSWORD_HASH_WORKERS": 0, "PASSWORD_HASH_MAX_PENDING": 10 ** 6},
+    "pool": {"PASSWORD_HASH_WORKERS": 2, "PASSWORD_HASH_MAX_PENDING": 4},
+}
+
+
+def run_mode(mode, threads, logins, rounds, repeat):
+    app = make_app(BCRYPT_LOG_ROUNDS=rounds, **MODES[mode])
+    seed_user(app, holdings=5)
+    client = login(app)
+
+    idle = timed(lambda: client.get("/api/users/me/portfolio"), repeat)
+
+    counts = {"ok": 0, "rejected": 0, "failed": 0}
+
+    def burst():
+        guest = app.test_client()
+        for _ in range(logins):
+            status = guest.post("/api/auth/login", json={"email": "bench@example.com", "password": "password"}).status_code
+            counts["ok" if status == 200 else "rejected" if status == 429 else "failed"] += 1
+
+    workers = [Thread(target=burst) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+
+    busy = []
+    while any(worker.is_alive() for worker in workers):
+        busy += timed(lambda: client.get("/api/users/me/portfolio"), 1)
+    elapsed = time.perf_counter() - start
+    for worker in workers:
+        worker.join()
+
+    result = {
+        "mode": mode,
+        "rounds": rounds,
+        "logins": threads * logins,
+        "logins_ok": counts["ok"],
+        "logins_rejected": counts["rejected"],
+        "logins_failed": counts["failed"],
+        "burst_s": round(elapsed, 2),
+        "portfolio_idle_p50_ms": round(percentile(idle, 50) * 1000, 2),
+        "portfolio_burst_requests": len(busy),
+        "portfolio_burst_p50_ms": round(percentile(busy, 50) * 1000, 2),
+        "portfolio_burst_p95_ms": round(percentile(busy, 95) * 1000, 2),
+        "portfolio_burst_max_ms": round(max(busy) * 1000, 2),
+    }
+    print(json.dumps(result))
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--logins", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+    for mode in MODES:
+        result = run_mode(mode, args.threads, args.logins, args.rounds, args.repeat)
+        assert result["logins_failed"] == 0
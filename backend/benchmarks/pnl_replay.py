@@ -0,0 +1,167 @@
+# P&L engine at scale: full vectorized replay of a long trading history against a per-row
+# Python loop, then the latency of GET /me/portfolio/summary and of trades that update the
+# summaries incrementally, which must not depend on the size of the history
+#
+#   python -m benchmarks.pnl_replay --transactions 100000 --holdings 50
+import argparse
+import json
+import time
+import uuid
+from datetime import datetime, timedelta
+import numpy as np
+from .common import make_app, seed_user, login, percentile, timed, StatementCounter
+from app.extentions import db
+from app.models import UserStock, Transaction, PositionSummary
+from app.services.portfolio import replay, rebuild_summaries
+
+
+# random buys and sells that never sell more than is held, oldest first
+def seed_history(app, user_id, count, seed=0, chunk_size=10000):
+    rng = np.random.default_rng(seed)
+    with app.app_context():
+        stock_ids = [stock_id for (stock_id,) in db.session.query(UserStock.stock_id).filter_by(user_id=user_id).all()]
+        positions = dict.fromkeys(stock_ids, 0)
+        picks = rng.integers(len(stock_ids), size=count)
+        prices = np.round(rng.uniform(50, 150, size=count), 2)
+        start = datetime.now() - timedelta(seconds=count)
+
+        rows = []
+        for i in range(count):
+            stock_id = stock_ids[picks[i]]
+            held = positions[stock_id]
+            if held and rng.random() < 0.45:
+                transaction_type, quantity = "sell", int(rng.integers(1, held + 1))
+                positions[stock_id] -= quantity
+            else:
+                transaction_type, quantity = "buy", int(rng.integers(1, 20))
+                positions[stock_id] += quantity
+            rows.append({
+                "id": str(uuid.uuid4()), "user_id": user_id, "stock_id": stock_id,
+                "transaction_type": transaction_type, "quantity": quantity,
+                "cost_per_share": float(prices[i]), "total_cost": round(float(prices[i]) * quantity, 2),
+                "created_at": start + timedelta(seconds=i)
+            })
+
+        for offset in range(0, count, chunk_size):
+            db.session.execute(db.insert(Transaction), rows[offset:offset + chunk_size])
+
+        # keep the positions consistent with the generated history
+        for stock_id, quantity in positions.items():
+            position = UserStock.query.filter_by(user_id=user_id, stock_id=stock_id).first()
+            if quantity:
+                position.quantity = quantity
+            else:
+                db.session.delete(position)
+        db.session.commit()
+        return rows
+
+
+# per-row reference implementation of both accounting methods
+def replay_loop(is_buy, quantities, prices):
+    quantity = cost_basis = realized = 0.0
+    lots, fifo_realized = [], 0.0
+    for buy, q, p in zip(is_buy, quantities, prices):
+        if buy:
+            quantity += q
+            cost_basis += q * p
+            lots.append([q, p])
+            continue
+        realized += q * (p - cost_basis / quantity)
+        cost_basis = cost_basis * (quantity - q) / quantity
+        quantity -= q
+        remaining = q
+        while remaining:
+            taken = min(lots[0][0], remaining)
+            fifo_realized += taken * (p - lots[0][1])
+            lots[0][0] -= taken
+            remaining -= taken
+            if not lots[0][0]:
+                lots.pop(0)
+    return {
+        "quantity": int(quantity), "cost_basis": cost_basis, "realized_pnl": realized,
+        "fifo_cost_basis": sum(q * p for q, p in lots), "fifo_realized_pnl": fifo_realized,
+    }
+
+
+def compare_replays(rows):
+    by_stock = {}
+    for row in rows:
+        by_stock.setdefault(row["stock_id"], []).append((row["transaction_type"] == "buy", row["quantity"], row["cost_per_share"]))
+    columns = {stock_id: tuple(map(np.array, zip(*fills))) for stock_id, fills in by_stock.items()}
+
+    start = time.perf_counter()
+    vectorized = {stock_id: replay(*fills) for stock_id, fills in columns.items()}
+    vectorized_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    looped = {stock_id: replay_loop(*map(list, fills)) for stock_id, fills in columns.items()}
+    loop_ms = (time.perf_counter() - start) * 1000
+
+    worst = max(
+        abs(vectorized[stock_id][field] - looped[stock_id][field])
+        for stock_id in columns
+        for field in ("cost_basis", "realized_pnl", "fifo_cost_basis", "fifo_realized_pnl")
+    )
+    assert worst < 0.01, f"vectorized replay differs from the loop by {worst}"
+    return {"vectorized_replay_ms": round(vectorized_ms, 2), "loop_replay_ms": round(loop_ms, 2), "max_abs_diff": worst}
+
+
+def snapshot():
+    return sorted(
+        (summary.stock_id, summary.quantity, summary.cost_basis, summary.realized_pnl, summary.fifo_cost_basis, summary.fifo_realized_pnl)
+        for summary in PositionSummary.query.all()
+    )
+
+
+def run(transaction_count, holdings, repeat):
+    app = make_app()
+    user_id = seed_user(app, holdings=holdings)
+    rows = seed_history(app, user_id, transaction_count)
+    result = {"transactions": transaction_count, "holdings": holdings, **compare_replays(rows)}
+
+    with app.app_context():
+        counter = StatementCounter(db.engine)
+        start = time.perf_counter()
+        rebuild_summaries(user_id)
+        result["rebuild_ms"] = round((time.perf_counter() - start) * 1000, 2)
+
+    client = login(app)
+    client.get("/api/users/me/portfolio/summary")  # warm the quote cache
+    counter.reset()
+    client.get("/api/users/me/portfolio/summary")
+    result["summary_statements"] = counter.statements
+    samples = timed(lambda: client.get("/api/users/me/portfolio/summary"), repeat)
+    result["summary_p50_ms"] = round(percentile(samples, 50) * 1000, 2)
+    result["summary_p95_ms"] = round(percentile(samples, 95) * 1000, 2)
+
+    # a buy and a sell of the same shares per round, each folded into the summaries in the trade transaction
+    symbol = "S0000"
+    price = client.get(f"/api/stocks/{symbol}").get_json()["info"]["currentPrice"]
+    trade_samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        assert client.post("/api/stocks/buy", json={"symbol": symbol, "quantity": 3, "current_price": price}).status_code == 200
+        assert client.post("/api/stocks/sell", json={"symbol": symbol, "quantity": 3, "current_price": price}).status_code == 200
+        trade_samples.append((time.perf_counter() - start) / 2)
+    result["trade_p50_ms"] = round(percentile(trade_samples, 50) * 1000, 2)
+
+    # the incrementally maintained summaries agree with a full replay of the same history
+    with app.app_context():
+        incremental = snapshot()
+        rebuild_summaries(user_id)
+        replayed = snapshot()
+    worst = max(abs(a - b) for left, right in zip(incremental, replayed) for a, b in zip(left[1:], right[1:]))
+    assert worst <= 0.01, f"incremental summaries drifted from a full replay by {worst}"
+    result["incremental_vs_replay_max_diff"] = float(worst)
+
+    print(json.dumps(result))
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--transactions", type=int, default=100000)
+    parser.add_argument("--holdings", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    run(args.transactions, args.holdings, args.repeat)
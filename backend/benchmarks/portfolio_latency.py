@@ -0,0 +1,53 @@
+# GET /api/users/me/portfolio latency by portfolio size, next to the cold batch
+# metadata fetch (`market_data.get_infos`) the metadata refresher runs for the same symbols
+#
+#   python -m benchmarks.portfolio_latency --latency 0.02 --jitter 0.02
+import argparse
+import json
+from .common import make_app, seed_user, login, percentile, symbols, timed
+from app.extentions import market_data
+from app.services import FakeMarketDataProvider
+
+
+def run(sizes, workers, latency, jitter, repeat, timeout):
+    results = []
+    for worker_count in workers:
+        provider = FakeMarketDataProvider(latency=latency, jitter=jitter)
+        app = make_app(provider, MARKET_DATA_WORKERS=worker_count)
+
+        for size in sizes:
+            email = f"bench-{size}@example.com"
+            seed_user(app, email=email, holdings=size)
+            client = login(app, email=email)
+            missing = []
+
+            def fetch():
+                market_data.cache.invalidate()
+                infos = market_data.get_infos(symbols(size), timeout=timeout)
+                missing.append(size - len(infos))
+
+            fetch_samples = timed(fetch, repeat)
+            request_samples = timed(lambda: client.get("/api/users/me/portfolio"), repeat)
+            results.append({
+                "holdings": size,
+                "workers": worker_count,
+                "fetch_p50_ms": round(percentile(fetch_samples, 50) * 1000, 1),
+                "fetch_p95_ms": round(percentile(fetch_samples, 95) * 1000, 1),
+                "fetch_max_missing": max(missing),
+                "portfolio_p50_ms": round(percentile(request_samples, 50) * 1000, 1),
+                "portfolio_p95_ms": round(percentile(request_samples, 95) * 1000, 1),
+            })
+            print(json.dumps(results[-1]))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=2)
+    args = parser.parse_args()
+    run(args.sizes, args.workers, args.latency, args.jitter, args.repeat, args.timeout)
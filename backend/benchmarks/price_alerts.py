@@ -0,0 +1,143 @@
+# per-tick cost of evaluating price alerts as the number of active alerts grows, the engine's
+# binary search over threshold-sorted arrays against checking every alert of the ticking symbol
+# one by one ("loop") and with one vectorized comparison ("scan"), plus load time and memory of
+# the in-memory books
+#
+#   python -m benchmarks.price_alerts --sizes 10000 100000 1000000 --ticks 20000
+import argparse
+import json
+import random
+import time
+import uuid
+from .common import make_app, symbols, percentile, login, seed_user
+from app.extentions import db, market_data, price_alerts
+from app.models import User, PriceAlert
+from app.services import FakeMarketDataProvider
+from app.services.lazy_imports import numpy
+
+
+def seed_alerts(app, provider, count, users, symbol_count, chunk_size=50000):
+    rng = random.Random(0)
+    names = symbols(symbol_count)
+    with app.app_context():
+        user_ids = [str(uuid.uuid4()) for _ in range(users)]
+        db.session.execute(User.__table__.insert(), [
+            {"id": user_id, "email": f"alerts{i}@example.com", "first_name": "Bench", "last_name": "User", "password_hash": "x", "data_version": 0}
+            for i, user_id in enumerate(user_ids)
+        ])
+        for start in range(0, count, chunk_size):
+            rows = []
+            for _ in range(min(chunk_size, count - start)):
+                symbol = rng.choice(names)
+                price = provider.price(symbol)
+                # alerts are set away from the current price, on either side of it
+                threshold = round(price * rng.uniform(0.5, 1.5), 2)
+                rows.append({
+                    "user_id": rng.choice(user_ids),
+                    "symbol": symbol,
+                    "direction": "above" if threshold > price else "below",
+                    "threshold": threshold,
+                })
+            db.session.execute(PriceAlert.__table__.insert(), rows)
+        db.session.commit()
+
+
+def drain():
+    # the engine's single thread runs jobs in order, so this returns once the firings before it are done
+    price_alerts.executor.submit(lambda: None).result()
+
+
+def run_ticks(provider, symbol_count, ticks, mode):
+    np = numpy()
+    rng = random.Random(1)
+    names = symbols(symbol_count)
+    prices = {symbol: provider.price(symbol) for symbol in names}
+    timings = []
+    for _ in range(ticks):
+        symbol = rng.choice(names)
+        # a random walk of about 0.1% per tick, now and then a symbol crosses some thresholds
+        prices[symbol] *= 1 + rng.gauss(0, 0.001)
+        price = prices[symbol]
+        start = time.perf_counter()
+        # the baselines only count what would fire, they leave the books alone
+        book = price_alerts.books.get(symbol)
+        if mode == "engine":
+            price_alerts.on_quote(symbol, {"currentPrice": price})
+        elif book is None:
+            pass
+        elif mode == "scan":
+            np.count_nonzero(book.above[0] <= price) + np.count_nonzero(book.below[0] >= price)
+        else:
+            sum(threshold <= price for threshold in book.above[0].tolist()) + sum(threshold >= price for threshold in book.below[0].tolist())
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def book_bytes():
+    return sum(array.nbytes for book in price_alerts.books.values() for side in (book.above, book.below) for array in side)
+
+
+def run(sizes, users, symbol_count, ticks):
+    results = []
+    for count in sizes:
+        provider = FakeMarketDataProvider()
+        app = make_app(provider=provider)
+        seed_alerts(app, provider, count, users, symbol_count)
+
+        start = time.perf_counter()
+        price_alerts.load()
+        load_seconds = time.perf_counter() - start
+
+        result = {"alerts": count, "users": users, "symbols": symbol_count, "load_s": round(load_seconds, 2), "book_mb": round(book_bytes() / 2 ** 20, 1)}
+        for mode in ("loop", "scan", "engine"):
+            timings = run_ticks(provider, symbol_count, ticks, mode)
+            result[f"{mode}_tick_us_p50"] = round(percentile(timings, 50) * 1e6, 2)
+            result[f"{mode}_tick_us_p99"] = round(percentile(timings, 99) * 1e6, 2)
+        drain()
+
+        stats = price_alerts.stats()
+        with app.app_context():
+            triggered = PriceAlert.query.filter(PriceAlert.triggered_at.isnot(None)).count()
+        result.update({"fired": stats["fired"], "notified": stats["notified"], "triggered_in_db": triggered, "left": stats["alerts"]})
+        assert stats["fired"] == stats["notified"] == triggered
+        assert stats["alerts"] == count - triggered
+        print(json.dumps(result))
+        results.append(result)
+    return results
+
+
+# a real quote refresh through market data fires an alert created through the API exactly once
+def check_end_to_end():
+    provider = FakeMarketDataProvider()
+    app = make_app(provider=provider)
+    seed_user(app)
+    client = login(app)
+    price_alerts.load()
+
+    provider.set_price("S0000", 100.0)
+    response = client.post("/api/users/me/alerts", json={"symbol": "S0000", "direction": "above", "threshold": 110})
+    assert response.status_code == 201, response.get_json()
+    alert_id = response.get_json()["id"]
+    deleted = client.post("/api/users/me/alerts", json={"symbol": "S0000", "direction": "below", "threshold": 90}).get_json()["id"]
+    assert client.delete(f"/api/users/me/alerts/{deleted}").status_code == 200
+
+    for price in (105.0, 111.0, 80.0, 112.0):
+        provider.set_price("S0000", price)
+        market_data.cache.invalidate("S0000")
+        market_data.get_info("S0000")
+    drain()
+
+    alerts = client.get("/api/users/me/alerts").get_json()
+    assert [(alert["id"], alert["active"], alert["triggered_price"]) for alert in alerts] == [(alert_id, False, "111.00")], alerts
+    assert price_alerts.stats()["notified"] == 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--symbols", type=int, default=500)
+    parser.add_argument("--ticks", type=int, default=20000)
+    args = parser.parse_args()
+    check_end_to_end()
+    run(args.sizes, args.users, args.symbols, args.ticks)
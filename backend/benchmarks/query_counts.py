@@ -0,0 +1,82 @@
+# SQL statements per request for the read endpoints, which must not grow with the number of
+# holdings or transactions, with and without the signed in user cache, plus JSON encoding time
+# of a large payload per JSON provider
+#
+#   python -m benchmarks.query_counts --sizes 5 50
+import argparse
+import json
+import time
+from decimal import Decimal
+from datetime import datetime
+from .common import make_app, seed_user, seed_transactions, login, StatementCounter
+from app.extentions import db
+from app.json_provider import json_providers
+
+ENDPOINTS = [
+    "/api/auth/validate",
+    "/api/users/me/portfolio",
+    "/api/users/me/portfolio/summary",
+    "/api/users/me/transactions?page=2",
+    "/api/users/me/transactions?cursor=",
+    "/api/stocks/S0000",
+]
+
+
+def count_queries(sizes, **config):
+    app = make_app(**config)
+    with app.app_context():
+        counter = StatementCounter(db.engine)
+
+    counts = {}
+    for size in sizes:
+        email = f"queries-{size}@example.com"
+        user_id = seed_user(app, email=email, holdings=size)
+        seed_transactions(app, user_id, size * 10)
+        client = login(app, email=email)
+        client.get("/api/stocks/S0000")  # warm the quote cache and history store
+
+        for endpoint in ENDPOINTS:
+            counter.reset()
+            response = client.get(endpoint)
+            assert response.status_code == 200, (endpoint, response.get_json())
+            counts.setdefault(endpoint, {})[size] = counter.statements
+
+    return counts
+
+
+def time_encoders(rows, repeat=5):
+    app = make_app()
+    payload = {"transactions": [
+        {
+            "id": str(i), "quantity": i, "cost_per_share": Decimal("123.45"), "total_cost": Decimal("246.90"),
+            "created_at": datetime.now(), "stock": {"symbol": "S0000", "company_name": "S0000 Inc."}
+        }
+        for i in range(rows)
+    ]}
+
+    results = {}
+    for name, provider_class in json_providers.items():
+        provider = provider_class(app)
+        with app.app_context():
+            start = time.perf_counter()
+            for _ in range(repeat):
+                provider.response(payload)
+            results[name] = round((time.perf_counter() - start) / repeat * 1000, 2)
+    print(json.dumps({"rows": rows, "encode_ms": results}))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 50])
+    parser.add_argument("--rows", type=int, default=10000)
+    args = parser.parse_args()
+
+    counts = count_queries(args.sizes)
+    uncached = count_queries(args.sizes, USER_CACHE_SIZE=0)
+    for endpoint, by_size in counts.items():
+        saved = {size: uncached[endpoint][size] - statements for size, statements in by_size.items()}
+        print(json.dumps({"endpoint": endpoint, "statements": by_size, "without_user_cache": uncached[endpoint], "saved": saved}))
+    time_encoders(args.rows)
+    growing = [endpoint for endpoint, by_size in counts.items() if len(set(by_size.values())) > 1]
+    assert not growing, f"query count grows with data size for {growing}"
@@ -0,0 +1,106 @@
+# read/write routing against two databases: statements per database for the read only endpoints,
+# a trade, the reads right after it (sticky, primary) and once the window passed (replica again),
+# "replication" copies every table from the primary so it works the same on SQLite and Postgres
+#
+#   python -m benchmarks.read_replica --sticky 1
+#   DATABASE_URL=postgresql://localhost/primary python -m benchmarks.read_replica --replica-url postgresql://localhost/replica
+import argparse
+import json
+import os
+import tempfile
+import time
+from flask import has_request_context
+from sqlalchemy import event
+from .common import make_app, seed_user, seed_transactions, login, symbols
+from app.extentions import db
+from app.db_routing import REPLICA
+from app.services.portfolio import rebuild_summaries
+
+READS = [
+    "/api/users/me/portfolio",
+    "/api/users/me/transactions?per_page=20",
+    "/api/stocks/S0000",
+]
+
+
+def replicate():
+    primary, replica = db.engines[None], db.engines[REPLICA]
+    with primary.connect() as source, replica.begin() as target:
+        for table in reversed(db.metadata.sorted_tables):
+            target.execute(table.delete())
+        for table in db.metadata.sorted_tables:
+            rows = source.execute(table.select()).mappings().all()
+            if rows:
+                target.execute(table.insert(), [dict(row) for row in rows])
+
+
+def run(replica_url, sticky, holdings, transactions):
+    app = make_app(SQLALCHEMY_REPLICA_URI=replica_url, DATABASE_REPLICA_STICKY_SECONDS=sticky)
+    user_id = seed_user(app, holdings=holdings)
+    seed_transactions(app, user_id, transactions)
+
+    counts = {None: 0, REPLICA: 0}
+    with app.app_context():
+        # a summary rebuilt on first read would be a write and make the client stick to the primary
+        rebuild_summaries(user_id)
+        db.metadata.drop_all(db.engines[REPLICA])
+        db.metadata.create_all(db.engines[REPLICA])
+        replicate()
+        # only the requests' own statements, not those of background threads like the alert loader
+        def count(key):
+            if has_request_context():
+                counts[key] += 1
+
+        for key in counts:
+            event.listen(db.engines[key], "before_cursor_execute", lambda *args, key=key: count(key))
+
+    client = login(app)
+
+    def statements(method, url, **kwargs):
+        before = dict(counts)
+        response = client.open(url, method=method, **kwargs)
+        assert response.status_code == 200, (url, response.status_code, response.get_json())
+        return response, {"primary": counts[None] - before[None], "replica": counts[REPLICA] - before[REPLICA]}
+
+    def transaction_count():
+        return statements("GET", "/api/users/me/transactions?per_page=1")[0].get_json()["total_transactions"]
+
+    # a login that rehashed the password wrote, let its stickiness run out first
+    time.sleep(sticky)
+    # the signed in user is always loaded from the primary, once per process
+    result = {"user_lookup": statements("GET", "/api/auth/validate")[1], "reads": {}}
+    for url in READS:
+        result["reads"][url] = statements("GET", url)[1]
+
+    symbol = symbols(1)[0]
+    price = client.get(f"/api/stocks/{symbol}").get_json()["info"]["currentPrice"]
+    _, result["buy"] = statements("POST", "/api/stocks/buy", json={"symbol": symbol, "quantity": 1, "current_price": price})
+    result["sticky_read"] = statements("GET", "/api/users/me/transactions?per_page=1")[1]
+    result["sticky_sees_trade"] = transaction_count() == transactions + 1
+
+    time.sleep(sticky)
+    result["after_window_read"] = statements("GET", "/api/users/me/transactions?per_page=1")[1]
+    # nothing replicated the trade yet, so the replica is behind
+    result["replica_lags"] = transaction_count() == transactions
+    with app.app_context():
+        replicate()
+    result["replica_caught_up"] = transaction_count() == transactions + 1
+
+    print(json.dumps(result))
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--replica-url", default=f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='financial-app-replica-'), 'replica.db')}")
+    parser.add_argument("--sticky", type=int, default=1)
+    parser.add_argument("--holdings", type=int, default=5)
+    parser.add_argument("--transactions", type=int, default=100)
+    args = parser.parse_args()
+    result = run(args.replica_url, args.sticky, args.holdings, args.transactions)
+    assert result["user_lookup"]["primary"] and not result["user_lookup"]["replica"]
+    assert all(not counts["primary"] and counts["replica"] for counts in result["reads"].values())
+    assert result["buy"]["primary"] and not result["buy"]["replica"]
+    assert result["sticky_read"]["primary"] and not result["sticky_read"]["replica"] and result["sticky_sees_trade"]
+    assert result["after_window_read"]["replica"] and not result["after_window_read"]["primary"]
+    assert result["replica_lags"] and result["replica_caught_up"]
@@ -0,0 +1,58 @@
+# GET /api/stocks/search lookup latency over the shipped listing padded with synthetic listings,
+# measured on the index itself and through the endpoint
+#
+#   python -m benchmarks.symbol_search --listings 20000
+import argparse
+import json
+import random
+import time
+from .common import make_app, seed_user, login, percentile, timed
+from app.extentions import symbol_index
+
+WORDS = ["Global", "Holdings", "Technologies", "Capital", "Energy", "Bio", "Pharma", "Systems", "Partners", "Group", "Acquisition", "Trust"]
+QUERIES = ["A", "AA", "AAP", "AAPL", "MS", "T", "ZZ", "apple", "micro", "bank of", "global hold", "acq corp", "energy", "tech", "inc", "nothing here"]
+
+
+def pad_listings(count, seed=0):
+    rng = random.Random(seed)
+    while len(symbol_index) < count:
+        symbol = "".join(rng.choices("ABCDEFGHIJKLMNOPQRSTUVWXYZ", k=rng.randint(1, 5)))
+        symbol_index.add(symbol, " ".join(rng.sample(WORDS, 3)) + " Inc.")
+
+
+def run(listings, repeat):
+    app = make_app()
+    seed_user(app)
+    client = login(app)
+
+    start = time.perf_counter()
+    pad_listings(listings)
+    result = {"listings": len(symbol_index), "pad_ms": round((time.perf_counter() - start) * 1000, 2)}
+
+    samples = []
+    for query in QUERIES:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            symbol_index.search(query, limit=10)
+            samples.append(time.perf_counter() - start)
+    result["index_p50_us"] = round(percentile(samples, 50) * 1e6, 1)
+    result["index_p99_us"] = round(percentile(samples, 99) * 1e6, 1)
+    result["index_max_us"] = round(max(samples) * 1e6, 1)
+
+    endpoint_samples = []
+    for query in QUERIES:
+        endpoint_samples += timed(lambda: client.get(f"/api/stocks/search?q={query}"), max(1, repeat // 10))
+    result["endpoint_p50_ms"] = round(percentile(endpoint_samples, 50) * 1000, 2)
+
+    result["examples"] = {query: [hit["symbol"] for hit in symbol_index.search(query, limit=5)] for query in ("AAPL", "apple", "bank of")}
+    print(json.dumps(result))
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--listings", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    result = run(args.listings, args.repeat)
+    assert result["index_p99_us"] < 1000, "lookups are not sub-millisecond"
@@ -0,0 +1,79 @@
+# many threads buying and selling one position at once, checks that no update is lost
+# or oversold and reports trade throughput
+#
+#   python -m benchmarks.trade_concurrency --threads 16 --trades 50
+import argparse
+import json
+import time
+from threading import Lock, Thread
+from .common import make_app, seed_user, login
+from app.extentions import market_data
+from app.models import UserStock
+
+SYMBOL = "S0000"
+
+
+def run(threads, trades):
+    app = make_app()
+    user_id = seed_user(app)
+    price = market_data.get_info(SYMBOL)["currentPrice"]
+    # the starting position is bought through the route, so it has the history a real one has
+    response = login(app).post("/api/stocks/buy", json={"symbol": SYMBOL, "quantity": 10, "current_price": price})
+    assert response.status_code == 200, response.get_json()
+    with app.app_context():
+        initial = UserStock.query.filter_by(user_id=user_id).one().quantity
+
+    counts = {"buy": 0, "sell": 0, "rejected": 0, "failed": 0}
+    lock = Lock()
+
+    def trader(index):
+        client = login(app)
+        for i in range(trades):
+            # sells outnumber buys so the position keeps running into the oversell guard
+            side = "buy" if (index + i) % 3 == 0 else "sell"
+            response = client.post(f"/api/stocks/{side}", json={"symbol": SYMBOL, "quantity": 1 + index % 3, "current_price": price})
+            with lock:
+                if response.status_code == 200:
+                    counts[side] += 1 + index % 3
+                elif response.status_code == 400:
+                    counts["rejected"] += 1
+                else:
+                    counts["failed"] += 1
+
+    workers = [Thread(target=trader, args=(index,)) for index in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+
+    with app.app_context():
+        position = UserStock.query.filter_by(user_id=user_id).first()
+        final = position.quantity if position else 0
+
+    expected = initial + counts["buy"] - counts["sell"]
+    result = {
+        "threads": threads,
+        "requests": threads * trades,
+        "bought": counts["buy"],
+        "sold": counts["sell"],
+        "rejected": counts["rejected"],
+        "failed": counts["failed"],
+        "final_quantity": final,
+        "expected_quantity": expected,
+        "consistent": final == expected and final >= 0,
+        "trades_per_second": round(threads * trades / elapsed, 1),
+    }
+    print(json.dumps(result))
+    assert result["consistent"], "lost update or oversell detected"
+    assert result["failed"] == 0, "trades failed with an unexpected status"
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--trades", type=int, default=50)
+    args = parser.parse_args()
+    run(args.threads, args.trades)
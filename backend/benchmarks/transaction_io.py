@@ -0,0 +1,109 @@
+# POST /api/users/me/transactions/import of a generated broker history, then the streamed
+# GET /api/users/me/transactions/export of it in both formats, with the memory the export holds
+#
+#   python -m benchmarks.transaction_io --rows 1000000 --holdings 20
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from .common import make_app, seed_user, login, symbols
+from app.extentions import db
+from app.models import Transaction, UserStock, PositionSummary, Stock
+
+
+# a history that buys more than it sells, oldest first, one fill a minute
+def write_history(path, rows, holdings, seed=0):
+    rng = random.Random(seed)
+    names = symbols(holdings)
+    held = dict.fromkeys(names, 0)
+    start = datetime.now() - timedelta(minutes=rows + 1)
+    with open(path, "w") as f:
+        f.write("created_at,symbol,transaction_type,quantity,cost_per_share\n")
+        for i in range(rows):
+            symbol = names[i % holdings]
+            quantity = rng.randint(1, 10)
+            side = "sell" if held[symbol] >= quantity and rng.random() < 0.4 else "buy"
+            held[symbol] += quantity if side == "buy" else -quantity
+            f.write(f"{(start + timedelta(minutes=i)).isoformat()},{symbol},{side},{quantity},{rng.uniform(10, 500):.2f}\n")
+    return held
+
+
+# reads a streamed response chunk by chunk, returns (bytes, lines)
+def drain(response):
+    exported_bytes = 0
+    lines = 0
+    for chunk in response.response:
+        chunk = chunk if isinstance(chunk, bytes) else chunk.encode()
+        exported_bytes += len(chunk)
+        lines += chunk.count(b"\n")
+    response.close()
+    return exported_bytes, lines
+
+
+def run(rows, holdings):
+    app = make_app()
+    # the stocks exist up front so only the import itself is timed, not provider lookups
+    seed_user(app, holdings=holdings)
+    with app.app_context():
+        db.session.query(UserStock).delete()
+        db.session.commit()
+    client = login(app)
+
+    path = os.path.join(tempfile.mkdtemp(), "history.csv")
+    held = write_history(path, rows, holdings)
+    size = os.path.getsize(path)
+
+    start = time.perf_counter()
+    with open(path, "rb") as f:
+        response = client.post(
+            "/api/users/me/transactions/import?format=csv",
+            input_stream=f, content_type="text/csv", headers={"Content-Length": str(size)}
+        )
+    import_s = time.perf_counter() - start
+    assert response.status_code == 200, response.get_json()
+
+    with app.app_context():
+        stored = db.session.query(Transaction).count()
+        positions = dict(db.session.query(Stock.symbol, UserStock.quantity).join(Stock, Stock.id == UserStock.stock_id).all())
+        summaries = dict(db.session.query(Stock.symbol, PositionSummary.quantity).join(Stock, Stock.id == PositionSummary.stock_id).all())
+    expected = {symbol: quantity for symbol, quantity in held.items() if quantity}
+
+    result = {
+        "rows": rows,
+        "upload_mb": round(size / 1e6, 1),
+        "import_s": round(import_s, 2),
+        "import_rows_per_s": round(rows / import_s),
+        "stored": stored,
+        "positions_match": positions == expected == {symbol: quantity for symbol, quantity in summaries.items() if quantity},
+    }
+
+    for export_format in ("csv", "ndjson"):
+        url = f"/api/users/me/transactions/export?format={export_format}"
+        start = time.perf_counter()
+        exported_bytes, lines = drain(client.get(url, buffered=False))
+        result[f"export_{export_format}_s"] = round(time.perf_counter() - start, 2)
+        result[f"export_{export_format}_mb"] = round(exported_bytes / 1e6, 1)
+        result[f"export_{export_format}_rows"] = lines - (export_format == "csv")
+
+        # a second pass under tracemalloc, which slows everything down too much to time
+        tracemalloc.start()
+        drain(client.get(url, buffered=False))
+        result[f"export_{export_format}_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 1e6, 1)
+        tracemalloc.stop()
+
+    print(json.dumps(result))
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--holdings", type=int, default=20)
+    args = parser.parse_args()
+    result = run(args.rows, args.holdings)
+    assert result["stored"] == args.rows and result["positions_match"]
+    assert result["export_csv_rows"] == result["export_ndjson_rows"] == args.rows
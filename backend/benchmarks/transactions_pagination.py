@@ -0,0 +1,47 @@
+# GET /api/users/me/transactions page latency by page depth, offset vs cursor pagination
+#
+#   python -m benchmarks.transactions_pagination --transactions 50000
+import argparse
+import json
+from .common import make_app, seed_user, seed_transactions, login, percentile, timed
+
+
+def run(transaction_count, depths, per_page, repeat):
+    app = make_app()
+    user_id = seed_user(app, holdings=20)
+    seed_transactions(app, user_id, transaction_count)
+    client = login(app)
+    results = []
+
+    # walk the cursors once so every depth can be requested directly
+    cursors = {1: ""}
+    cursor, page = "", 1
+    while page < max(depths):
+        body = client.get(f"/api/users/me/transactions?cursor={cursor}&per_page={per_page}").get_json()
+        if not body["has_next"]:
+            break
+        cursor, page = body["next_cursor"], page + 1
+        cursors[page] = cursor
+
+    for depth in depths:
+        if depth not in cursors:
+            continue
+        offset_samples = timed(lambda: client.get(f"/api/users/me/transactions?page={depth}&per_page={per_page}"), repeat)
+        cursor_samples = timed(lambda: client.get(f"/api/users/me/transactions?cursor={cursors[depth]}&per_page={per_page}"), repeat)
+        results.append({
+            "page": depth,
+            "offset_p50_ms": round(percentile(offset_samples, 50) * 1000, 2),
+            "cursor_p50_ms": round(percentile(cursor_samples, 50) * 1000, 2),
+        })
+        print(json.dumps(results[-1]))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--transactions", type=int, default=50000)
+    parser.add_argument("--depths", type=int, nargs="+", default=[1, 10, 100, 1000, 4000])
+    parser.add_argument("--per-page", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    run(args.transactions, args.depths, args.per_page, args.repeat)
@@ -0,0 +1,14 @@
+import pytest
+# sets up the environment (sqlite in a temporary directory, fake market data) before the app is imported
+from benchmarks.common import make_app, seed_user, login
+
+
+@pytest.fixture
+def app():
+    return make_app()
+
+
+@pytest.fixture
+def client(app):
+    seed_user(app)
+    return login(app)
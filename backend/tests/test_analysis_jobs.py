@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+import time
+from benchmarks.common import make_app, seed_user, login
+from app.extentions import db, analysis_jobs
+from app.models import AnalysisJob
+
+
+def wait_for(client, job_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/api/users/me/portfolio/analyze/{job_id}").get_json()
+        if job["status"] != "pending":
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} still pending")
+
+
+def test_identical_portfolios_share_one_analysis():
+    app = make_app(ANALYSIS_CLIENT="fake", FAKE_ANALYSIS_LATENCY=0.2)
+    for email in ("a@example.com", "b@example.com"):
+        seed_user(app, email=email, holdings=2)
+    first, second = login(app, "a@example.com"), login(app, "b@example.com")
+
+    jobs = [client.get("/api/users/me/portfolio/analyze") for client in (first, second)]
+    assert [response.status_code for response in jobs] == [202, 202]
+    assert wait_for(first, jobs[0].get_json()["job_id"])["status"] == "done"
+    assert wait_for(second, jobs[1].get_json()["job_id"])["status"] == "done"
+    assert analysis_jobs.client.calls == 1
+
+    # answered from the cache, and a job is only visible to its user
+    cached = first.get("/api/users/me/portfolio/analyze")
+    assert cached.status_code == 200 and cached.get_json()["analysis"]
+    assert second.get(f"/api/users/me/portfolio/analyze/{cached.get_json()['job_id']}").status_code == 404
+
+
+def test_expired_finished_jobs_are_removed_behind_pending_ones():
+    app = make_app(ANALYSIS_CLIENT="fake")
+    user_id = seed_user(app, holdings=1)
+    expired = datetime.now() - timedelta(seconds=app.config["ANALYSIS_JOB_TTL"] + 1)
+    with app.app_context():
+        db.session.add_all([
+            AnalysisJob(user_id=user_id, status="pending", created_at=expired - timedelta(seconds=1)),
+            AnalysisJob(user_id=user_id, status="done", analysis=["ok"], created_at=expired),
+            AnalysisJob(user_id=user_id, status="failed", created_at=expired),
+        ])
+        db.session.commit()
+
+    client = login(app)
+    wait_for(client, client.get("/api/users/me/portfolio/analyze").get_json()["job_id"])
+    with app.app_context():
+        assert sorted(job.status for job in AnalysisJob.query) == ["done", "pending"]
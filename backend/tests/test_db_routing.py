@@ -0,0 +1,19 @@
+import os
+import tempfile
+from benchmarks.common import make_app, seed_user, login
+from app.extentions import db
+from app.db_routing import REPLICA
+
+
+# the replica hasn't caught up with the sign up, the signed in user is still found
+def test_current_user_is_loaded_from_the_primary():
+    replica = os.path.join(tempfile.mkdtemp(), "replica.db")
+    app = make_app(SQLALCHEMY_REPLICA_URI=f"sqlite:///{replica}")
+    with app.app_context():
+        db.metadata.create_all(db.engines[REPLICA])
+    seed_user(app)
+    client = login(app)
+
+    response = client.get("/api/auth/validate")
+    assert response.get_json()["is_authenticated"]
+    assert response.get_json()["user"]["email"] == "bench@example.com"
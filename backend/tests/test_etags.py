@@ -0,0 +1,17 @@
+def test_compressed_responses_have_their_own_etag(app, client):
+    app.config["COMPRESSION_MIN_SIZE"] = 1
+    price = app.extensions["market_data"].provider.price("S0000")
+    assert client.post("/api/stocks/buy", json={"symbol": "S0000", "quantity": 1, "current_price": price}).status_code == 200
+
+    plain = client.get("/api/users/me/portfolio", headers={"Accept-Encoding": "identity"})
+    gzipped = client.get("/api/users/me/portfolio", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in plain.headers and gzipped.headers["Content-Encoding"] == "gzip"
+    assert gzipped.headers["ETag"] == plain.headers["ETag"][:-1] + '-gzip"'
+    assert "Accept-Encoding" in gzipped.headers["Vary"]
+
+    # each representation revalidates against its own validator
+    for response, encoding in ((plain, "identity"), (gzipped, "gzip")):
+        revalidated = client.get("/api/users/me/portfolio", headers={"Accept-Encoding": encoding, "If-None-Match": response.headers["ETag"]})
+        assert revalidated.status_code == 304
+        assert revalidated.headers["ETag"] == response.headers["ETag"]
+        assert "Accept-Encoding" in revalidated.headers["Vary"]
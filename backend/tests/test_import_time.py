@@ -0,0 +1,8 @@
+from benchmarks.import_time import BUDGET_MS, run
+
+
+# with the default config, heavy modules load on first use and the app builds within the startup budget
+def test_create_app_stays_within_the_startup_budget():
+    result = run(BUDGET_MS, repeat=3, preload=False, top=5)
+    assert not result["heavy_modules_loaded"]
+    assert result["total_ms"] <= BUDGET_MS, result
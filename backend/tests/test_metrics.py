@@ -0,0 +1,20 @@
+from benchmarks.common import make_app, seed_user, login
+
+
+def test_stats_need_the_metrics_token():
+    app = make_app(METRICS_TOKEN="secret")
+    seed_user(app)
+    client = login(app)
+
+    assert client.get("/api/stocks/cache/stats").status_code == 401
+    response = client.get("/api/stocks/cache/stats", headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 200
+    assert "hits" in response.get_json()
+
+    assert client.get("/api/stocks/stream/stats").status_code == 401
+    assert client.get("/api/stocks/stream/stats", headers={"Authorization": "Bearer secret"}).status_code == 200
+
+
+def test_stats_are_hidden_without_a_metrics_token(client):
+    assert client.get("/api/stocks/cache/stats").status_code == 404
+    assert client.get("/api/stocks/stream/stats").status_code == 404
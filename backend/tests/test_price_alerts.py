@@ -0,0 +1,40 @@
+import time
+from benchmarks.common import make_app, seed_user, login
+from app.extentions import db, market_data, price_alerts
+from app.models import PriceAlert
+from app.services import FakeMarketDataProvider
+
+
+def drain():
+    price_alerts.executor.submit(lambda: None).result()
+
+
+def quote(provider, symbol, price):
+    provider.set_price(symbol, price)
+    market_data.cache.invalidate(symbol)
+    market_data.get_info(symbol)
+    drain()
+
+
+# an alert another worker created, straight into the database, is read by the next reload and fires here once
+def test_alerts_created_by_other_workers_are_reloaded():
+    provider = FakeMarketDataProvider()
+    app = make_app(provider=provider, PRICE_ALERT_RELOAD_INTERVAL=0.01)
+    user_id = seed_user(app)
+    client = login(app)
+    price_alerts.load()
+
+    provider.set_price("S0000", 100.0)
+    with app.app_context():
+        db.session.add(PriceAlert(user_id=user_id, symbol="S0000", direction="above", threshold=110))
+        db.session.commit()
+
+    time.sleep(0.02)
+    quote(provider, "S0000", 105.0)
+    assert price_alerts.stats()["alerts"] == 1
+
+    for price in (111.0, 80.0, 112.0):
+        quote(provider, "S0000", price)
+    alerts = client.get("/api/users/me/alerts").get_json()
+    assert [(alert["active"], alert["triggered_price"]) for alert in alerts] == [(False, "111.00")]
+    assert price_alerts.stats()["notified"] == 1
@@ -0,0 +1,40 @@
+from app.extentions import socketio, price_stream
+
+NAMESPACE = "/prices"
+
+
+def subscribe(client, symbols):
+    return client.emit("subscribe", {"symbols": symbols}, namespace=NAMESPACE, callback=True)
+
+
+def test_subscription_limit_is_per_connection(app, client):
+    app.config["PRICE_STREAM_MAX_SYMBOLS"] = 3
+    connection = socketio.test_client(app, namespace=NAMESPACE, flask_test_client=client)
+    assert connection.is_connected(NAMESPACE)
+
+    assert subscribe(connection, ["S0000", "S0001"])["subscribed"] == ["S0000", "S0001"]
+    # one more fits, and symbols already subscribed don't count twice
+    assert subscribe(connection, ["S0001", "S0002", "S0003"])["subscribed"] == ["S0001", "S0002"]
+    assert subscribe(connection, ["S0004"])["subscribed"] == []
+
+    connection.emit("unsubscribe", {"symbols": ["S0000"]}, namespace=NAMESPACE, callback=True)
+    assert subscribe(connection, ["S0004", "S0005"])["subscribed"] == ["S0004"]
+    assert [len(symbols) for symbols in price_stream.subscriptions.values()] == [3]
+
+    connection.disconnect(namespace=NAMESPACE)
+    assert not price_stream.subscriptions
+
+
+def test_limit_applies_to_each_connection(app, client):
+    app.config["PRICE_STREAM_MAX_SYMBOLS"] = 1
+    first, second = (socketio.test_client(app, namespace=NAMESPACE, flask_test_client=client) for _ in range(2))
+
+    assert subscribe(first, ["S0000", "S0001"])["subscribed"] == ["S0000"]
+    assert subscribe(second, ["S0001"])["subscribed"] == ["S0001"]
+
+    first.disconnect(namespace=NAMESPACE)
+    second.disconnect(namespace=NAMESPACE)
+
+
+def test_anonymous_connections_are_refused(app):
+    assert not socketio.test_client(app, namespace=NAMESPACE).is_connected(NAMESPACE)
@@ -0,0 +1,25 @@
+from benchmarks.common import make_app, seed_user, seed_transactions, StatementCounter
+from app.extentions import db
+from app.models import User
+from benchmarks.query_counts import ENDPOINTS, count_queries
+
+
+# the read endpoints eager load what they serialize, so their statements don't grow with the data
+def test_read_endpoints_run_a_fixed_number_of_statements():
+    counts = count_queries([2, 20])
+    assert set(counts) == set(ENDPOINTS)
+    for endpoint, statements in counts.items():
+        assert statements[2] == statements[20], (endpoint, statements)
+
+
+def test_user_to_dict_loads_positions_and_transactions_in_two_statements():
+    app = make_app()
+    user_id = seed_user(app, holdings=20)
+    seed_transactions(app, user_id, 20)
+    with app.app_context():
+        user = db.session.get(User, user_id)
+        counter = StatementCounter(db.engine)
+        user_data = user.to_dict(include_user_stocks=True, include_transactions=True)
+
+    assert len(user_data["user_stocks"]) == 20 and len(user_data["transactions"]) == 20
+    assert counter.statements == 2
@@ -0,0 +1,15 @@
+import pytest
+
+
+@pytest.mark.parametrize("max_points", ["abc", "2.5", "", "0", "-10", "2", "1e3", "100000"])
+def test_invalid_max_points_are_rejected(client, max_points):
+    response = client.get(f"/api/stocks/S0000?max_points={max_points}")
+    assert response.status_code == 400
+    assert "max_points" in response.get_json()["message"]
+
+
+def test_max_points_bounds_the_chart(client):
+    response = client.get("/api/stocks/S0000?period=5y&max_points=50")
+    assert response.status_code == 200
+    assert 3 <= len(response.get_json()["data"]) <= 50
+    assert client.get("/api/stocks/S0000?period=5y").status_code == 200
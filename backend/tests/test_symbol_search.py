@@ -0,0 +1,40 @@
+from app import create_app
+from app.extentions import db
+from app.models import Stock
+from app.services.symbol_search import SymbolIndex
+
+
+def search(index, query, limit=10):
+    return [result["symbol"] for result in index.search(query, limit)]
+
+
+def test_results_are_ranked_by_tier_then_ticker_length():
+    index = SymbolIndex()
+    index.add_many([("APP", "Applovin Corp"), ("APPL", "Appleton Inc"), ("AAPL", "Apple Inc"), ("FOO", "Bar Apparel")])
+
+    assert search(index, "app") == ["APP", "APPL", "AAPL", "FOO"]
+    assert search(index, "app", limit=2) == ["APP", "APPL"]
+
+
+# word matches across several words are merged by ticker length, not by the word they matched
+def test_word_matches_are_ranked_by_ticker_length():
+    index = SymbolIndex()
+    index.add_many([("LONGSY", "Foo Apex"), ("MID", "Bar Applied"), ("A1", "Baz Apt")])
+
+    assert search(index, "ap") == ["A1", "MID", "LONGSY"]
+    assert search(index, "ap", limit=1) == ["A1"]
+
+
+def test_listings_are_read_from_the_configured_file(app):
+    index = app.extensions["symbol_index"]
+    assert len(index) > 0
+    assert search(index, "aapl", limit=1) == ["AAPL"]
+
+
+def test_stored_stocks_are_loaded_at_startup(app):
+    with app.app_context():
+        db.session.add(Stock(symbol="QZX", company_name="Quuxzilla Holdings", industry="Software", sector="Technology"))
+        db.session.commit()
+
+    index = create_app().extensions["symbol_index"]
+    assert search(index, "quuxzilla") == ["QZX"]
@@ -72,7 +72,16 @@ export default function Portfolio() {
 
   const handlePortfolioAnalysis = async () => {
     try {
-      const response = await api.get("/users/me/portfolio/analyze");
+      let response = await api.get("/users/me/portfolio/analyze");
+      // the analysis runs in the background, poll the job until it finishes
+      while (response.data.status === "pending") {
+        await new Promise((resolve) => setTimeout(resolve, 1000));
+        response = await api.get(
+          `/users/me/portfolio/analyze/${response.data.job_id}`
+        );
+      }
+      if (response.data.status !== "done")
+        throw new Error("Something went wrong analyzing your portfolio");
       setAnalysis(response.data.analysis);
       setDialogIsOpen(true);
     } catch (error) {
@@ -147,7 +156,7 @@ export default function Portfolio() {
                   <Avatar
                     square
                     className="size-6 outline-transparent"
-                    src={`https://logo.clearbit.com/${userStock.website}`}
+                    src={userStock.stock.logo_url}
                     alt={userStock.website}
                   />
                   <p className="w-full block font-semibold p-3 truncate">
@@ -74,6 +74,7 @@ export default function Stock() {
   const [quantityError, setQuantityError] = useState<string | null>(null);
   const [userStock, setUserStock] = useState<UserStock | null>(null);
   const [stockInfo, setStockInfo] = useState<StockInfo | null>(null);
+  const [quoteToken, setQuoteToken] = useState<string | null>(null);
 
   const backgroundColor = theme === "dark" ? "#18181b" : "#FFFFFF";
   const color = theme === "dark" ? "#FFFFFF" : "#09090b";
@@ -263,6 +264,7 @@ export default function Stock() {
         const response = await api.get(`/stocks/${symbol}`);
         if (response.data.info) setStockInfo(response.data.info as StockInfo);
         else setStockInfo(null);
+        setQuoteToken(response.data.quote_token || null);
         if (response.data.user_stock)
           setUserStock(response.data.user_stock as UserStock);
         else setUserStock(null);
@@ -310,12 +312,17 @@ export default function Stock() {
       setTransactionLoading(true);
       if (!stockInfo) throw new Error("Missing stock info");
       const current_price = stockInfo.currentPrice;
-      const body: { symbol: string; quantity: number; current_price: number } =
-        {
-          symbol: symbol!,
-          quantity: quantityInput,
-          current_price,
-        };
+      const body: {
+        symbol: string;
+        quantity: number;
+        current_price: number;
+        quote_token: string | null;
+      } = {
+        symbol: symbol!,
+        quantity: quantityInput,
+        current_price,
+        quote_token: quoteToken,
+      };
 
       if (body.quantity <= 0)
         throw new Error("Quantity must be a positive integer greater than 0");
@@ -12,6 +12,10 @@ export interface StockData {
   company_name: string;
   industry: string;
   sector: string;
+  website: string | null;
+  logo_url: string | null;
+  exchange: string | null;
+  currency: string | null;
 }
 
 export interface UserStock {